@@ -0,0 +1 @@
+"""Benchmarks da Rastreabilidade Sustentável (gerador sintético + cenários)."""
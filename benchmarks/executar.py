@@ -0,0 +1,219 @@
+"""
+Executa os cenários de benchmark e grava os resultados em JSON.
+
+    python -m benchmarks.executar --tamanhos 10000 100000 --saida bench.json
+
+Cada cenário é medido duas vezes a partir do mesmo estado inicial: uma só
+com o relógio (tempo de parede) e outra com tracemalloc (pico de memória),
+para que o rastreamento de memória não distorça o tempo.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, Any, List
+
+from src import utils
+from src.casos_uso import LOTES, cadastrar_lote, registrar_evento, listar_lotes, consultar_lotes
+from src.dominio import UF_VALIDAS
+from src.persistencia_json import carregar_json_validado, salvar_json_seguro, exportar_csv_lotes
+from src.relatorios import kpis
+
+from .gerador import gerar_lotes, gerar_cadastros, gerar_eventos
+
+# Um cenário recebe (tamanho, seed, pasta temporária), prepara o estado e
+# devolve a função medida, que retorna a quantidade de operações feitas.
+Preparo = Callable[[int, int, str], Callable[[], int]]
+
+MAX_OPERACOES = 10_000  # cadastros/eventos por rodada, independente do tamanho
+
+
+def _carregar_store(n: int, seed: int) -> None:
+    LOTES.clear()
+    LOTES.extend(gerar_lotes(n, seed))
+
+
+def cen_cadastrar_lote(n: int, seed: int, tmp: str) -> Callable[[], int]:
+    _carregar_store(n, seed)
+    entradas = list(gerar_cadastros(min(n, MAX_OPERACOES), seed))
+    def rodar() -> int:
+        for d in entradas:
+            LOTES.append(cadastrar_lote(d))
+        return len(entradas)
+    return rodar
+
+def cen_registrar_evento(n: int, seed: int, tmp: str) -> Callable[[], int]:
+    _carregar_store(n, seed)
+    pares = list(gerar_eventos(min(n, MAX_OPERACOES), n, seed))
+    def rodar() -> int:
+        for lote_id, ev in pares:
+            registrar_evento(lote_id, ev)
+        return len(pares)
+    return rodar
+
+def cen_listar_lotes(n: int, seed: int, tmp: str) -> Callable[[], int]:
+    _carregar_store(n, seed)
+    filtros: List[Dict[str, Any]] = [{"origem_uf": uf} for uf in sorted(UF_VALIDAS)]
+    filtros += [{"status": "PRONTO"}, {"status": "EM_PROCESSAMENTO"}]
+    filtros += [{"origem_uf": uf, "status": "PRONTO"} for uf in sorted(UF_VALIDAS)]
+    def rodar() -> int:
+        for f in filtros:
+            listar_lotes(f)
+        return len(filtros)
+    return rodar
+
+def cen_consultar_lotes(n: int, seed: int, tmp: str) -> Callable[[], int]:
+    _carregar_store(n, seed)
+    consultas: List[Dict[str, Any]] = [
+        {"filtros": {"origem_uf": uf, "carbono_neutro": True}, "ordenar": "-peso_kg"}
+        for uf in sorted(UF_VALIDAS)]
+    consultas += [{"filtros": {"data_de": "2025-03-01", "data_ate": "2025-03-07"}, "ordenar": "data_colheita"},
+                  {"filtros": {"peso_min": 100, "peso_max": 110, "status": "PRONTO"}},
+                  {"filtros": {"produtor": "produtor 001"}, "ordenar": "produto"},
+                  {"filtros": None, "ordenar": "-data_colheita"}]
+    consultar_lotes(None, "peso_kg", 1)  # índices ordenados prontos antes da medição
+    for campo in ("data_colheita", "produto", "produtor"):
+        consultar_lotes(None, campo, 1)
+    def rodar() -> int:
+        for c in consultas:
+            consultar_lotes(c["filtros"], c.get("ordenar"), limite=20)
+        return len(consultas)
+    return rodar
+
+def cen_kpis(n: int, seed: int, tmp: str) -> Callable[[], int]:
+    _carregar_store(n, seed)
+    def rodar() -> int:
+        for _ in range(100):
+            kpis(LOTES)
+        return 100
+    return rodar
+
+def cen_kpis_completo(n: int, seed: int, tmp: str) -> Callable[[], int]:
+    lotes = list(gerar_lotes(n, seed))
+    def rodar() -> int:
+        kpis(lotes)
+        return n
+    return rodar
+
+def cen_salvar_json_seguro(n: int, seed: int, tmp: str) -> Callable[[], int]:
+    lotes = list(gerar_lotes(n, seed))
+    path = os.path.join(tmp, f"salvar_{n}.json")
+    def rodar() -> int:
+        salvar_json_seguro(lotes, path)
+        return n
+    return rodar
+
+def cen_carregar_json_validado(n: int, seed: int, tmp: str) -> Callable[[], int]:
+    path = os.path.join(tmp, f"carregar_{n}.json")
+    if not os.path.exists(path):
+        salvar_json_seguro(list(gerar_lotes(n, seed)), path)
+    def rodar() -> int:
+        return len(carregar_json_validado(path))
+    return rodar
+
+def cen_exportar_csv_lotes(n: int, seed: int, tmp: str) -> Callable[[], int]:
+    lotes = list(gerar_lotes(n, seed))
+    path = os.path.join(tmp, f"export_{n}.csv")
+    def rodar() -> int:
+        exportar_csv_lotes(lotes, path)
+        return n
+    return rodar
+
+CENARIOS: Dict[str, Preparo] = {
+    "cadastrar_lote": cen_cadastrar_lote,
+    "registrar_evento": cen_registrar_evento,
+    "listar_lotes": cen_listar_lotes,
+    "consultar_lotes": cen_consultar_lotes,
+    "kpis": cen_kpis,
+    "kpis_completo": cen_kpis_completo,
+    "salvar_json_seguro": cen_salvar_json_seguro,
+    "carregar_json_validado": cen_carregar_json_validado,
+    "exportar_csv_lotes": cen_exportar_csv_lotes,
+}
+
+
+def medir(nome: str, preparo: Preparo, n: int, seed: int, tmp: str,
+          memoria: bool = True) -> Dict[str, Any]:
+    rodar = preparo(n, seed, tmp)
+    t0 = time.perf_counter()
+    ops = rodar()
+    seg = time.perf_counter() - t0
+
+    pico = None
+    if memoria:
+        rodar = preparo(n, seed, tmp)
+        tracemalloc.start()
+        try:
+            rodar()
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "cenario": nome,
+        "tamanho": n,
+        "operacoes": ops,
+        "segundos": round(seg, 6),
+        "ops_por_segundo": round(ops / seg, 2) if seg > 0 else None,
+        "pico_memoria_bytes": pico,
+    }
+
+
+def _versao_git() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=utils.BASE_DIR, check=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks da Rastreabilidade Sustentável")
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--cenarios", nargs="+", choices=sorted(CENARIOS), default=list(CENARIOS))
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--saida", default="bench_resultados.json")
+    ap.add_argument("--sem-memoria", action="store_true", help="não mede o pico com tracemalloc")
+    args = ap.parse_args(argv)
+
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        # mantém logs/app.log fora das medições
+        log_original = utils.LOG_PATH
+        utils.configurar_log(os.path.join(tmp, "bench.log"))
+        for n in args.tamanhos:
+            for nome in args.cenarios:
+                r = medir(nome, CENARIOS[nome], n, args.seed, tmp, not args.sem_memoria)
+                resultados.append(r)
+                pico = r["pico_memoria_bytes"]
+                print(f"{nome:<24} n={n:<9} {r['segundos']:>10.4f}s "
+                      f"{r['ops_por_segundo'] or 0:>14.1f} ops/s "
+                      f"{'' if pico is None else f'{pico / 2**20:>9.1f} MiB'}")
+        utils.encerrar_log()
+        utils.LOG_PATH = log_original
+    LOTES.clear()
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {
+                "quando": datetime.now().isoformat(timespec="seconds"),
+                "git": _versao_git(),
+                "python": sys.version.split()[0],
+                "plataforma": platform.platform(),
+                "seed": args.seed,
+            },
+            "resultados": resultados,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {args.saida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+from __future__ import annotations
+import random
+from datetime import date, timedelta
+from typing import Dict, Any, Iterator, List
+
+from src.dominio import UF_VALIDAS, EVENTOS_VALIDOS, Lote, Evento
+
+# Sequência natural de eventos de um lote; cada lote recebe um prefixo dela.
+ORDEM_EVENTOS = ["COLHEITA", "TRANSPORTE", "ARMAZENAGEM", "INSPECAO"]
+assert set(ORDEM_EVENTOS) == EVENTOS_VALIDOS
+
+PRODUTOS = ["Soja", "Milho", "Café", "Cana", "Algodão", "Laranja", "Arroz", "Feijão",
+            "Trigo", "Abacaxi", "Melão", "Uva", "Manga", "Banana", "Cacau"]
+LOCAIS = ["Santos", "Paranaguá", "Piracicaba", "Rondonópolis", "Sorriso", "Uberlândia",
+          "Petrolina", "Itajaí", "Campinas", "Rio Verde"]
+RESPONSAVEIS = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabi", "Hugo"]
+_UFS = sorted(UF_VALIDAS)
+
+
+def gerar_lotes(n: int, seed: int = 42, hoje: date = date(2025, 10, 15),
+                produtores: int = 2000, id_inicial: int = 1) -> Iterator[Lote]:
+    """Gera ``n`` lotes determinísticos (mesma seed → mesmos lotes).
+
+    Colheitas nos 365 dias anteriores a ``hoje``; cada lote recebe de 0 a 4
+    eventos em ordem cronológica e fica PRONTO quando tem INSPECAO.
+    """
+    rnd = random.Random(seed)
+    for i in range(n):
+        colheita = hoje - timedelta(days=rnd.randint(0, 365))
+        eventos: List[Evento] = []
+        d = colheita
+        for tipo in ORDEM_EVENTOS[:rnd.choices(range(5), weights=(2, 3, 3, 2, 2))[0]]:
+            d = min(hoje, d + timedelta(days=rnd.randint(0, 10)))
+            eventos.append(Evento(tipo=tipo, data=d.isoformat(), local=rnd.choice(LOCAIS),
+                                  responsavel=rnd.choice(RESPONSAVEIS),
+                                  observacoes="" if rnd.random() < 0.8 else "Conferido"))
+        yield Lote(
+            id=id_inicial + i,
+            produto=rnd.choice(PRODUTOS),
+            produtor=f"Produtor {rnd.randrange(produtores):05d}",
+            origem_uf=rnd.choice(_UFS),
+            data_colheita=colheita.isoformat(),
+            peso_kg=round(rnd.uniform(50, 30000), 3),
+            carbono_neutro=rnd.random() < 0.35,
+            agua_reuso=rnd.random() < 0.45,
+            status="PRONTO" if eventos and eventos[-1]["tipo"] == "INSPECAO" else "EM_PROCESSAMENTO",
+            eventos=eventos,
+        )
+
+
+def gerar_cadastros(n: int, seed: int = 7, hoje: date = date(2025, 10, 15)) -> Iterator[Dict[str, Any]]:
+    """Entradas no formato aceito por ``cadastrar_lote``."""
+    rnd = random.Random(seed)
+    for _ in range(n):
+        yield {
+            "produto": rnd.choice(PRODUTOS),
+            "produtor": f"Produtor {rnd.randrange(2000):05d}",
+            "origem_uf": rnd.choice(_UFS),
+            "data_colheita": (hoje - timedelta(days=rnd.randint(0, 365))).isoformat(),
+            "peso_kg": str(round(rnd.uniform(50, 30000), 3)),
+            "agua_reuso": rnd.random() < 0.45,
+            "carbono_neutro": rnd.random() < 0.35,
+        }
+
+
+def gerar_eventos(n: int, max_id: int, seed: int = 11,
+                  hoje: date = date(2025, 10, 15)) -> Iterator[tuple]:
+    """Pares (lote_id, evento) no formato aceito por ``registrar_evento``."""
+    rnd = random.Random(seed)
+    for _ in range(n):
+        yield rnd.randint(1, max_id), {
+            "tipo": rnd.choice(ORDEM_EVENTOS),
+            "data": (hoje - timedelta(days=rnd.randint(0, 30))).isoformat(),
+            "local": rnd.choice(LOCAIS),
+            "responsavel": rnd.choice(RESPONSAVEIS),
+            "observacoes": "",
+        }
@@ -0,0 +1,165 @@
+from __future__ import annotations
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .sqlite_local import ConexaoSQLite, conectar_sqlite, criar_tabelas_sqlite
+
+# ---------- Driver Oracle falso (rede lenta / indisponível) ----------
+# Substitui o oracledb para exercitar a conexão em segundo plano sem um banco:
+#
+#   ORACLE_DRIVER=benchmarks.oracle_falso python -m src.main
+#
+#   ORACLE_FALSO_ATRASO_S=0   quanto cada connect demora (respeita tcp_connect_timeout)
+#   ORACLE_FALSO_FALHAS=0     quantas tentativas falham antes da primeira que conecta
+#                             (-1: nunca conecta)
+#   ORACLE_FALSO_DB=:memory:  banco SQLite devolvido (ver sqlite_local.py)
+#
+# connect() e create_pool() (acquire/release reaproveitam as sessões) abrem
+# conexões SQLite; as consultas, KPIs e inserções (uma a uma ou em massa) rodam
+# nelas, e as consultas ao dicionário (user_tables/user_indexes) vão para o
+# sqlite_master. Para os testes, ``chamadas`` registra cada connect,
+# create_pool, acquire e release com os parâmetros recebidos, e ``consultas``
+# cada SQL executado (como o código o enviou); reiniciar() zera tudo.
+
+NUMBER = "NUMBER"
+POOL_GETMODE_TIMEDWAIT = 3
+
+
+class DatabaseError(Exception):
+    pass
+
+class OperationalError(DatabaseError):
+    pass
+
+
+_LOCK = threading.Lock()
+tentativas = 0
+chamadas: List[Tuple[str, Dict[str, Any]]] = []
+consultas: List[str] = []
+
+
+def reiniciar() -> None:
+    global tentativas
+    with _LOCK:
+        tentativas = 0
+        chamadas.clear()
+        consultas.clear()
+
+def _registrar(nome: str, params: Dict[str, Any]) -> None:
+    with _LOCK:
+        chamadas.append((nome, params))
+
+
+# ---------- SQL ----------
+_DICIONARIO = re.compile(r"FROM\s+user_(tables|indexes)\s+WHERE\s+\w+\s*=\s*:(\w+)", re.IGNORECASE)
+_TIPOS = {"tables": "table", "indexes": "index"}
+
+def _traduzir(sql: str) -> str:
+    m = _DICIONARIO.search(sql)
+    if m is None:
+        return sql
+    tipo = _TIPOS[m.group(1).lower()]
+    return f"SELECT COUNT(*) FROM sqlite_master WHERE type = '{tipo}' AND upper(name) = :{m.group(2)}"
+
+
+class _Cursor:
+    def __init__(self, cur: Any):
+        self._cur = cur
+
+    def __getattr__(self, nome: str) -> Any:
+        return getattr(self._cur, nome)
+
+    def __enter__(self) -> "_Cursor":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._cur.__exit__(*exc)
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self._cur)
+
+    def execute(self, sql: str, params: Optional[Dict[str, Any]] = None) -> "_Cursor":
+        with _LOCK:
+            consultas.append(sql)
+        self._cur.execute(_traduzir(sql), params)
+        return self
+
+    def executemany(self, sql: str, params: List[Dict[str, Any]], **kw: Any) -> None:
+        with _LOCK:
+            consultas.append(sql)
+        self._cur.executemany(_traduzir(sql), params, **kw)
+
+
+class _Conexao:
+    def __init__(self, conn: ConexaoSQLite):
+        self._conn = conn
+        self.autocommit = False
+
+    def __getattr__(self, nome: str) -> Any:
+        return getattr(self._conn, nome)
+
+    def cursor(self) -> _Cursor:
+        return _Cursor(self._conn.cursor())
+
+
+# ---------- Conexões ----------
+def _abrir(tcp_connect_timeout: float) -> _Conexao:
+    global tentativas
+    atraso = float(os.getenv("ORACLE_FALSO_ATRASO_S", "0"))
+    falhas = int(os.getenv("ORACLE_FALSO_FALHAS", "0"))
+    with _LOCK:
+        tentativas += 1
+        n = tentativas
+    if atraso > tcp_connect_timeout:
+        time.sleep(tcp_connect_timeout)
+        raise OperationalError(f"DPY-6005: cannot connect to database (timeout {tcp_connect_timeout:g}s)")
+    time.sleep(atraso)
+    if falhas < 0 or n <= falhas:
+        raise OperationalError(f"DPY-6005: cannot connect to database (tentativa {n})")
+    conn = conectar_sqlite(os.getenv("ORACLE_FALSO_DB", ":memory:"))
+    criar_tabelas_sqlite(conn)
+    return _Conexao(conn)
+
+def connect(tcp_connect_timeout: float = 20.0, **params: Any) -> _Conexao:
+    _registrar("connect", dict(params, tcp_connect_timeout=tcp_connect_timeout))
+    return _abrir(tcp_connect_timeout)
+
+
+class Pool:
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+        self._livres: List[_Conexao] = []
+        self._emprestadas = 0
+
+    def acquire(self) -> _Conexao:
+        _registrar("acquire", {})
+        with _LOCK:
+            if self._emprestadas >= self.params.get("max", 1):
+                raise DatabaseError("DPY-4005: timed out waiting for the connection pool")
+            self._emprestadas += 1
+            conn = self._livres.pop() if self._livres else None
+        try:
+            return conn or _abrir(self.params.get("tcp_connect_timeout", 20.0))
+        except Exception:
+            with _LOCK:
+                self._emprestadas -= 1
+            raise
+
+    def release(self, conn: _Conexao) -> None:
+        _registrar("release", {})
+        with _LOCK:
+            self._emprestadas -= 1
+            self._livres.append(conn)
+
+    def close(self) -> None:
+        _registrar("close", {})
+        for conn in self._livres:
+            conn.close()
+        self._livres.clear()
+
+def create_pool(**params: Any) -> Pool:
+    _registrar("create_pool", params)
+    return Pool(params)
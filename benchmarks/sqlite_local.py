@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional
+
+# ---------- SQLite no lugar do Oracle (testes/conferência) ----------
+# Adaptador fino com a parte da API do oracledb usada pelas consultas e pelos
+# KPIs de persistencia_oracle (cursor como context manager, binds nomeados
+# :NOME, execute/executemany/fetch*, commit) e pelas inserções em massa:
+# "RETURNING <col> INTO :VAR" com cursor.var() (um valor por linha, como no
+# array DML) e executemany(batcherrors=True), em que as linhas que falham vão
+# para getbatcherrors() sem impedir as demais.
+#
+#   conn = conectar_sqlite("data/local.db"); criar_tabelas_sqlite(conn)
+#   kpis_db(conn)
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()[:10]))
+
+_RETURNING = re.compile(r"\s+RETURNING\s+(\w+)\s+INTO\s+:(\w+)\s*$", re.IGNORECASE)
+
+
+class Variavel:
+    """cursor.var(): getvalue(i) devolve [valor] da i-ésima linha executada."""
+    def __init__(self, arraysize: int):
+        self._valores: List[Any] = [None] * arraysize
+
+    def getvalue(self, pos: int = 0) -> Any:
+        return self._valores[pos]
+
+
+class ErroLinha:
+    """Item de getbatcherrors(): posição da linha em executemany e a mensagem."""
+    def __init__(self, offset: int, message: str):
+        self.offset = offset
+        self.message = message
+
+
+class _Cursor:
+    def __init__(self, cur: sqlite3.Cursor):
+        self._cur = cur
+        self.arraysize = 100
+        self.prefetchrows = 0
+        self._erros: List[ErroLinha] = []
+
+    def __enter__(self) -> "_Cursor":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._cur.close()
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self._cur)
+
+    def var(self, tipo: Any, arraysize: int = 1) -> Variavel:
+        return Variavel(arraysize)
+
+    def _executar(self, sql: str, params: Dict[str, Any], pos: int) -> None:
+        m = _RETURNING.search(sql)
+        if m is None:
+            self._cur.execute(sql, params)
+            return
+        params = dict(params)
+        destino = params.pop(m.group(2))
+        self._cur.execute(f"{sql[:m.start()]} RETURNING {m.group(1)}", params)
+        destino._valores[pos] = [self._cur.fetchone()[0]]
+
+    def execute(self, sql: str, params: Optional[Dict[str, Any]] = None) -> "_Cursor":
+        self._executar(sql, params or {}, 0)
+        return self
+
+    def executemany(self, sql: str, params: List[Dict[str, Any]], batcherrors: bool = False) -> None:
+        self._erros = []
+        if not batcherrors and _RETURNING.search(sql) is None:
+            self._cur.executemany(sql, params)
+            return
+        for pos, p in enumerate(params):
+            try:
+                self._executar(sql, p, pos)
+            except sqlite3.Error as e:
+                if not batcherrors:
+                    raise
+                self._erros.append(ErroLinha(pos, str(e)))
+
+    def getbatcherrors(self) -> List[ErroLinha]:
+        return self._erros
+
+    def fetchone(self) -> Optional[tuple]:
+        return self._cur.fetchone()
+
+    def fetchall(self) -> List[tuple]:
+        return self._cur.fetchall()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cur.rowcount
+
+    @property
+    def description(self):
+        return self._cur.description
+
+
+class ConexaoSQLite:
+    autocommit = False
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def cursor(self) -> _Cursor:
+        return _Cursor(self._conn.cursor())
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def conectar_sqlite(path: str = ":memory:") -> ConexaoSQLite:
+    conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return ConexaoSQLite(conn)
+
+def criar_tabelas_sqlite(conn: ConexaoSQLite, resumo: bool = True) -> None:
+    """LOTE/EVENTO (e as tabelas de resumo) com os tipos equivalentes do SQLite."""
+    from src.persistencia_oracle import reconstruir_resumo
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS LOTE (
+              ID INTEGER PRIMARY KEY AUTOINCREMENT,
+              PRODUTO TEXT NOT NULL, PRODUTOR TEXT NOT NULL, ORIGEM_UF CHAR(2) NOT NULL,
+              DATA_COLHEITA DATE NOT NULL, PESO_KG REAL CHECK (PESO_KG >= 0),
+              CARBONO_NEUTRO CHAR(1) DEFAULT 'N', AGUA_REUSO CHAR(1) DEFAULT 'N',
+              STATUS TEXT DEFAULT 'EM_PROCESSAMENTO')""")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS EVENTO (
+              ID INTEGER PRIMARY KEY AUTOINCREMENT,
+              LOTE_ID INTEGER NOT NULL REFERENCES LOTE(ID) ON DELETE CASCADE,
+              TIPO TEXT, DATA_EVENTO DATE NOT NULL, LOCAL TEXT, RESPONSAVEL TEXT, OBSERVACOES TEXT)""")
+        cur.execute("CREATE INDEX IF NOT EXISTS IDX_EVENTO_LOTE ON EVENTO(LOTE_ID)")
+        if resumo:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS LOTE_RESUMO (
+                  ORIGEM_UF CHAR(2) PRIMARY KEY, QTD INTEGER DEFAULT 0 NOT NULL,
+                  QTD_AGUA INTEGER DEFAULT 0 NOT NULL, QTD_CARBONO INTEGER DEFAULT 0 NOT NULL,
+                  PESO_TOTAL REAL DEFAULT 0 NOT NULL)""")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS LOTE_ATIVIDADE (
+                  LOTE_ID INTEGER PRIMARY KEY REFERENCES LOTE(ID) ON DELETE CASCADE,
+                  ULTIMA DATE NOT NULL)""")
+            cur.execute("CREATE INDEX IF NOT EXISTS IDX_ATIVIDADE_ULTIMA ON LOTE_ATIVIDADE(ULTIMA)")
+    if resumo:
+        reconstruir_resumo(conn, commit=False)
+    conn.commit()
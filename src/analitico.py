@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import weakref
+from datetime import date, datetime
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple
+
+from .compacto import ColunasLotes, _AGUA, _CARBONO
+from .metricas import instrumentar
+from .utils import iso_to_ordinal
+
+# ---------- Relatórios analíticos (NumPy) ----------
+# Os lotes viram colunas NumPy (códigos inteiros para UF/produto/status,
+# ordinais para datas) e cada relatório agrupado é um punhado de bincount
+# sobre a chave combinada das dimensões pedidas, sem laço por lote.
+# NumPy é opcional, como o pandas em persistencia_oracle.
+
+DIMENSOES = ("origem_uf", "produto", "status", "mes", "semana")
+FAIXAS_PARADOS = (7, 30, 90)  # dias sem atividade: ≤7, 8–30, 31–90, >90
+
+_EPOCA = date(1970, 1, 1).toordinal()
+
+
+def _np():
+    try:
+        import numpy as np
+    except Exception:  # numpy é opcional
+        raise RuntimeError("numpy não está disponível neste ambiente. pip install numpy")
+    return np
+
+def _codificar(valores: Iterable[str]) -> Tuple[List[int], List[str]]:
+    codigos: Dict[str, int] = {}
+    out = [codigos.setdefault(v, len(codigos)) for v in valores]
+    return out, list(codigos)
+
+
+class ColunasAnaliticas:
+    """Colunas NumPy de um conjunto de lotes (uma linha por lote)."""
+
+    def __init__(self, categorias: Dict[str, Tuple[Any, List[str]]], colheita, peso,
+                 agua, carbono, ultima):
+        self.categorias = categorias  # dimensão -> (códigos, rótulos)
+        self.colheita = colheita      # ordinal da data de colheita
+        self.peso = peso
+        self.agua = agua
+        self.carbono = carbono
+        self.ultima = ultima          # ordinal da última atividade (evento ou colheita)
+
+    def __len__(self) -> int:
+        return len(self.peso)
+
+    @classmethod
+    def de_lotes(cls, lotes: Sequence[Dict[str, Any]]) -> "ColunasAnaliticas":
+        if isinstance(lotes, ColunasLotes):
+            return cls.de_colunas(lotes)
+        np = _np()
+        categorias = {}
+        for dim in ("origem_uf", "produto", "status"):
+            cod, rot = _codificar([l[dim] for l in lotes])
+            categorias[dim] = (np.array(cod, dtype=np.int32), rot)
+        return cls(
+            categorias,
+            np.array([iso_to_ordinal(l["data_colheita"]) for l in lotes], dtype=np.int32),
+            np.array([l["peso_kg"] for l in lotes], dtype=np.float64),
+            np.array([bool(l["agua_reuso"]) for l in lotes], dtype=bool),
+            np.array([bool(l["carbono_neutro"]) for l in lotes], dtype=bool),
+            np.array([iso_to_ordinal(l["eventos"][-1]["data"] if l["eventos"] else l["data_colheita"])
+                      for l in lotes], dtype=np.int32),
+        )
+
+    @classmethod
+    def de_colunas(cls, col: ColunasLotes) -> "ColunasAnaliticas":
+        """Sem cópia por lote: reaproveita os arrays do formato compacto."""
+        np = _np()
+        flags = np.frombuffer(col.flags, dtype=np.uint8)
+        colheita = np.frombuffer(col.data_colheita, dtype=np.int32)
+        inicio = np.frombuffer(col.ev_inicio, dtype=np.int64)
+        ev_data = np.frombuffer(col.ev_data, dtype=np.int32)
+        tem_evento = inicio[1:] > inicio[:-1]
+        ultima = colheita.copy()
+        ultima[tem_evento] = ev_data[inicio[1:][tem_evento] - 1]
+        return cls(
+            {"origem_uf": (np.frombuffer(col.origem_uf, dtype=np.uint8).astype(np.int32), list(col.ufs.valores)),
+             "produto": (np.frombuffer(col.produto, dtype=np.uint32).astype(np.int32), list(col.produtos.valores)),
+             "status": (np.frombuffer(col.status, dtype=np.uint8).astype(np.int32), list(col.status_dic.valores))},
+            colheita,
+            np.frombuffer(col.peso_kg, dtype=np.float64),
+            (flags & _AGUA).astype(bool),
+            (flags & _CARBONO).astype(bool),
+            ultima,
+        )
+
+    def dimensao(self, dim: str) -> Tuple[Any, List[str]]:
+        """(códigos, rótulos) de uma dimensão; mês/semana saem da colheita."""
+        if dim in self.categorias:
+            return self.categorias[dim]
+        np = _np()
+        if dim == "mes":
+            rotulo = lambda d: date.fromordinal(d).strftime("%Y-%m")
+        elif dim == "semana":
+            rotulo = lambda d: "%d-W%02d" % date.fromordinal(d).isocalendar()[:2]
+        else:
+            raise ValueError(f"Dimensão inválida: {dim} (use {', '.join(DIMENSOES)}).")
+        if not len(self):
+            return np.zeros(0, dtype=np.int32), []
+        # as datas cobrem poucos milhares de dias: rotula cada dia uma vez e
+        # traduz a coluna com uma tabela (sem ordenar os lotes)
+        ini = int(self.colheita.min())
+        dias = np.arange(ini, int(self.colheita.max()) + 1)
+        por_dia = [rotulo(int(d)) for d in dias]
+        rot = sorted(set(por_dia))
+        codigo = {r: i for i, r in enumerate(rot)}
+        tabela = np.array([codigo[r] for r in por_dia], dtype=np.int32)
+        return tabela[self.colheita - ini], rot
+
+
+_CACHE: Tuple[Any, int, Optional[ColunasAnaliticas]] = (None, -1, None)
+
+def colunas(lotes: Any) -> ColunasAnaliticas:
+    """Colunas de ``lotes``; para um LoteStore, reaproveita as da última
+    chamada enquanto ``lotes.versao`` não mudar."""
+    global _CACHE
+    if isinstance(lotes, ColunasAnaliticas):
+        return lotes
+    versao = getattr(lotes, "versao", None)
+    if versao is None:
+        return ColunasAnaliticas.de_lotes(lotes)
+    ref, v, col = _CACHE
+    if col is None or v != versao or ref() is not lotes:
+        col = ColunasAnaliticas.de_lotes(lotes)
+        _CACHE = (weakref.ref(lotes), versao, col)
+    return col
+
+
+@instrumentar("kpis_agrupados")
+def kpis_agrupados(lotes: Any, dimensoes: Sequence[str], hoje: Optional[date] = None,
+                   faixas: Sequence[int] = FAIXAS_PARADOS) -> Dict[str, Any]:
+    """
+    KPIs por combinação das ``dimensoes`` (subconjunto de DIMENSOES).
+
+    ``lotes`` pode ser a lista/LoteStore, um ColunasLotes ou um
+    ColunasAnaliticas já montado (reaproveitável entre relatórios).
+    Cada grupo traz total, peso_total_kg, pct_agua_reuso, pct_carbono_neutro
+    e ``parados``: quantos lotes estão em cada faixa de dias desde a última
+    atividade (limites em ``faixas``; a última faixa é "mais que o último").
+    """
+    np = _np()
+    col = colunas(lotes)
+    hoje = hoje or datetime.now().date()
+    faixas = sorted(faixas)
+    rotulos_faixas = ([f"≤{faixas[0]}d"] + [f"{a + 1}–{b}d" for a, b in zip(faixas, faixas[1:])]
+                      + [f">{faixas[-1]}d"])
+    base = {"dimensoes": list(dimensoes), "faixas": rotulos_faixas, "grupos": []}
+    if not len(col):
+        return base
+
+    # chave combinada: código de cada dimensão em "base mista"
+    chave = np.zeros(len(col), dtype=np.int64)
+    rotulos = []
+    for dim in dimensoes:
+        cod, rot = col.dimensao(dim)
+        chave = chave * len(rot) + cod
+        rotulos.append(rot)
+    combinacoes = 1
+    for rot in rotulos:
+        combinacoes *= len(rot)
+    denso = combinacoes <= max(len(col), 1 << 20)
+    if denso:
+        inv, ng = chave, combinacoes  # chaves densas: bincount direto, sem ordenar
+    else:
+        grupos, inv = np.unique(chave, return_inverse=True)
+        ng = len(grupos)
+
+    nf = len(rotulos_faixas)
+    total = np.bincount(inv, minlength=ng)
+    peso = np.bincount(inv, weights=col.peso, minlength=ng)
+    agua = np.bincount(inv, weights=col.agua, minlength=ng)
+    carb = np.bincount(inv, weights=col.carbono, minlength=ng)
+    dias = hoje.toordinal() - col.ultima
+    faixa = np.searchsorted(np.asarray(faixas), dias, side="left")
+    parados = np.bincount(inv * nf + faixa, minlength=ng * nf).reshape(ng, nf)
+
+    presentes = np.flatnonzero(total)
+    grupos = presentes if denso else grupos[presentes]
+    # decompõe a chave de volta em rótulos, da última dimensão para a primeira
+    partes = []
+    resto = grupos.copy()
+    for rot in reversed(rotulos):
+        partes.append([rot[i] for i in (resto % len(rot)).tolist()])
+        resto //= len(rot)
+    partes.reverse()
+
+    tot = total[presentes]
+    linhas = [{"chave": chave_g, "total": t, "peso_total_kg": round(p, 2),
+               "pct_agua_reuso": round(a, 2), "pct_carbono_neutro": round(c, 2), "parados": par}
+              for chave_g, t, p, a, c, par in zip(
+                  zip(*partes) if partes else [()] * len(presentes), tot.tolist(),
+                  peso[presentes].tolist(), (100 * agua[presentes] / tot).tolist(),
+                  (100 * carb[presentes] / tot).tolist(), parados[presentes].tolist())]
+    linhas.sort(key=lambda r: r["chave"])
+    base["grupos"] = linhas
+    return base
@@ -1,22 +1,332 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Set, Callable, Tuple
 from .dominio import (
     Lote, Evento,
     validar_str_nao_vazia, validar_uf, validar_peso,
-    validar_data_br, validar_lote_dict
+    validar_data_br, validar_data_iso, validar_evento_dict, validar_lote_dict
 )
+from .linha_do_tempo import LinhaDoTempo, Ocorrencia
+from .metricas import instrumentar
+from .relatorios import KpisIncrementais
+from .utils import iso_to_date
 
 
-LOTES: List[Lote] = []
+class _IndiceOrdenado:
+    """Posições da lista ordenadas por uma chave (data, peso, nome...), para
+    buscas por faixa/prefixo com bisect. Lotes novos entram em ``pendentes`` e
+    são encaixados só na próxima consulta (ou o índice é refeito, se muitos)."""
+
+    def __init__(self, chave: Callable[[Lote], Any]):
+        self.chave = chave
+        self.chaves: List[Any] = []
+        self.posicoes: List[int] = []
+        self.pendentes: List[int] = []
+        self.valido = False
+
+    def adicionar(self, pos: int) -> None:
+        if self.valido:
+            self.pendentes.append(pos)
+
+    def invalidar(self) -> None:
+        self.valido = False
+        self.pendentes.clear()
+
+    def garantir(self, lotes: List[Lote]) -> None:
+        if self.valido and len(self.pendentes) * 64 <= len(self.posicoes):
+            for pos in self.pendentes:
+                k = self.chave(lotes[pos])
+                i = bisect_right(self.chaves, k)
+                self.chaves.insert(i, k)
+                self.posicoes.insert(i, pos)
+        elif not self.valido or self.pendentes:
+            pares = sorted(((self.chave(l), p) for p, l in enumerate(lotes)), key=lambda t: t[0])
+            self.chaves = [k for k, _ in pares]
+            self.posicoes = [p for _, p in pares]
+            self.valido = True
+        self.pendentes.clear()
+
+    def faixa(self, lo: Any = None, hi: Any = None) -> Tuple[int, int]:
+        """Intervalo [i, j) de ``posicoes`` com lo <= chave <= hi."""
+        i = 0 if lo is None else bisect_left(self.chaves, lo)
+        j = len(self.chaves) if hi is None else bisect_right(self.chaves, hi)
+        return i, max(i, j)
+
+    def decrescente(self) -> Iterator[int]:
+        """Posições da maior chave para a menor; empates em ordem de cadastro,
+        como na ordenação decrescente de consultar com filtros."""
+        j = len(self.chaves)
+        while j > 0:
+            i = bisect_left(self.chaves, self.chaves[j - 1], 0, j)
+            yield from self.posicoes[i:j]
+            j = i
+
+
+def _texto(v: str) -> str:
+    return v.strip().casefold()
+
+# campo -> chave usada no índice ordenado (e na ordenação do resultado)
+CHAVES_ORDENACAO: Dict[str, Callable[[Lote], Any]] = {
+    "id": lambda l: l["id"],
+    "data_colheita": lambda l: l["data_colheita"],  # ISO: ordem de string = ordem de data
+    "peso_kg": lambda l: float(l["peso_kg"]),
+    "produto": lambda l: _texto(l["produto"]),
+    "produtor": lambda l: _texto(l["produtor"]),
+}
+_INDEXADOS = ("data_colheita", "peso_kg", "produto", "produtor")
+_FLAGS = ("carbono_neutro", "agua_reuso")
+
+# (tamanho, posições candidatas, teste de uma posição, conjunto se for um)
+_Predicado = Tuple[int, Callable[[], Iterable[int]], Callable[[int], bool], Optional[Set[int]]]
+
+
+class LoteStore(list):
+    """Lista de lotes com índices mantidos em memória.
+
+    Continua sendo uma ``list`` (kpis, json.dumps e o exportador CSV iteram
+    normalmente), mas mantém um índice primário por id, o maior id já visto
+    e índices secundários (posições na lista) por UF, status e flags, índices
+    ordenados por data, peso, produto e produtor (ver consultar), além dos
+    KPIs incrementais em ``self.kpis`` e a linha do tempo dos eventos de todos
+    os lotes em ``self.linha_do_tempo`` (ver consultar_eventos/parados_desde).
+    ``versao`` muda a cada mutação (para caches derivados, como as colunas de
+    analitico).
+    Mutações devem passar por append/extend/clear/anexar_evento/
+    atualizar_status;
+    os demais métodos de list funcionam, mas reconstroem os índices.
+    """
+
+    def __init__(self, lotes: Iterable[Lote] = ()):
+        super().__init__()
+        self._por_id: Dict[int, int] = {}
+        self._por_uf: Dict[str, Set[int]] = {}
+        self._por_status: Dict[str, Set[int]] = {}
+        self._por_flag: Dict[Tuple[str, bool], Set[int]] = {}
+        self._ordenados = {c: _IndiceOrdenado(CHAVES_ORDENACAO[c]) for c in _INDEXADOS}
+        self._ultimo_id = 0
+        self.versao = 0
+        self.kpis = KpisIncrementais()
+        self.linha_do_tempo = LinhaDoTempo()
+        self.extend(lotes)
+
+    # ----- manutenção dos índices -----
+    def _indexar(self, pos: int, lote: Lote) -> None:
+        if lote["id"] in self._por_id:
+            raise ValueError(f"ID duplicado: {lote['id']}.")
+        self._por_id[lote["id"]] = pos
+        self._por_uf.setdefault(lote["origem_uf"].upper(), set()).add(pos)
+        self._por_status.setdefault(lote["status"].upper(), set()).add(pos)
+        for f in _FLAGS:
+            self._por_flag.setdefault((f, bool(lote[f])), set()).add(pos)
+        for idx in self._ordenados.values():
+            idx.adicionar(pos)
+        self._ultimo_id = max(self._ultimo_id, lote["id"])
+        self.kpis.adicionar(pos, lote)
+        self.linha_do_tempo.adicionar_lote(pos, lote)
+        self.versao += 1
+
+    def _reindexar(self) -> None:
+        self._por_id.clear(); self._por_uf.clear(); self._por_status.clear()
+        self._por_flag.clear()
+        for idx in self._ordenados.values():
+            idx.invalidar()
+        self.linha_do_tempo.invalidar()
+        self.versao += 1
+        self._ultimo_id = 0
+        self.kpis.limpar()
+        for pos, lote in enumerate(self):
+            self._indexar(pos, lote)
+
+    def append(self, lote: Lote) -> None:
+        self._indexar(len(self), lote)
+        super().append(lote)
+
+    def extend(self, lotes: Iterable[Lote]) -> None:
+        for lote in lotes:
+            self.append(lote)
+
+    def clear(self) -> None:
+        super().clear()
+        self._reindexar()
+
+    # ----- consultas -----
+    def proximo_id(self) -> int:
+        return self._ultimo_id + 1
+
+    def obter(self, lote_id: int) -> Optional[Lote]:
+        pos = self._por_id.get(lote_id)
+        return None if pos is None else self[pos]
+
+    def filtrar(self, uf: Optional[str] = None, status: Optional[str] = None) -> List[Lote]:
+        postings = []
+        if uf:
+            postings.append(self._por_uf.get(uf.upper(), set()))
+        if status:
+            postings.append(self._por_status.get(status.upper(), set()))
+        if not postings:
+            return list(self)
+        postings.sort(key=len)
+        menor, *resto = postings
+        pos = [p for p in menor if all(p in outro for outro in resto)]
+        return [self[p] for p in sorted(pos)]
+
+    def _predicado_conjunto(self, conj: Set[int]) -> _Predicado:
+        return len(conj), lambda: conj, conj.__contains__, conj
+
+    def _predicado_faixa(self, campo: str, lo: Any, hi: Any, prefixo: bool = False) -> _Predicado:
+        idx = self._ordenados[campo]
+        idx.garantir(self)
+        i, j = idx.faixa(lo, hi)
+        chave = idx.chave
+        if prefixo:
+            teste = lambda p: chave(self[p]).startswith(lo)
+        else:
+            teste = lambda p: (lo is None or chave(self[p]) >= lo) and (hi is None or chave(self[p]) <= hi)
+        return j - i, lambda: idx.posicoes[i:j], teste, None
+
+    def consultar(self, filtros: Optional[Dict[str, Any]] = None, ordenar: Optional[str] = None,
+                  limite: Optional[int] = None, offset: int = 0) -> Tuple[List[Lote], int]:
+        """
+        Consulta com filtros combinados (E lógico), ordenação e paginação.
+        Devolve (página, total de lotes que atendem aos filtros).
+
+        Filtros: ``origem_uf``, ``status``, ``carbono_neutro``/``agua_reuso``
+        (bool), ``data_de``/``data_ate`` (ISO, inclusivos), ``peso_min``/
+        ``peso_max`` e ``produto``/``produtor`` (prefixo, sem diferenciar
+        maiúsculas). ``ordenar`` é um campo de CHAVES_ORDENACAO, com "-" na
+        frente para ordem decrescente; sem ele, vale a ordem de cadastro.
+
+        Cada filtro vira uma lista de posições (conjunto ou faixa de um índice
+        ordenado); a menor é percorrida e as demais só são testadas.
+        """
+        f = {k: v for k, v in (filtros or {}).items() if v is not None and v != ""}
+        preds: List[_Predicado] = []
+        if "origem_uf" in f:
+            preds.append(self._predicado_conjunto(self._por_uf.get(str(f["origem_uf"]).upper(), set())))
+        if "status" in f:
+            preds.append(self._predicado_conjunto(self._por_status.get(str(f["status"]).upper(), set())))
+        for flag in _FLAGS:
+            if flag in f:
+                preds.append(self._predicado_conjunto(self._por_flag.get((flag, bool(f[flag])), set())))
+        if "data_de" in f or "data_ate" in f:
+            preds.append(self._predicado_faixa("data_colheita", f.get("data_de"), f.get("data_ate")))
+        if "peso_min" in f or "peso_max" in f:
+            lo, hi = f.get("peso_min"), f.get("peso_max")
+            preds.append(self._predicado_faixa("peso_kg", None if lo is None else float(lo),
+                                               None if hi is None else float(hi)))
+        for campo in ("produto", "produtor"):
+            if campo in f:
+                ini = _texto(str(f[campo]))
+                preds.append(self._predicado_faixa(campo, ini, ini + "\U0010ffff", prefixo=True))
+
+        campo, desc = (ordenar or "").lstrip("-"), (ordenar or "").startswith("-")
+        if campo and campo not in CHAVES_ORDENACAO:
+            raise ValueError(f"Ordenação inválida: {ordenar}.")
+        fim = None if limite is None else offset + limite
+
+        if not preds:
+            total = len(self)
+            if not campo:
+                return list(self[offset:fim]), total
+            if campo in self._ordenados:  # a página sai direto do índice
+                idx = self._ordenados[campo]
+                idx.garantir(self)
+                ordem = idx.decrescente() if desc else iter(idx.posicoes)
+                pos = [p for _, p in zip(range(fim if fim is not None else total), ordem)]
+                return [self[p] for p in pos[offset:]], total
+            candidatos: Iterable[int] = range(total)
+        else:
+            preds.sort(key=lambda t: t[0])
+            menor = preds[0]
+            if menor[3] is not None:
+                # conjuntos se cruzam direto (set.intersection percorre o menor)
+                base = menor[3].intersection(*[c for *_, c in preds[1:] if c is not None])
+                testes = [t for _, _, t, c in preds[1:] if c is None]
+            else:
+                base = menor[1]()
+                testes = [t for _, _, t, _ in preds[1:]]
+            candidatos = [p for p in base if all(t(p) for t in testes)]
+            total = len(candidatos)
+
+        if not campo:
+            pos = sorted(candidatos)[offset:fim]
+        else:
+            chave = CHAVES_ORDENACAO[campo]
+            k = (lambda p: (chave(self[p]), -p)) if desc else (lambda p: (chave(self[p]), p))
+            if fim is not None and fim < total:
+                pos = (heapq.nlargest if desc else heapq.nsmallest)(fim, candidatos, key=k)
+            else:
+                pos = sorted(candidatos, key=k, reverse=desc)
+            pos = pos[offset:fim]
+        return [self[p] for p in pos], total
+
+    def consultar_eventos(self, de: Optional[str] = None, ate: Optional[str] = None,
+                          tipo: Optional[str] = None, local: Optional[str] = None,
+                          limite: Optional[int] = None, recentes: bool = False) -> Tuple[List[Ocorrencia], int]:
+        """Eventos de todos os lotes por período (ISO, inclusivo), tipo e local:
+        ([(lote, evento)...], total). Ver LinhaDoTempo.consultar."""
+        return self.linha_do_tempo.consultar(self, de, ate, tipo, local, limite, recentes)
+
+    def parados_desde(self, data_iso: str, limite: Optional[int] = None) -> Tuple[List[Lote], int]:
+        """Lotes sem atividade (último evento, ou a colheita) desde ``data_iso``,
+        do mais parado para o menos: (até ``limite`` lotes, total)."""
+        d = iso_to_date(data_iso)
+        return [self[p] for p in islice(self.kpis.parados_desde(d), limite)], self.kpis.sem_evento_desde(d)
+
+    # ----- atualizações -----
+    def anexar_evento(self, lote: Lote, evento: Evento, posicao: Optional[int] = None) -> None:
+        """Acrescenta ``evento`` ao fim (ou antes de ``posicao``) dos eventos do lote."""
+        pos = self._por_id[lote["id"]]
+        if posicao is None or posicao >= len(lote["eventos"]):
+            lote["eventos"].append(evento)
+            self.kpis.registrar_evento(pos, evento["data"])
+        else:
+            lote["eventos"].insert(posicao, evento)  # o último evento (última atividade) não muda
+        self.linha_do_tempo.adicionar(pos, evento)
+        self.versao += 1
+
+    def atualizar_status(self, lote: Lote, status: str) -> None:
+        pos = self._por_id[lote["id"]]
+        self._por_status[lote["status"].upper()].discard(pos)
+        lote["status"] = status
+        self._por_status.setdefault(status.upper(), set()).add(pos)
+        self.versao += 1
+
+
+def _reindexando(nome: str):
+    metodo = getattr(list, nome)
+    def wrapper(self, *args, **kwargs):
+        r = metodo(self, *args, **kwargs)
+        self._reindexar()
+        return r
+    wrapper.__name__ = nome
+    return wrapper
+
+for _nome in ("insert", "remove", "pop", "sort", "reverse",
+              "__setitem__", "__delitem__", "__iadd__"):
+    setattr(LoteStore, _nome, _reindexando(_nome))
+
+
+LOTES: LoteStore = LoteStore()
+# Serializa mutações de LOTES entre o menu e o trabalhador de persistência
+LOCK = threading.RLock()
 
 def proximo_id() -> int:
-    return max((l["id"] for l in LOTES), default=0) + 1
+    return LOTES.proximo_id()
 
+@instrumentar("cadastrar_lote")
 def cadastrar_lote(dados: Dict[str, Any]) -> Lote:
     produto = validar_str_nao_vazia(dados["produto"], "Produto")
     produtor = validar_str_nao_vazia(dados["produtor"], "Produtor")
     uf = validar_uf(dados["origem_uf"])
-    data_iso = validar_data_br(dados["data_colheita_br"])
+    # aceita a data já em ISO (evita ida e volta BR -> ISO -> BR)
+    if "data_colheita" in dados:
+        data_iso = validar_data_iso(dados["data_colheita"])
+    else:
+        data_iso = validar_data_br(dados["data_colheita_br"])
     peso = validar_peso(dados["peso_kg"])
     agua_reuso = bool(dados.get("agua_reuso", False))
     carbono_neutro = bool(dados.get("carbono_neutro", False))
@@ -36,28 +346,46 @@ def cadastrar_lote(dados: Dict[str, Any]) -> Lote:
     validar_lote_dict(lote)
     return lote
 
+@instrumentar("registrar_evento")
 def registrar_evento(lote_id: int, ev_br: Dict[str, Any]) -> bool:
     tipo = validar_str_nao_vazia(ev_br["tipo"], "Tipo").upper()
-    data_iso = validar_data_br(ev_br["data_br"])
+    data_iso = validar_data_iso(ev_br["data"]) if "data" in ev_br else validar_data_br(ev_br["data_br"])
     local = validar_str_nao_vazia(ev_br["local"], "Local")
     resp = validar_str_nao_vazia(ev_br["responsavel"], "Responsável")
     obs = ev_br.get("observacoes","").strip()
 
-    for l in LOTES:
-        if l["id"] == lote_id:
-            evento: Evento = Evento(tipo=tipo, data=data_iso, local=local, responsavel=resp, observacoes=obs)
-            l["eventos"].append(evento)
-            if tipo == "INSPECAO":
-                l["status"] = "PRONTO"
-            return True
-    return False
+    l = LOTES.obter(lote_id)
+    if l is None:
+        return False
+    evento: Evento = Evento(tipo=tipo, data=data_iso, local=local, responsavel=resp, observacoes=obs)
+    validar_evento_dict(evento)  # antes de entrar em LOTES e no journal
+    LOTES.anexar_evento(l, evento)
+    if tipo == "INSPECAO":
+        LOTES.atualizar_status(l, "PRONTO")
+    return True
 
+@instrumentar("listar_lotes")
 def listar_lotes(filtros: Optional[Dict[str, Any]] = None) -> List[Lote]:
     if not filtros:
         return LOTES
-    res = LOTES
-    if uf := filtros.get("origem_uf"):
-        res = [l for l in res if l["origem_uf"] == uf.upper()]
-    if status := filtros.get("status"):
-        res = [l for l in res if l["status"].upper() == status.upper()]
-    return res
+    if set(filtros) <= {"origem_uf", "status"}:
+        return LOTES.filtrar(filtros.get("origem_uf"), filtros.get("status"))
+    return LOTES.consultar(filtros)[0]
+
+@instrumentar("consultar_eventos")
+def consultar_eventos(de: Optional[str] = None, ate: Optional[str] = None, tipo: Optional[str] = None,
+                      local: Optional[str] = None, limite: Optional[int] = None,
+                      recentes: bool = False) -> Tuple[List[Ocorrencia], int]:
+    """Linha do tempo de eventos de todos os lotes (ver LoteStore.consultar_eventos)."""
+    return LOTES.consultar_eventos(de, ate, tipo, local, limite, recentes)
+
+@instrumentar("lotes_parados")
+def lotes_parados(data_iso: str, limite: Optional[int] = None) -> Tuple[List[Lote], int]:
+    """Lotes sem atividade desde ``data_iso`` (ver LoteStore.parados_desde)."""
+    return LOTES.parados_desde(data_iso, limite)
+
+@instrumentar("consultar_lotes")
+def consultar_lotes(filtros: Optional[Dict[str, Any]] = None, ordenar: Optional[str] = None,
+                    limite: Optional[int] = None, offset: int = 0) -> Tuple[List[Lote], int]:
+    """Página de lotes + total (ver LoteStore.consultar)."""
+    return LOTES.consultar(filtros, ordenar, limite, offset)
@@ -0,0 +1,181 @@
+from __future__ import annotations
+import sys
+from array import array
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+
+from .dominio import Lote, Evento
+from .utils import iso_to_ordinal as _iso_para_ordinal, ordinal_to_iso as _ordinal_para_iso
+
+# Representação compacta (opcional) dos lotes para bases grandes em memória.
+# A conversão para/de dict (formato Lote/Evento do dominio) é feita na borda
+# da persistência; datas válidas em ISO (YYYY-MM-DD) voltam idênticas.
+
+
+class Dicionario:
+    """Codificação por dicionário: cada valor distinto vira um inteiro."""
+    __slots__ = ("valores", "_codigos")
+
+    def __init__(self) -> None:
+        self.valores: List[str] = []
+        self._codigos: Dict[str, int] = {}
+
+    def codigo(self, valor: str) -> int:
+        c = self._codigos.get(valor)
+        if c is None:
+            c = self._codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return c
+
+    def __len__(self) -> int:
+        return len(self.valores)
+
+
+# ---------- Registros com __slots__ ----------
+class EventoCompacto:
+    __slots__ = ("tipo", "data", "local", "responsavel", "observacoes")
+
+    def __init__(self, tipo: str, data: int, local: str, responsavel: str, observacoes: str):
+        self.tipo = sys.intern(tipo)
+        self.data = data
+        self.local = sys.intern(local)
+        self.responsavel = sys.intern(responsavel)
+        self.observacoes = observacoes
+
+    @classmethod
+    def de_dict(cls, ev: Dict[str, Any]) -> "EventoCompacto":
+        return cls(ev["tipo"], _iso_para_ordinal(ev["data"]), ev["local"],
+                   ev["responsavel"], ev["observacoes"])
+
+    def para_dict(self) -> Evento:
+        return Evento(tipo=self.tipo, data=_ordinal_para_iso(self.data), local=self.local,
+                      responsavel=self.responsavel, observacoes=self.observacoes)
+
+
+class LoteCompacto:
+    """Lote com __slots__, strings categóricas internadas e data em ordinal."""
+    __slots__ = ("id", "produto", "produtor", "origem_uf", "data_colheita", "peso_kg",
+                 "carbono_neutro", "agua_reuso", "status", "eventos")
+
+    def __init__(self, id: int, produto: str, produtor: str, origem_uf: str, data_colheita: int,
+                 peso_kg: float, carbono_neutro: bool, agua_reuso: bool, status: str,
+                 eventos: List[EventoCompacto]):
+        self.id = id
+        self.produto = sys.intern(produto)
+        self.produtor = sys.intern(produtor)
+        self.origem_uf = sys.intern(origem_uf)
+        self.data_colheita = data_colheita
+        self.peso_kg = peso_kg
+        self.carbono_neutro = carbono_neutro
+        self.agua_reuso = agua_reuso
+        self.status = sys.intern(status)
+        self.eventos = eventos
+
+    @classmethod
+    def de_dict(cls, l: Dict[str, Any]) -> "LoteCompacto":
+        return cls(l["id"], l["produto"], l["produtor"], l["origem_uf"],
+                   _iso_para_ordinal(l["data_colheita"]), float(l["peso_kg"]),
+                   bool(l["carbono_neutro"]), bool(l["agua_reuso"]), l["status"],
+                   [EventoCompacto.de_dict(ev) for ev in l["eventos"]])
+
+    def para_dict(self) -> Lote:
+        return Lote(id=self.id, produto=self.produto, produtor=self.produtor,
+                    origem_uf=self.origem_uf, data_colheita=_ordinal_para_iso(self.data_colheita),
+                    peso_kg=self.peso_kg, carbono_neutro=self.carbono_neutro,
+                    agua_reuso=self.agua_reuso, status=self.status,
+                    eventos=[ev.para_dict() for ev in self.eventos])
+
+
+# ---------- Armazenamento colunar ----------
+_CARBONO, _AGUA = 1, 2  # bits de ColunasLotes.flags
+
+class ColunasLotes:
+    """
+    Lotes guardados em colunas (``array``) com campos textuais codificados
+    por dicionário. Os eventos ficam em colunas próprias, no layout CSR:
+    os eventos do lote ``i`` ocupam ``ev_inicio[i]:ev_inicio[i+1]``.
+    Suporta apenas inclusão de lotes no fim; para alterar, converta para dict.
+    """
+
+    def __init__(self) -> None:
+        self.produtos, self.produtores = Dicionario(), Dicionario()
+        self.ufs, self.status_dic = Dicionario(), Dicionario()
+        self.tipos, self.locais = Dicionario(), Dicionario()
+        self.responsaveis, self.observacoes = Dicionario(), Dicionario()
+
+        self.id = array("q")
+        self.produto = array("I")
+        self.produtor = array("I")
+        self.origem_uf = array("B")
+        self.data_colheita = array("i")
+        self.peso_kg = array("d")
+        self.flags = array("B")
+        self.status = array("B")
+
+        self.ev_inicio = array("q", [0])
+        self.ev_tipo = array("B")
+        self.ev_data = array("i")
+        self.ev_local = array("I")
+        self.ev_responsavel = array("I")
+        self.ev_observacoes = array("I")
+
+    @classmethod
+    def de_lotes(cls, lotes: Iterable[Dict[str, Any]]) -> "ColunasLotes":
+        col = cls()
+        for l in lotes:
+            col.append(l)
+        return col
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def append(self, l: Dict[str, Any]) -> None:
+        self.id.append(l["id"])
+        self.produto.append(self.produtos.codigo(l["produto"]))
+        self.produtor.append(self.produtores.codigo(l["produtor"]))
+        self.origem_uf.append(self.ufs.codigo(l["origem_uf"]))
+        self.data_colheita.append(_iso_para_ordinal(l["data_colheita"]))
+        self.peso_kg.append(float(l["peso_kg"]))
+        self.flags.append((_CARBONO if l["carbono_neutro"] else 0) | (_AGUA if l["agua_reuso"] else 0))
+        self.status.append(self.status_dic.codigo(l["status"]))
+        for ev in l["eventos"]:
+            self.ev_tipo.append(self.tipos.codigo(ev["tipo"]))
+            self.ev_data.append(_iso_para_ordinal(ev["data"]))
+            self.ev_local.append(self.locais.codigo(ev["local"]))
+            self.ev_responsavel.append(self.responsaveis.codigo(ev["responsavel"]))
+            self.ev_observacoes.append(self.observacoes.codigo(ev["observacoes"]))
+        self.ev_inicio.append(len(self.ev_tipo))
+
+    def eventos(self, i: int) -> Iterator[Evento]:
+        for j in range(self.ev_inicio[i], self.ev_inicio[i + 1]):
+            yield Evento(tipo=self.tipos.valores[self.ev_tipo[j]],
+                         data=_ordinal_para_iso(self.ev_data[j]),
+                         local=self.locais.valores[self.ev_local[j]],
+                         responsavel=self.responsaveis.valores[self.ev_responsavel[j]],
+                         observacoes=self.observacoes.valores[self.ev_observacoes[j]])
+
+    def lote(self, i: int) -> Lote:
+        f = self.flags[i]
+        return Lote(id=self.id[i],
+                    produto=self.produtos.valores[self.produto[i]],
+                    produtor=self.produtores.valores[self.produtor[i]],
+                    origem_uf=self.ufs.valores[self.origem_uf[i]],
+                    data_colheita=_ordinal_para_iso(self.data_colheita[i]),
+                    peso_kg=self.peso_kg[i],
+                    carbono_neutro=bool(f & _CARBONO),
+                    agua_reuso=bool(f & _AGUA),
+                    status=self.status_dic.valores[self.status[i]],
+                    eventos=list(self.eventos(i)))
+
+    def para_lotes(self) -> Iterator[Lote]:
+        for i in range(len(self)):
+            yield self.lote(i)
+
+    def bytes_estimados(self) -> Tuple[int, int]:
+        """(bytes das colunas, bytes aproximados dos dicionários)."""
+        cols = [self.id, self.produto, self.produtor, self.origem_uf, self.data_colheita,
+                self.peso_kg, self.flags, self.status, self.ev_inicio, self.ev_tipo,
+                self.ev_data, self.ev_local, self.ev_responsavel, self.ev_observacoes]
+        dics = [self.produtos, self.produtores, self.ufs, self.status_dic, self.tipos,
+                self.locais, self.responsaveis, self.observacoes]
+        return (sum(c.itemsize * len(c) for c in cols),
+                sum(sys.getsizeof(v) for d in dics for v in d.valores))
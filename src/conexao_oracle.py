@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Callable, List, Optional
+
+from .utils import log
+
+# ---------- Conexão Oracle em segundo plano ----------
+# O boot não espera o Oracle: uma thread importa o driver e conecta enquanto
+# o menu já aparece. Se a tentativa falhar, tenta de novo com espera
+# exponencial; se a conexão cair no meio do uso, quem perceber chama
+# falhou() e a thread reconecta. Quem precisa do banco escolhe, a cada
+# chamada, entre atual() (não espera) e aguardar() (espera até o prazo).
+# Configuração pelo .env (lida em iniciar(), depois do load_dotenv):
+#   ORACLE_PRAZO_S=10            espera máxima de uma ação pela conexão
+#   ORACLE_RECONEXAO_S=2         primeira espera entre tentativas (dobra a cada falha)
+#   ORACLE_RECONEXAO_MAX_S=120   teto da espera entre tentativas
+# O tempo de cada tentativa é limitado por ORACLE_CONNECT_TIMEOUT_S
+# (persistencia_oracle).
+
+# Erros que indicam conexão perdida/inalcançável (vale reconectar), e não
+# erro da própria operação (constraint, SQL inválido...)
+_ERROS_CONEXAO = ("DPY-1001", "DPY-4011", "DPY-6005", "DPI-1010", "DPI-1080",
+                  "ORA-03113", "ORA-03114", "ORA-03135", "ORA-12170", "ORA-12541")
+
+def erro_de_conexao(e: BaseException) -> bool:
+    return isinstance(e, (ConnectionError, TimeoutError)) or any(c in str(e) for c in _ERROS_CONEXAO)
+
+
+class ConexaoOracle:
+    """Conexão Oracle aberta (e reaberta) por uma thread própria."""
+
+    def __init__(self, conectar: Optional[Callable[[], Any]] = None,
+                 prazo: Optional[float] = None, reconexao: Optional[float] = None,
+                 reconexao_max: Optional[float] = None):
+        self._conectar = conectar  # None: conectar_oracle_from_env
+        self.prazo = prazo
+        self.reconexao = reconexao
+        self.reconexao_max = reconexao_max
+        self.erro: Optional[str] = None  # último erro de conexão
+        self.tentativas = 0
+        self.desistiu = False            # erro de configuração: não adianta tentar de novo
+        self._conn: Any = None
+        self._lock = threading.Lock()
+        self._pronta = threading.Event()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._ouvintes: List[Callable[[Any], None]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    # ----- lado de quem usa -----
+    def iniciar(self) -> None:
+        if self._thread is not None:
+            return
+        if self.prazo is None:
+            self.prazo = float(os.getenv("ORACLE_PRAZO_S", "10"))
+        if self.reconexao is None:
+            self.reconexao = float(os.getenv("ORACLE_RECONEXAO_S", "2"))
+        if self.reconexao_max is None:
+            self.reconexao_max = float(os.getenv("ORACLE_RECONEXAO_MAX_S", "120"))
+        self._thread = threading.Thread(target=self._laco, name="oracle", daemon=True)
+        self._thread.start()
+
+    def atual(self) -> Any:
+        """A conexão, se já estiver aberta; não espera."""
+        return self._conn
+
+    def aguardar(self, prazo: Optional[float] = None) -> Any:
+        """Espera a conexão por até ``prazo`` segundos (padrão ORACLE_PRAZO_S);
+        None se não ficou pronta a tempo."""
+        if self._conn is None and self.conectando:
+            self._pronta.wait(self.prazo if prazo is None else prazo)
+        return self._conn
+
+    @property
+    def conectando(self) -> bool:
+        return (self._conn is None and self._thread is not None and self._thread.is_alive()
+                and not self._parar.is_set())
+
+    def estado(self) -> str:
+        if self._conn is not None:
+            return "conectado"
+        if self.conectando:
+            return "conectando..." if not self.tentativas else f"reconectando ({self.tentativas} falha(s))"
+        return "indisponível"
+
+    def ao_conectar(self, fn: Callable[[Any], None]) -> None:
+        """Chama ``fn(conn)`` a cada (re)conexão e ``fn(None)`` quando ela cai.
+        Se já estiver conectado, chama na hora."""
+        with self._lock:
+            self._ouvintes.append(fn)
+            conn = self._conn
+        if conn is not None:
+            fn(conn)
+
+    def falhou(self, conn: Any, e: BaseException) -> bool:
+        """Avisa que uma operação em ``conn`` falhou. Se o erro for de conexão,
+        descarta a conexão e acorda a thread para reconectar."""
+        if not erro_de_conexao(e):
+            return False
+        with self._lock:
+            if conn is None or conn is not self._conn:
+                return True  # já descartada/reaberta por outra chamada
+            self._conn = None
+            self._pronta.clear()
+            ouvintes = list(self._ouvintes)
+        self.erro = str(e)
+        log(f"ERRO Oracle: conexão perdida ({e}); reconectando em segundo plano.")
+        self._avisar(ouvintes, None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._acordar.set()
+        return True
+
+    def parar(self) -> None:
+        self._parar.set()
+        self._acordar.set()
+        self._pronta.set()  # libera quem estiver em aguardar()
+
+    # ----- thread -----
+    def _abrir(self) -> Any:
+        if self._conectar is not None:
+            return self._conectar()
+        from .persistencia_oracle import conectar_oracle_from_env
+        return conectar_oracle_from_env()
+
+    def _avisar(self, ouvintes: List[Callable[[Any], None]], conn: Any) -> None:
+        for fn in ouvintes:
+            try:
+                fn(conn)
+            except Exception as e:
+                log(f"ERRO Oracle: aviso de conexão falhou ({e})")
+
+    def _laco(self) -> None:
+        espera = self.reconexao
+        while not self._parar.is_set():
+            if self._conn is not None:
+                self._acordar.wait()
+                self._acordar.clear()
+                continue
+            try:
+                conn = self._abrir()
+            except RuntimeError as e:
+                # driver ausente ou .env incompleto: não muda sozinho
+                self.erro, self.desistiu = str(e), True
+                log(f"Oracle indisponível ({e}); seguindo apenas com JSON.")
+                self._pronta.set()
+                return
+            except Exception as e:
+                self.erro = str(e)
+                self.tentativas += 1
+                log(f"Oracle indisponível ({e}); nova tentativa em {espera:g}s.")
+                self._acordar.wait(espera)
+                self._acordar.clear()
+                espera = min(espera * 2, self.reconexao_max)
+                continue
+            if self._parar.is_set():
+                conn.close()
+                return
+            with self._lock:
+                self._conn = conn
+                ouvintes = list(self._ouvintes)
+            self.erro, self.tentativas, espera = None, 0, self.reconexao
+            log("Oracle conectado.")
+            self._pronta.set()
+            self._avisar(ouvintes, conn)
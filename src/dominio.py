@@ -1,7 +1,6 @@
 from __future__ import annotations
 from typing import TypedDict, Literal, List, Dict, Any
-from datetime import datetime
-from .utils import br_to_iso
+from .utils import br_to_iso, iso_to_ordinal, ordinal_to_iso
 
 UF_VALIDAS = {
     "AC","AL","AM","AP","BA","CE","DF","ES","GO","MA","MG","MS","MT",
@@ -54,6 +53,13 @@ def validar_peso(p: str | float | int) -> float:
 def validar_data_br(data_br: str) -> str:
     return br_to_iso(data_br)
 
+def validar_data_iso(data_iso: str) -> str:
+    """Valida uma data ISO e devolve a forma canônica YYYY-MM-DD."""
+    try:
+        return ordinal_to_iso(iso_to_ordinal(data_iso.strip()))
+    except Exception:
+        raise ValueError("Data inválida (use ISO YYYY-MM-DD).")
+
 def validar_evento_dict(ev: Dict[str, Any]) -> None:
     for k in ["tipo", "data", "local", "responsavel", "observacoes"]:
         if k not in ev:
@@ -61,7 +67,7 @@ def validar_evento_dict(ev: Dict[str, Any]) -> None:
     if ev["tipo"].upper() not in EVENTOS_VALIDOS:
         raise ValueError("Tipo de evento inválido.")
     try:
-        datetime.strptime(ev["data"], "%Y-%m-%d")
+        iso_to_ordinal(ev["data"])
     except Exception:
         raise ValueError("Data do evento inválida (use ISO YYYY-MM-DD)")
 
@@ -74,7 +80,7 @@ def validar_lote_dict(l: Dict[str, Any]) -> None:
     if l["origem_uf"] not in UF_VALIDAS:
         raise ValueError("UF inválida.")
     try:
-        datetime.strptime(l["data_colheita"], "%Y-%m-%d")
+        iso_to_ordinal(l["data_colheita"])
     except Exception:
         raise ValueError("Data de colheita inválida (ISO YYYY-MM-DD).")
     if float(l["peso_kg"]) < 0:
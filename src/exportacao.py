@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import json
+from typing import Dict, Any, Iterable, Optional, Callable, TextIO
+
+from .utils import log
+
+# ---------- Exportação em streaming ----------
+# Escreve a partir de qualquer iterável de lotes (lista em memória, gerador do
+# JSON ou cursor do Oracle), um lote por vez, com escrita bufferizada; nada é
+# materializado. Destinos terminados em ".gz" são comprimidos com gzip.
+
+FORMATOS = ("csv", "csv_eventos", "jsonl")
+
+CAMPOS_LOTE = ["id","produto","produtor","origem_uf","data_colheita","peso_kg",
+               "carbono_neutro","agua_reuso","status","qtd_eventos"]
+CAMPOS_EVENTO = ["lote_id","tipo","data","local","responsavel","observacoes"]
+
+Progresso = Callable[[int], None]  # lotes exportados até agora
+
+
+def _abrir(destino: str, buffer: int) -> TextIO:
+    if destino.endswith(".gz"):
+        bruto = io.BufferedWriter(gzip.open(destino, "wb", compresslevel=6), buffer_size=buffer)
+        return io.TextIOWrapper(bruto, encoding="utf-8", newline="")
+    return open(destino, "w", encoding="utf-8", newline="", buffering=buffer)
+
+def formato_por_extensao(destino: str) -> str:
+    nome = destino[:-3] if destino.endswith(".gz") else destino
+    return "jsonl" if nome.endswith((".jsonl", ".ndjson")) else "csv"
+
+def _linha_lote(l: Dict[str, Any]) -> list:
+    return [l["id"], l["produto"], l["produtor"], l["origem_uf"], l["data_colheita"],
+            l["peso_kg"], int(bool(l["carbono_neutro"])), int(bool(l["agua_reuso"])),
+            l["status"], len(l["eventos"])]
+
+def exportar_lotes(lotes: Iterable[Dict[str, Any]], destino: str,
+                   formato: Optional[str] = None, progresso: Optional[Progresso] = None,
+                   a_cada: int = 10_000, buffer: int = 1 << 20) -> int:
+    """
+    Exporta os lotes para ``destino`` e devolve quantos foram escritos.
+
+    Formatos: "csv" (um lote por linha, como o exportar_csv_lotes original),
+    "csv_eventos" (um evento por linha, com lote_id) e "jsonl" (um lote
+    completo por linha). Sem ``formato``, usa a extensão do destino.
+    ``progresso`` é chamado a cada ``a_cada`` lotes e ao final.
+    """
+    formato = formato or formato_por_extensao(destino)
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato} (use {', '.join(FORMATOS)}).")
+
+    n = 0
+    with _abrir(destino, buffer) as f:
+        if formato == "jsonl":
+            for l in lotes:
+                f.write(json.dumps(l, ensure_ascii=False))
+                f.write("\n")
+                n += 1
+                if progresso and n % a_cada == 0:
+                    progresso(n)
+        else:
+            w = csv.writer(f, delimiter=";", lineterminator="\r\n")
+            if formato == "csv":
+                w.writerow(CAMPOS_LOTE)
+                for l in lotes:
+                    w.writerow(_linha_lote(l))
+                    n += 1
+                    if progresso and n % a_cada == 0:
+                        progresso(n)
+            else:
+                w.writerow(CAMPOS_EVENTO)
+                for l in lotes:
+                    w.writerows([l["id"], ev["tipo"], ev["data"], ev["local"],
+                                 ev["responsavel"], ev["observacoes"]] for ev in l["eventos"])
+                    n += 1
+                    if progresso and n % a_cada == 0:
+                        progresso(n)
+    if progresso:
+        progresso(n)
+    log(f"exportar_{formato}: OK ({n} lotes) → {destino}")
+    return n
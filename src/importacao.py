@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import json
+import os
+from typing import List, Any, Iterator, Optional, Tuple
+
+from .casos_uso import LOTES, LOCK
+from .dominio import (
+    Lote, validar_str_nao_vazia, validar_uf, validar_peso,
+    validar_data_br, validar_data_iso, validar_evento_dict
+)
+from .persistencia_json import compactar_journal, pool_processos
+from .utils import DATA_PATH, log
+
+# ---------- Importação em massa (CSV / JSONL) ----------
+# Os registros são validados em paralelo (pool de processos) com os mesmos
+# validadores do dominio; os aceitos recebem IDs em sequência e entram na base
+# com uma única gravação do JSON; o Oracle os recebe pelo Sincronizador
+# (TrabalhadorPersistencia.marcar), como qualquer outra mutação.
+
+BLOCO_VALIDACAO = 5000  # registros por tarefa enviada ao pool
+
+Rejeicao = Tuple[int, str]  # (linha no arquivo, motivo)
+
+
+class ResultadoImportacao:
+    def __init__(self) -> None:
+        self.lidos = 0
+        self.aceitos: List[Lote] = []
+        self.rejeitados: List[Rejeicao] = []
+
+    def gravar_rejeitados(self, path: str) -> None:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f, delimiter=";")
+            w.writerow(["linha", "motivo"])
+            w.writerows(self.rejeitados)
+
+
+def _abrir(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+def ler_registros(path: str) -> Iterator[Tuple[int, Any]]:
+    """Gera (linha, registro) de um CSV (separado por ';') ou JSONL."""
+    nome = path[:-3] if path.endswith(".gz") else path
+    with _abrir(path) as f:
+        if nome.endswith((".jsonl", ".ndjson")):
+            for n, linha in enumerate(f, start=1):
+                if not linha.strip():
+                    continue
+                try:
+                    yield n, json.loads(linha)
+                except ValueError as e:
+                    yield n, e
+        else:
+            leitor = csv.DictReader(f, delimiter=";")
+            for reg in leitor:
+                yield leitor.line_num, reg
+
+
+def _bool(v: Any) -> bool:
+    if isinstance(v, bool):
+        return v
+    s = str(v or "").strip().lower()
+    if s in ("1", "s", "sim", "true", "t", "y", "yes"):
+        return True
+    if s in ("", "0", "n", "nao", "não", "false", "f", "no"):
+        return False
+    raise ValueError(f"Valor booleano inválido: {v!r}")
+
+def validar_registro(reg: Any) -> Lote:
+    """Converte um registro de entrada em Lote (id=0, definido depois).
+    Aceita data ISO ou BR; ``status``/``eventos`` opcionais (ex.: JSONL exportado)."""
+    if isinstance(reg, Exception):
+        raise ValueError(f"JSON inválido: {reg}")
+    if not isinstance(reg, dict):
+        raise ValueError("Registro deve ser um objeto.")
+    data = str(reg.get("data_colheita") or reg.get("data_colheita_br") or "").strip()
+    eventos = reg.get("eventos") or []
+    if not isinstance(eventos, list):
+        raise ValueError("Eventos deve ser lista.")
+    for ev in eventos:
+        validar_evento_dict(ev)
+        ev["tipo"] = ev["tipo"].upper()
+    status = str(reg.get("status") or "").strip().upper()
+    if not status:
+        status = "PRONTO" if any(ev["tipo"] == "INSPECAO" for ev in eventos) else "EM_PROCESSAMENTO"
+    produto = validar_str_nao_vazia(str(reg.get("produto") or ""), "Produto")
+    produtor = validar_str_nao_vazia(str(reg.get("produtor") or ""), "Produtor")
+    uf = validar_uf(str(reg.get("origem_uf") or ""))
+    data_iso = validar_data_br(data) if "/" in data else validar_data_iso(data)
+    peso = validar_peso(reg.get("peso_kg"))
+    return Lote(id=0, produto=produto, produtor=produtor, origem_uf=uf,
+                data_colheita=data_iso, peso_kg=peso,
+                carbono_neutro=_bool(reg.get("carbono_neutro", False)),
+                agua_reuso=_bool(reg.get("agua_reuso", False)),
+                status=status, eventos=eventos)
+
+def _validar_bloco(bloco: List[Tuple[int, Any]]) -> Tuple[List[Tuple[int, Lote]], List[Rejeicao]]:
+    aceitos, rejeitados = [], []
+    for linha, reg in bloco:
+        try:
+            aceitos.append((linha, validar_registro(reg)))
+        except Exception as e:
+            rejeitados.append((linha, str(e)))
+    return aceitos, rejeitados
+
+def _blocos(registros: Iterator[Tuple[int, Any]], tamanho: int) -> Iterator[List[Tuple[int, Any]]]:
+    bloco: List[Tuple[int, Any]] = []
+    for r in registros:
+        bloco.append(r)
+        if len(bloco) >= tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+def importar_arquivo(path: str, data_path: str = DATA_PATH,
+                     processos: Optional[int] = None,
+                     bloco: int = BLOCO_VALIDACAO) -> ResultadoImportacao:
+    """
+    Importa lotes de ``path`` (CSV ';' ou JSONL, opcionalmente .gz) para LOTES.
+
+    A validação roda em ``processos`` processos (padrão: núcleos da máquina;
+    1 valida no próprio processo). Linhas inválidas vão para
+    ``resultado.rejeitados`` sem impedir as demais. Os aceitos são gravados com
+    um único salvamento do JSON; marque seus ids no trabalhador de persistência
+    para enviá-los ao Oracle.
+    """
+    res = ResultadoImportacao()
+    blocos = list(_blocos(ler_registros(path), bloco))
+    res.lidos = sum(len(b) for b in blocos)
+
+    processos = processos or os.cpu_count() or 1
+    if processos > 1 and len(blocos) > 1:
+        with pool_processos(min(processos, len(blocos))) as ex:
+            partes = list(ex.map(_validar_bloco, blocos))
+    else:
+        partes = [_validar_bloco(b) for b in blocos]
+
+    for _, rejeitados in partes:
+        res.rejeitados.extend(rejeitados)
+    with LOCK:
+        prox = LOTES.proximo_id()
+        for aceitos, _ in partes:
+            for _, lote in aceitos:
+                lote["id"] = prox
+                prox += 1
+                res.aceitos.append(lote)
+        if res.aceitos:
+            LOTES.extend(res.aceitos)
+            compactar_journal(LOTES, data_path)
+
+    log(f"importar: {path} → {len(res.aceitos)} aceitos, {len(res.rejeitados)} rejeitados")
+    return res
+
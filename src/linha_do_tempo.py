@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import gc
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .dominio import Evento, Lote
+
+# ---------- Linha do tempo de eventos (índice entre lotes) ----------
+# Os eventos moram aninhados em cada lote; este índice os enxerga juntos,
+# ordenados por data (ISO: ordem de string = ordem de data), numa série geral,
+# uma por tipo e uma por local. Cada entrada guarda a posição do lote no
+# LoteStore e o próprio dict do evento. Uma consulta por período faz um bisect
+# na série mais seletiva e percorre só a faixa: O(log n + k).
+# Como os índices ordenados de casos_uso, é montado na primeira consulta;
+# depois disso os eventos novos ficam em ``pendentes`` e são encaixados na
+# consulta seguinte (ou o índice é refeito, se forem muitos).
+
+Ocorrencia = Tuple[Lote, Evento]
+
+
+def _local(v: str) -> str:
+    return v.strip().casefold()
+
+
+class _Serie:
+    """Eventos ordenados por data: ``datas`` e ``refs`` (posição do lote, evento) em paralelo."""
+    __slots__ = ("datas", "refs")
+
+    def __init__(self) -> None:
+        self.datas: List[str] = []
+        self.refs: List[Tuple[int, Evento]] = []
+
+    @classmethod
+    def de(cls, datas: List[str], refs: List[Tuple[int, Evento]], ordem: List[int]) -> "_Serie":
+        s = cls()
+        s.datas = [datas[i] for i in ordem]
+        s.refs = [refs[i] for i in ordem]
+        return s
+
+    def inserir(self, data: str, pos: int, ev: Evento) -> None:
+        i = bisect_right(self.datas, data)
+        self.datas.insert(i, data)
+        self.refs.insert(i, (pos, ev))
+
+    def faixa(self, de: Optional[str], ate: Optional[str]) -> Tuple[int, int]:
+        """Intervalo [i, j) com de <= data <= ate."""
+        i = 0 if de is None else bisect_left(self.datas, de)
+        j = len(self.datas) if ate is None else bisect_right(self.datas, ate)
+        return i, max(i, j)
+
+
+class LinhaDoTempo:
+    """Índice dos eventos de todos os lotes por data, tipo e local."""
+
+    def __init__(self) -> None:
+        self.geral = _Serie()
+        self.por_tipo: Dict[str, _Serie] = {}
+        self.por_local: Dict[str, _Serie] = {}
+        self.pendentes: List[Tuple[str, int, Evento]] = []
+        self.valido = False
+
+    def __len__(self) -> int:
+        return len(self.geral.datas) + len(self.pendentes)
+
+    # ----- manutenção -----
+    def adicionar(self, pos: int, ev: Evento) -> None:
+        if self.valido:
+            self.pendentes.append((ev["data"], pos, ev))
+
+    def adicionar_lote(self, pos: int, lote: Lote) -> None:
+        if self.valido:
+            self.pendentes.extend((ev["data"], pos, ev) for ev in lote["eventos"])
+
+    def invalidar(self) -> None:
+        self.valido = False
+        self.pendentes.clear()
+
+    def garantir(self, lotes: Sequence[Lote]) -> None:
+        if self.valido and len(self.pendentes) * 64 <= len(self.geral.datas):
+            for data, pos, ev in self.pendentes:
+                self.geral.inserir(data, pos, ev)
+                self.por_tipo.setdefault(ev["tipo"].upper(), _Serie()).inserir(data, pos, ev)
+                self.por_local.setdefault(_local(ev["local"]), _Serie()).inserir(data, pos, ev)
+        elif not self.valido or self.pendentes:
+            # centenas de milhares de tuplas novas: sem o GC cíclico varrendo no meio
+            gc_ativo = gc.isenabled()
+            gc.disable()
+            try:
+                self._montar(lotes)
+            finally:
+                if gc_ativo:
+                    gc.enable()
+            self.valido = True
+        self.pendentes.clear()
+
+    def _montar(self, lotes: Sequence[Lote]) -> None:
+        datas: List[str] = []
+        refs: List[Tuple[int, Evento]] = []
+        for pos, l in enumerate(lotes):
+            for ev in l["eventos"]:
+                datas.append(ev["data"])
+                refs.append((pos, ev))
+        ordem = sorted(range(len(datas)), key=datas.__getitem__)
+        # agrupados a partir da ordem geral, os índices de cada série já saem ordenados
+        tipos: Dict[str, List[int]] = {}
+        locais: Dict[str, List[int]] = {}
+        chave_local: Dict[str, str] = {}
+        for i in ordem:
+            ev = refs[i][1]
+            tipos.setdefault(ev["tipo"].upper(), []).append(i)
+            k = chave_local.get(ev["local"])
+            if k is None:
+                k = chave_local[ev["local"]] = _local(ev["local"])
+            locais.setdefault(k, []).append(i)
+        self.geral = _Serie.de(datas, refs, ordem)
+        self.por_tipo = {t: _Serie.de(datas, refs, idx) for t, idx in tipos.items()}
+        self.por_local = {k: _Serie.de(datas, refs, idx) for k, idx in locais.items()}
+
+    # ----- consultas -----
+    def consultar(self, lotes: Sequence[Lote], de: Optional[str] = None, ate: Optional[str] = None,
+                  tipo: Optional[str] = None, local: Optional[str] = None,
+                  limite: Optional[int] = None, recentes: bool = False) -> Tuple[List[Ocorrencia], int]:
+        """
+        Eventos com ``de`` <= data <= ``ate`` (ISO, inclusivos; None = sem
+        limite), opcionalmente de um ``tipo`` e/ou ``local`` (sem diferenciar
+        maiúsculas). Devolve ([(lote, evento)...] em ordem de data, total).
+        ``recentes`` inverte a ordem; ``limite`` corta a lista (o total não).
+
+        Percorre só a faixa da série mais seletiva (tipo, local ou a geral) e
+        testa o outro filtro em cada evento dela.
+        """
+        self.garantir(lotes)
+        tipo = tipo.strip().upper() if tipo else None
+        local = _local(local) if local else None
+        candidatas = []
+        if tipo:
+            candidatas.append(self.por_tipo.get(tipo))
+        if local:
+            candidatas.append(self.por_local.get(local))
+        if None in candidatas:
+            return [], 0
+        if not candidatas:
+            candidatas.append(self.geral)
+        faixas = [(s, *s.faixa(de, ate)) for s in candidatas]
+        serie, i, j = min(faixas, key=lambda t: t[2] - t[1])
+        if tipo and local:  # a série escolhida já garante um dos dois
+            outro = ((lambda ev: _local(ev["local"]) == local) if serie is self.por_tipo[tipo]
+                     else (lambda ev: ev["tipo"].upper() == tipo))
+            refs = [r for r in serie.refs[i:j] if outro(r[1])]
+            total = len(refs)
+            if limite is not None:  # limite=0: página vazia, como nos outros caminhos
+                refs = refs[max(0, len(refs) - limite):] if recentes else refs[:limite]
+        else:
+            total = j - i
+            if limite is not None:  # só a ponta pedida da faixa
+                i, j = (max(i, j - limite), j) if recentes else (i, min(j, i + limite))
+            refs = serie.refs[i:j]
+        if recentes:
+            refs.reverse()
+        return [(lotes[pos], ev) for pos, ev in refs], total
@@ -1,40 +1,78 @@
 from __future__ import annotations
+from contextlib import nullcontext
 from typing import Dict, Any, Callable
 from dotenv import load_dotenv
 
-from .casos_uso import LOTES, cadastrar_lote, registrar_evento, listar_lotes
+from .casos_uso import (
+    LOTES, LOCK, CHAVES_ORDENACAO, cadastrar_lote, registrar_evento, consultar_lotes,
+    consultar_eventos, lotes_parados
+)
 from .relatorios import kpis, formatar_relatorio
-from .persistencia_json import carregar_json_validado, salvar_json_seguro, exportar_csv_lotes
+from .persistencia_json import (
+    carregar_json_validado,
+    compactar_journal, journal_pendentes, restaurar_snapshot
+)
+from .persistencia_worker import TrabalhadorPersistencia
+from .conexao_oracle import ConexaoOracle
+from .snapshots import listar_snapshots
+from .exportacao import exportar_lotes, formato_por_extensao
+from .metricas import configurar as configurar_metricas, iniciar_dump_periodico, snapshot, formatar_metricas
+from . import utils
 from .utils import DATA_PATH, iso_to_br, log
 from .dominio import (
     validar_str_nao_vazia, validar_uf, validar_data_br, validar_peso
 )
 
-DB = None
+ORACLE = ConexaoOracle()
+WORKER: TrabalhadorPersistencia | None = None
 
 # ==============================
 # Conexão opcional com Oracle
 # ==============================
 def try_connect_db():
-    global DB
-    try:
-        from .persistencia_oracle import conectar_oracle_from_env
-        DB = conectar_oracle_from_env()
-        log("Oracle conectado.")
-    except Exception as e:
-        DB = None
-        log(f"Oracle indisponível ({e}); seguindo apenas com JSON.")
+    # em segundo plano: o menu não espera o Oracle (ver conexao_oracle)
+    ORACLE.iniciar()
+
+def oracle_para(pergunta: str):
+    """Conexão para uma ação opcional no Oracle, ou None. Se ainda estiver
+    conectando, o usuário decide se espera (até ORACLE_PRAZO_S)."""
+    conn = ORACLE.atual()
+    if conn is not None:
+        return conn if ask_bool(pergunta) else None
+    if not ORACLE.conectando:
+        return None
+    if not ask_bool(f"{pergunta} (Oracle {ORACLE.estado()} — espera até {ORACLE.prazo:g}s)"):
+        return None
+    conn = ORACLE.aguardar()
+    if conn is None:
+        print("⚠️ Oracle não respondeu no prazo; seguindo com a base local.")
+    return conn
 
 def boot():
     load_dotenv()
+    configurar_metricas()
     try:
         dados = carregar_json_validado(DATA_PATH)
         LOTES.clear()
         LOTES.extend(dados)
     except Exception as e:
-        print("⚠️ Falha ao carregar data/dados.json (veja logs/app.log).")
+        print(f"⚠️ Falha ao carregar data/dados.json (veja {utils.LOG_PATH}).")
         log(f"ERRO carregar: {e}")
     try_connect_db()
+    iniciar_worker()
+    iniciar_dump_periodico()
+
+def iniciar_worker():
+    global WORKER
+    WORKER = TrabalhadorPersistencia(LOTES, DATA_PATH, conn=ORACLE.atual())
+    WORKER.ao_falhar_oracle = ORACLE.falhou
+    ORACLE.ao_conectar(WORKER.conectado)
+    WORKER.start()
+
+def sincronizar():
+    """Garante que as mutações enfileiradas já foram gravadas."""
+    if WORKER:
+        WORKER.sincronizar()
 
 # ==============================
 # Entradas com revalidação
@@ -62,6 +100,10 @@ def ask_data_br(label: str) -> str:
 def ask_peso() -> float:
     return ask_until_valid("Peso (kg): ", validar_peso)
 
+def ask_opcional(prompt: str, validator: Callable[[str], Any]) -> Any:
+    """Como ask_until_valid, mas enter vazio devolve None."""
+    return ask_until_valid(prompt, lambda s: validator(s) if s else None)
+
 def ask_bool(msg: str) -> bool:
     while True:
         r = input(msg + " [s/n]: ").strip().lower()
@@ -86,22 +128,21 @@ def acao_cadastrar_lote():
         "produto": produto,
         "produtor": produtor,
         "origem_uf": uf,
-        "data_colheita_br": iso_to_br(data_iso),  # cadastrar_lote espera BR; convertemos de volta
+        "data_colheita": data_iso,
         "peso_kg": str(peso),
         "agua_reuso": agua_reuso,
         "carbono_neutro": carbono_neutro
     }
 
     try:
-        lote = cadastrar_lote(dados)
-        LOTES.append(lote)
-        salvar_json_seguro(LOTES, DATA_PATH)
+        with LOCK:
+            lote = cadastrar_lote(dados)
+            LOTES.append(lote)
+            # JSON e Oracle são gravados em segundo plano (persistencia_worker)
+            feito = WORKER.enviar({"op": "lote", "lote": lote})
+        WORKER.confirmar(feito)
+        # o ID local é definitivo: o ID do Oracle fica só no estado do Sincronizador
         print(f"✅ Lote {lote['id']} cadastrado.")
-        if DB:
-            from .persistencia_oracle import inserir_lote
-            novo_id = inserir_lote(DB, lote)
-            lote["id"] = novo_id
-            salvar_json_seguro(LOTES, DATA_PATH)
     except Exception as e:
         print("⚠️ Erro inesperado ao cadastrar:", e)
         log(f"ERRO cadastrar: {e}")
@@ -112,7 +153,7 @@ def acao_registrar_evento():
         try:
             lote_id = int(input("ID do lote: ").strip())
             # checagem básica de existência
-            if any(l["id"] == lote_id for l in LOTES):
+            if LOTES.obter(lote_id) is not None:
                 break
             print("⚠️ Lote não encontrado. Tente novamente.")
         except ValueError:
@@ -130,83 +171,258 @@ def acao_registrar_evento():
 
     ev_br = {
         "tipo": tipo,
-        "data_br": iso_to_br(data_iso),  # registrar_evento espera BR
+        "data": data_iso,
         "local": local,
         "responsavel": responsavel,
         "observacoes": observacoes
     }
 
     try:
-        ok = registrar_evento(lote_id, ev_br)
-        if not ok:
-            print("❌ Lote não encontrado (concorrência).")
-            return
-        salvar_json_seguro(LOTES, DATA_PATH)
+        with LOCK:
+            ok = registrar_evento(lote_id, ev_br)
+            if not ok:
+                print("❌ Lote não encontrado (concorrência).")
+                return
+            lote = LOTES.obter(lote_id)
+            evento = lote["eventos"][-1]
+            feito = WORKER.enviar({"op": "evento", "id": lote_id, "evento": evento,
+                                   "status": lote["status"]})
+        WORKER.confirmar(feito)
         print("✅ Evento registrado.")
-        if DB:
-            from .persistencia_oracle import inserir_evento
-            from .dominio import validar_data_br
-            inserir_evento(DB, lote_id, {
-                "tipo": tipo,
-                "data": validar_data_br(ev_br["data_br"]),
-                "local": local,
-                "responsavel": responsavel,
-                "observacoes": observacoes
-            })
     except Exception as e:
         print("⚠️ Erro inesperado ao registrar evento:", e)
         log(f"ERRO evento: {e}")
 
+POR_PAGINA = 20
+
+def _sim_nao(s: str) -> bool:
+    if s.lower() in ("s", "sim"): return True
+    if s.lower() in ("n", "nao", "não"): return False
+    raise ValueError("Responda com 's' ou 'n' (enter para ignorar).")
+
+def _ordenacao(s: str) -> str:
+    if s.lstrip("-") not in CHAVES_ORDENACAO:
+        raise ValueError(f"Use um de: {', '.join(CHAVES_ORDENACAO)} (com '-' para decrescente).")
+    return s
+
 def acao_listar_lotes():
     uf = input("Filtrar por UF (enter para ignorar): ").strip().upper()
     status = input("Filtrar por Status (enter para ignorar): ").strip().upper()
-    filtros = {}
-    if uf: filtros["origem_uf"] = uf
-    if status: filtros["status"] = status
-    lista = listar_lotes(filtros)
-    print("\n--- LOTES ---")
-    for l in lista:
-        print(f"ID {l['id']} | {l['produto']} | {l['produtor']} | {l['origem_uf']} | "
-              f"colheita {iso_to_br(l['data_colheita'])} | peso {l['peso_kg']} kg | "
-              f"água_reuso={l['agua_reuso']} | carbono_neutro={l['carbono_neutro']} | {l['status']}")
+    filtros: Dict[str, Any] = {"origem_uf": uf, "status": status}
+    ordenar = None
+    if ask_bool("Mais filtros (datas, peso, nomes, ordenação)?"):
+        filtros["data_de"] = ask_opcional("Colheita a partir de (DD/MM/YYYY, enter ignora): ", validar_data_br)
+        filtros["data_ate"] = ask_opcional("Colheita até (DD/MM/YYYY, enter ignora): ", validar_data_br)
+        filtros["peso_min"] = ask_opcional("Peso mínimo (kg, enter ignora): ", validar_peso)
+        filtros["peso_max"] = ask_opcional("Peso máximo (kg, enter ignora): ", validar_peso)
+        filtros["produto"] = input("Produto começa com (enter ignora): ").strip()
+        filtros["produtor"] = input("Produtor começa com (enter ignora): ").strip()
+        filtros["carbono_neutro"] = ask_opcional("Carbono neutro? [s/n, enter ignora]: ", _sim_nao)
+        filtros["agua_reuso"] = ask_opcional("Reuso de água? [s/n, enter ignora]: ", _sim_nao)
+        ordenar = ask_opcional(f"Ordenar por ({'/'.join(CHAVES_ORDENACAO)}; '-' decrescente; enter = cadastro): ",
+                               _ordenacao)
+
+    pagina = 0
+    while True:
+        with LOCK:
+            lista, total = consultar_lotes(filtros, ordenar, POR_PAGINA, pagina * POR_PAGINA)
+        paginas = max(1, -(-total // POR_PAGINA))
+        print(f"\n--- LOTES ({total}) — página {pagina + 1}/{paginas} ---")
+        for l in lista:
+            print(f"ID {l['id']} | {l['produto']} | {l['produtor']} | {l['origem_uf']} | "
+                  f"colheita {iso_to_br(l['data_colheita'])} | peso {l['peso_kg']} kg | "
+                  f"água_reuso={l['agua_reuso']} | carbono_neutro={l['carbono_neutro']} | {l['status']}")
+        print("-------------\n")
+        if paginas == 1:
+            return
+        op = input("[Enter] próxima, [a]nterior, número da página ou [q] sair: ").strip().lower()
+        if op == "q":
+            return
+        if op == "a":
+            pagina = max(0, pagina - 1)
+        elif op.isdigit():
+            pagina = min(max(int(op), 1), paginas) - 1
+        elif pagina + 1 < paginas:
+            pagina += 1
+        else:
+            return
+
+def acao_linha_do_tempo():
+    if ask_bool("Listar lotes parados (sem atividade desde uma data)?"):
+        desde = ask_data_br("Sem atividade desde")
+        with LOCK:
+            lotes, total = lotes_parados(desde, POR_PAGINA)
+        print(f"\n--- LOTES PARADOS desde {iso_to_br(desde)} ({total}; os {len(lotes)} mais antigos) ---")
+        for l in lotes:
+            ultima = l["eventos"][-1]["data"] if l["eventos"] else l["data_colheita"]
+            print(f"ID {l['id']} | {l['produto']} | {l['origem_uf']} | "
+                  f"última atividade {iso_to_br(ultima)} | {l['status']}")
+        print("-------------\n")
+        return
+    tipo = input("Tipo (COLHEITA/TRANSPORTE/ARMAZENAGEM/INSPECAO, enter = todos): ").strip().upper()
+    local = input("Local (enter = todos): ").strip()
+    de = ask_opcional("A partir de (DD/MM/YYYY, enter ignora): ", validar_data_br)
+    ate = ask_opcional("Até (DD/MM/YYYY, enter ignora): ", validar_data_br)
+    with LOCK:
+        ocorrencias, total = consultar_eventos(de, ate, tipo, local, POR_PAGINA, recentes=True)
+    print(f"\n--- EVENTOS ({total}; os {len(ocorrencias)} mais recentes) ---")
+    for l, ev in ocorrencias:
+        print(f"{iso_to_br(ev['data'])} | {ev['tipo']} | {ev['local']} | {ev['responsavel']} | "
+              f"lote {l['id']} ({l['produto']}, {l['origem_uf']})")
     print("-------------\n")
 
 def acao_relatorio():
-    r = kpis(LOTES)
+    r = None
+    conn = oracle_para("Calcular os KPIs no Oracle?")
+    if conn is not None:
+        from .persistencia_oracle import kpis_db
+        try:
+            r = kpis_db(conn)
+        except Exception as e:
+            ORACLE.falhou(conn, e)
+            print("⚠️ Erro ao consultar o Oracle; usando a base local:", e)
+            log(f"ERRO kpis_db: {e}")
+    if r is None:
+        with LOCK:  # o trabalhador de persistência acrescenta o que baixa do Oracle
+            r = kpis(LOTES)
+    dims = input("Detalhar por (uf, produto, status, mes, semana — separados por vírgula; "
+                 "enter = só o resumo): ").strip().lower()
+    agrupado = None
+    if dims:
+        from .analitico import kpis_agrupados
+        try:
+            with LOCK:
+                agrupado = kpis_agrupados(LOTES, ["origem_uf" if d.strip() == "uf" else d.strip()
+                                                  for d in dims.split(",") if d.strip()])
+        except (RuntimeError, ValueError) as e:
+            print(f"⚠️ {e}")
     print()
-    print(formatar_relatorio(r))
+    print(formatar_relatorio(r, agrupado))
     print()
 
 def acao_exportar_importar():
-    sub = input("[E]xportar CSV ou [I]mportar JSON? ").strip().lower()
-    if sub.startswith("e"):
-        caminho = input("Caminho do CSV (ex: lotes.csv): ").strip() or "lotes.csv"
+    sub = input("[E]xportar, [I]mportar JSON, importar em [M]assa (CSV/JSONL) "
+                "ou [R]estaurar snapshot? ").strip().lower()
+    if sub.startswith("r"):
+        acao_restaurar_snapshot()
+    elif sub.startswith("m"):
+        acao_importar_massa()
+    elif sub.startswith("e"):
+        caminho = input("Caminho do arquivo (ex: lotes.csv, eventos.csv.gz, lotes.jsonl): ").strip() or "lotes.csv"
+        formato = formato_por_extensao(caminho)
+        if formato == "csv" and ask_bool("Exportar um evento por linha?"):
+            formato = "csv_eventos"
+        origem = LOTES
+        conn = oracle_para("Exportar direto do Oracle?")
+        if conn is not None:
+            from .persistencia_oracle import iterar_lotes_completos_db
+            origem = iterar_lotes_completos_db(conn)
         try:
-            exportar_csv_lotes(LOTES, caminho)
-            print(f"✅ CSV gerado: {caminho}")
+            # da base local, segura LOCK até o fim: o arquivo sai de um único estado
+            with (LOCK if origem is LOTES else nullcontext()):
+                n = exportar_lotes(origem, caminho, formato,
+                                   progresso=lambda n: print(f"  ... {n} lotes", end="\r"))
+            print(f"✅ Arquivo gerado: {caminho} ({n} lotes)")
         except Exception as e:
-            print("⚠️ Erro ao exportar CSV:", e)
+            ORACLE.falhou(conn, e)
+            print("⚠️ Erro ao exportar:", e)
     else:
         try:
-            novos = carregar_json_validado(DATA_PATH)
-            LOTES.clear(); LOTES.extend(novos)
+            sincronizar()
+            with LOCK:
+                novos = carregar_json_validado(DATA_PATH)
+                LOTES.clear(); LOTES.extend(novos)
+                WORKER.recarregada()
             print("✅ Importado de data/dados.json")
         except Exception as e:
             print("⚠️ Erro ao importar JSON:", e)
 
+def acao_importar_massa():
+    caminho = input("Arquivo CSV (';') ou JSONL: ").strip()
+    if not caminho:
+        return
+    from .importacao import importar_arquivo
+    try:
+        sincronizar()
+        r = importar_arquivo(caminho, DATA_PATH)
+        # o Oracle recebe os aceitos na próxima rodada de sincronização
+        WORKER.marcar([l["id"] for l in r.aceitos])
+        print(f"✅ {len(r.aceitos)} de {r.lidos} registro(s) importados.")
+        if r.rejeitados:
+            rel = caminho + ".rejeitados.csv"
+            r.gravar_rejeitados(rel)
+            print(f"⚠️ {len(r.rejeitados)} rejeitado(s); detalhes em {rel}")
+    except Exception as e:
+        print("⚠️ Erro na importação:", e)
+        log(f"ERRO importar: {e}")
+
+def acao_restaurar_snapshot():
+    snaps = listar_snapshots(DATA_PATH)
+    if not snaps:
+        print("⚠️ Nenhum snapshot disponível.")
+        return
+    print("\n--- SNAPSHOTS ---")
+    for i, e in enumerate(reversed(snaps), start=1):
+        print(f"-{i}) {e['ts'][:19]} | {e['tamanho']} bytes | sha256 {e['sha256'][:12]}")
+    ident = input("Snapshot (ex: -1 para o mais recente; enter cancela): ").strip()
+    if not ident:
+        return
+    try:
+        sincronizar()
+        with LOCK:
+            restaurar_snapshot(ident, DATA_PATH)
+            novos = carregar_json_validado(DATA_PATH)
+            LOTES.clear(); LOTES.extend(novos)
+            WORKER.recarregada()
+        print(f"✅ Snapshot restaurado ({len(novos)} lotes).")
+    except Exception as e:
+        print("⚠️ Erro ao restaurar snapshot:", e)
+        log(f"ERRO restaurar: {e}")
+
+def acao_sincronizar_oracle():
+    if ORACLE.conectando:
+        print(f"Aguardando o Oracle (até {ORACLE.prazo:g}s)...")
+    if ORACLE.aguardar() is None:
+        print("⚠️ Oracle não conectado." + (f" Último erro: {ORACLE.erro}" if ORACLE.erro else ""))
+        if WORKER.sync.pendentes:
+            print(f"  {WORKER.sync.pendentes} lote(s) alterado(s) aguardam a conexão.")
+        return
+    # só o que mudou desde a última rodada (ver sincronizacao)
+    r = WORKER.sincronizar_oracle()
+    if not r or "erro" in r:
+        print("⚠️ Erro ao sincronizar com o Oracle:", (r or {}).get("erro", "sem resposta"))
+        return
+    print(f"✅ Enviados: {r['lotes']} lote(s) novo(s), {r['alterados']} alterado(s), {r['eventos']} evento(s)."
+          f" Recebidos: {r.get('lotes_recebidos', 0)} lote(s), {r.get('eventos_recebidos', 0)} evento(s).")
+    if r["erros"]:
+        print(f"  ⚠️ {r['erros']} registro(s) recusados pelo Oracle (veja {utils.LOG_PATH}).")
+
+def acao_metricas():
+    snap = snapshot()
+    if not snap["histogramas"]:
+        print("Nenhuma operação medida ainda.")
+        return
+    print("\n--- MÉTRICAS (desde o início) ---")
+    print(formatar_metricas(snap))
+    print()
+
 # ==============================
 # Menu
 # ==============================
 def menu():
     boot()
     while True:
-        print("""
-[Rastreabilidade Sustentável]
+        print(f"""
+[Rastreabilidade Sustentável]  Oracle: {ORACLE.estado()}
 1) Cadastrar lote
 2) Registrar evento
 3) Listar lotes
 4) Relatório de sustentabilidade
-5) Exportar CSV / Importar JSON
+5) Exportar (CSV/JSONL) / Importar JSON / Snapshots
+6) Sincronizar com o Oracle
+7) Sincronizar gravações pendentes
+8) Métricas (latência p50/p95/p99)
+9) Linha do tempo de eventos / lotes parados
 0) Sair
 """)
         op = input("Escolha: ").strip()
@@ -215,7 +431,18 @@ def menu():
         elif op == "3": acao_listar_lotes()
         elif op == "4": acao_relatorio()
         elif op == "5": acao_exportar_importar()
+        elif op == "6": acao_sincronizar_oracle()
+        elif op == "7":
+            sincronizar()
+            print("✅ Gravações pendentes concluídas.")
+        elif op == "8": acao_metricas()
+        elif op == "9": acao_linha_do_tempo()
         elif op == "0":
+            if WORKER:
+                WORKER.parar()
+            ORACLE.parar()
+            if journal_pendentes(DATA_PATH):
+                compactar_journal(LOTES, DATA_PATH)
             print("Até mais!")
             break
         else:
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import atexit
+import functools
+import inspect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+from .utils import log
+
+# ---------- Métricas (contadores e histogramas de latência) ----------
+# Registro em memória, barato o bastante para ficar sempre ligado: cada
+# observação é um log() matemático para achar o balde e um incremento. Os
+# percentis saem dos baldes (erro relativo < 10%). Configuração pelo .env
+# (lida em configurar(), chamada no boot depois do load_dotenv):
+#   METRICAS=1                 0 desliga a instrumentação (decorators só repassam a chamada)
+#   METRICAS_ARQUIVO=          caminho para o dump periódico (.json ou texto Prometheus)
+#   METRICAS_INTERVALO_S=60    intervalo entre dumps
+
+ATIVAS = True
+ARQUIVO = ""
+INTERVALO = 60.0
+
+def configurar() -> None:
+    global ATIVAS, ARQUIVO, INTERVALO
+    ATIVAS = os.getenv("METRICAS", "1").strip().lower() in ("1", "true", "yes")
+    ARQUIVO = os.getenv("METRICAS_ARQUIVO", "").strip()
+    INTERVALO = float(os.getenv("METRICAS_INTERVALO_S", "60"))
+
+QUANTIS = (0.5, 0.95, 0.99)
+
+# baldes geométricos de 1 µs a ~170 s, 8 por oitava (fator 2^(1/8) ≈ 1.09)
+_MINIMO = 1e-6
+_POR_OITAVA = 8
+_ESCALA = _POR_OITAVA / math.log(2)
+_BALDES = 28 * _POR_OITAVA
+
+
+class Histograma:
+    __slots__ = ("_contagens", "n", "soma", "maximo", "_lock")
+
+    def __init__(self) -> None:
+        self._contagens = [0] * (_BALDES + 1)
+        self.n = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float) -> None:
+        i = int(math.log(valor / _MINIMO) * _ESCALA) + 1 if valor > _MINIMO else 0
+        with self._lock:
+            self._contagens[min(i, _BALDES)] += 1
+            self.n += 1
+            self.soma += valor
+            if valor > self.maximo:
+                self.maximo = valor
+
+    def quantil(self, q: float) -> Optional[float]:
+        """Limite superior do balde onde cai o quantil ``q`` (0..1)."""
+        with self._lock:
+            if not self.n:
+                return None
+            alvo, acum = q * self.n, 0
+            for i, c in enumerate(self._contagens):
+                acum += c
+                if c and acum >= alvo:
+                    return min(_MINIMO * math.exp(i / _ESCALA), self.maximo)
+            return self.maximo
+
+    def resumo(self) -> Dict[str, Any]:
+        r: Dict[str, Any] = {"n": self.n, "soma": self.soma, "max": self.maximo}
+        for q in QUANTIS:
+            r[f"p{int(q * 100)}"] = self.quantil(q)
+        return r
+
+
+_CONTADORES: Dict[str, int] = {}
+_HISTOGRAMAS: Dict[str, Histograma] = {}
+_LOCK = threading.Lock()
+
+
+def contar(nome: str, n: int = 1) -> None:
+    with _LOCK:
+        _CONTADORES[nome] = _CONTADORES.get(nome, 0) + n
+
+def histograma(nome: str) -> Histograma:
+    h = _HISTOGRAMAS.get(nome)
+    if h is None:
+        with _LOCK:
+            h = _HISTOGRAMAS.setdefault(nome, Histograma())
+    return h
+
+def observar(nome: str, segundos: float) -> None:
+    histograma(nome).observar(segundos)
+
+@contextmanager
+def cronometro(nome: str) -> Iterator[None]:
+    """Observa a duração do bloco em ``<nome>_segundos``."""
+    if not ATIVAS:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(nome + "_segundos", time.perf_counter() - t0)
+
+def instrumentar(nome: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator: conta chamadas (``<nome>_total``) e erros (``<nome>_erros_total``)
+    e observa a latência em ``<nome>_segundos``. Em geradores, mede do início
+    até o fim da iteração.
+    """
+    def deco(fn: Callable) -> Callable:
+        # decorado no import, antes do .env: ATIVAS é conferido a cada chamada
+        h = histograma(nome + "_segundos")
+        total, erros = nome + "_total", nome + "_erros_total"
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gerador(*args, **kwargs):
+                if not ATIVAS:
+                    yield from fn(*args, **kwargs)
+                    return
+                contar(total)
+                t0 = time.perf_counter()
+                try:
+                    yield from fn(*args, **kwargs)
+                except Exception:
+                    contar(erros)
+                    raise
+                finally:
+                    h.observar(time.perf_counter() - t0)
+            return gerador
+
+        @functools.wraps(fn)
+        def medido(*args, **kwargs):
+            if not ATIVAS:
+                return fn(*args, **kwargs)
+            contar(total)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                contar(erros)
+                raise
+            finally:
+                h.observar(time.perf_counter() - t0)
+        return medido
+    return deco
+
+
+# ---------- Leitura / exportação ----------
+def snapshot() -> Dict[str, Any]:
+    """Cópia dos contadores e o resumo (n, soma, max, p50/p95/p99) de cada histograma."""
+    with _LOCK:
+        contadores = dict(_CONTADORES)
+        hists = dict(_HISTOGRAMAS)
+    return {"ts": time.time(), "contadores": contadores,
+            "histogramas": {k: h.resumo() for k, h in sorted(hists.items()) if h.n}}
+
+def zerar() -> None:
+    with _LOCK:
+        _CONTADORES.clear()
+        for h in _HISTOGRAMAS.values():
+            h.__init__()
+
+def _nome_prom(nome: str) -> str:
+    return "rastreabilidade_" + "".join(c if c.isalnum() else "_" for c in nome)
+
+def formato_prometheus(snap: Dict[str, Any]) -> str:
+    linhas: List[str] = []
+    for nome, v in sorted(snap["contadores"].items()):
+        n = _nome_prom(nome)
+        linhas += [f"# TYPE {n} counter", f"{n} {v}"]
+    for nome, r in snap["histogramas"].items():
+        n = _nome_prom(nome)
+        linhas.append(f"# TYPE {n} summary")
+        for q in QUANTIS:
+            linhas.append(f'{n}{{quantile="{q}"}} {r[f"p{int(q * 100)}"]:.9f}')
+        linhas += [f"{n}_sum {r['soma']:.9f}", f"{n}_count {r['n']}"]
+    return "\n".join(linhas) + "\n"
+
+def gravar(path: str) -> None:
+    """Grava o snapshot em ``path``: JSON se terminar em .json, senão texto Prometheus."""
+    snap = snapshot()
+    conteudo = (json.dumps(snap, ensure_ascii=False, indent=2) if path.endswith(".json")
+                else formato_prometheus(snap))
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(conteudo)
+    os.replace(tmp, path)
+
+def formatar_metricas(snap: Dict[str, Any]) -> str:
+    def ms(v: Optional[float]) -> str:
+        return "-" if v is None else f"{v * 1000:.3f}"
+    linhas = [f"{'operação':<36} {'n':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'máx ms':>10}"]
+    for nome, r in snap["histogramas"].items():
+        linhas.append(f"{nome[:-9] if nome.endswith('_segundos') else nome:<36} {r['n']:>8} {ms(r['p50']):>10} "
+                      f"{ms(r['p95']):>10} {ms(r['p99']):>10} {ms(r['max']):>10}")
+    # contadores que não são só o "n" de um histograma (erros, linhas, round trips)
+    outros = {k: v for k, v in snap["contadores"].items()
+              if not (k.endswith("_total") and k[:-6] + "_segundos" in snap["histogramas"])}
+    if outros:
+        linhas.append("")
+        linhas += [f"{k:<36} {v:>8}" for k, v in sorted(outros.items())]
+    return "\n".join(linhas)
+
+
+# ---------- Dump periódico ----------
+_DUMP: Optional[threading.Thread] = None
+_PARAR = threading.Event()
+
+def iniciar_dump_periodico(path: Optional[str] = None, intervalo: Optional[float] = None) -> bool:
+    """Grava as métricas em ``path`` a cada ``intervalo`` segundos (e na saída).
+    Sem argumentos, usa METRICAS_ARQUIVO/METRICAS_INTERVALO_S (ver configurar)."""
+    global _DUMP
+    path = ARQUIVO if path is None else path
+    intervalo = INTERVALO if intervalo is None else intervalo
+    if not path or not ATIVAS or _DUMP is not None:
+        return False
+
+    def laco() -> None:
+        while not _PARAR.wait(intervalo):
+            try:
+                gravar(path)
+            except OSError as e:
+                log(f"ERRO metricas: dump em {path} falhou ({e})")
+
+    _DUMP = threading.Thread(target=laco, name="metricas", daemon=True)
+    _DUMP.start()
+    atexit.register(lambda: (_PARAR.set(), gravar(path)))
+    log(f"metricas: dump a cada {intervalo:g}s em {path}")
+    return True
@@ -1,108 +1,770 @@
 from __future__ import annotations
 
-import csv
+import codecs
+import gc
 import hashlib
 import json
+import marshal
+import multiprocessing
 import os
+import re
+import sys
 import time
-from typing import List, Dict, Any
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Callable, Set, Tuple
 
-from .dominio import validar_lote_dict
-from .utils import DATA_PATH, log
+from .compacto import ColunasLotes
+from .dominio import validar_evento_dict, validar_lote_dict
+from .exportacao import exportar_lotes
+from .metricas import instrumentar
+from .snapshots import listar_snapshots, salvar_snapshot, ler_snapshot
+from .utils import DATA_PATH, fila_log_processos, iniciar_log_processo, log
 
 
 # ---------- Funções de integridade ----------
+# dados.json.sha256: a 1ª linha é o SHA-256 do arquivo inteiro. Se HASH_BLOCO_KB
+# for > 0, segue um manifesto "bloco <tamanho>" e o SHA-256 de cada bloco, o que
+# permite conferir os blocos em paralelo e apontar a região corrompida.
+# HASH_BLOCO_KB é lido a cada gravação (depois do load_dotenv).
+def _hash_bloco() -> int:
+    return int(os.getenv("HASH_BLOCO_KB", "0")) * 1024
+
 def _sha256(path: str) -> str:
     h = hashlib.sha256()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
+        for chunk in iter(lambda: f.read(1 << 20), b""):
             h.update(chunk)
     return h.hexdigest()
 
-def _save_hash(path: str) -> None:
-    dig = _sha256(path)
-    with open(path + ".sha256", "w", encoding="utf-8") as f:
-        f.write(dig + "\n")
+def _digests(conteudo: bytes, bloco: int) -> List[str]:
+    mv = memoryview(conteudo)
+    return [hashlib.sha256(mv[i:i + bloco]).hexdigest() for i in range(0, len(conteudo), bloco)]
 
-def conferir_hash(path: str) -> bool:
+def _save_hash(path: str, conteudo: bytes, bloco: Optional[int] = None) -> str:
+    """Grava o .sha256 a partir dos bytes recém-escritos (sem reler o arquivo)."""
+    if bloco is None:
+        bloco = _hash_bloco()
+    dig = hashlib.sha256(conteudo).hexdigest()
+    linhas = [dig]
+    if bloco > 0:
+        linhas.append(f"bloco {bloco}")
+        linhas.extend(_digests(conteudo, bloco))
+    _write_atomic(path + ".sha256", "\n".join(linhas) + "\n")
+    return dig
+
+def _ler_manifesto(path: str) -> Tuple[str, int, List[str]]:
+    """(digest do arquivo, tamanho do bloco ou 0, digests dos blocos)."""
     try:
         with open(path + ".sha256", "r", encoding="utf-8") as f:
-            exp = f.read().strip()
-        return exp == _sha256(path)
+            linhas = [l.strip() for l in f if l.strip()]
     except FileNotFoundError:
+        return "", 0, []
+    if len(linhas) >= 2 and linhas[1].startswith("bloco "):
+        return linhas[0], int(linhas[1].split()[1]), linhas[2:]
+    return (linhas[0] if linhas else ""), 0, []
+
+def _hash_esperado(path: str) -> str:
+    return _ler_manifesto(path)[0]
+
+def verificar_blocos(path: str, workers: Optional[int] = None) -> List[Tuple[int, int]]:
+    """Confere os blocos do manifesto em paralelo.
+    Devolve as regiões (início, fim) em bytes que não conferem; [] se íntegro."""
+    _, bloco, esperados = _ler_manifesto(path)
+    if bloco <= 0:
+        raise ValueError("Manifesto sem blocos (defina HASH_BLOCO_KB).")
+    tamanho = os.path.getsize(path)
+
+    def conferir(i: int) -> bool:
+        with open(path, "rb") as f:
+            f.seek(i * bloco)
+            return hashlib.sha256(f.read(bloco)).hexdigest() == esperados[i]
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:  # hashlib libera o GIL
+        ok = list(ex.map(conferir, range(len(esperados))))
+    ruins = [(i * bloco, min((i + 1) * bloco, tamanho)) for i, bom in enumerate(ok) if not bom]
+    if tamanho > len(esperados) * bloco:
+        ruins.append((len(esperados) * bloco, tamanho))
+    return ruins
+
+def conferir_hash(path: str) -> bool:
+    esperado, bloco, _ = _ler_manifesto(path)
+    if not esperado or not os.path.exists(path):
         return False
+    if bloco > 0:
+        return not verificar_blocos(path)
+    return esperado == _sha256(path)
 
-# ---------- Backup e escrita segura ----------
-def _backup_rotativo(path: str, keep: int = 3) -> None:
-    if not os.path.exists(path):
+# ---------- Snapshots e escrita segura ----------
+def _snapshot_inicial(path: str) -> None:
+    """Na primeira gravação com o snapshot store, preserva o arquivo existente."""
+    if os.path.exists(path) and not listar_snapshots(path):
+        with open(path, "rb") as f:
+            salvar_snapshot(path, f.read())
+
+def _write_atomic(path: str, content: str | bytes) -> None:
+    tmp = path + ".tmp"
+    if isinstance(content, bytes):
+        with open(tmp, "wb") as f:
+            f.write(content)
+    else:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+    os.replace(tmp, path)
+
+# ---------- Cache de boot ----------
+# <dados.json>.cache guarda os lotes já validados em formato marshal, com um
+# cabeçalho JSON (versão do formato, SHA-256 do dados.json de origem, CRC do
+# conteúdo). O boot recalcula o SHA-256 do dados.json (só leitura, sem parse
+# nem validação) e, se bater com o do cache, carrega o cache; o mesmo digest
+# confere a integridade contra o .sha256. Qualquer divergência cai no caminho
+# completo (o hash sai do próprio parse); sem cache da versão atual, o
+# arquivo nem é lido antes do parse. CACHE_BOOT=0 desliga (lido na hora,
+# depois do load_dotenv; os processos do pool herdam o ambiente).
+def _cache_boot() -> bool:
+    return os.getenv("CACHE_BOOT", "1").strip().lower() in ("1", "true", "yes")
+
+CACHE_VERSAO = 2  # mude ao alterar o formato dos lotes ou as regras de validação
+_CACHE_CHAVE = f"{CACHE_VERSAO}/py{sys.version_info[0]}.{sys.version_info[1]}/m{marshal.version}"
+
+def _cache_path(path: str) -> str:
+    return path + ".cache"
+
+def _gravar_cache(path: str, lotes: List[Dict[str, Any]], sha256: str,
+                  corpo: Optional[bytes] = None) -> None:
+    """``sha256``: o dos bytes de onde ``lotes`` saiu (lidos ou gravados);
+    ``corpo``: o marshal dos lotes, se quem chama já o tiver."""
+    if not _cache_boot():
         return
-    ts = time.strftime("%Y%m%d-%H%M%S")
-    bk = f"{path}.{ts}.bak"
-    os.replace(path, bk)
-    base = os.path.basename(path)
-    bks = sorted([p for p in os.listdir(os.path.dirname(path) or ".")
-                  if p.startswith(base + ".") and p.endswith(".bak")], reverse=True)
-    for velho in bks[keep:]:
+    try:
+        if corpo is None:
+            corpo = marshal.dumps(list(lotes))
+        cab = json.dumps({"versao": _CACHE_CHAVE, "sha256": sha256,
+                          "crc32": zlib.crc32(corpo), "qtd": len(lotes)})
+        _write_atomic(_cache_path(path), cab.encode("ascii") + b"\n" + corpo)
+    except (OSError, ValueError) as e:
+        log(f"cache_boot: não gravado ({e})")
+
+def _ler_cache_corpo(path: str, arquivo: str) -> Optional[Tuple[bytes, int, str]]:
+    """(marshal, quantidade de lotes, SHA-256 de ``arquivo``) do cache de
+    ``path`` se ele foi gerado a partir do conteúdo atual de ``arquivo``; senão None."""
+    if not _cache_boot():
+        return None
+    try:
+        with open(_cache_path(path), "rb") as f:
+            cab = json.loads(f.readline())
+            if cab.get("versao") != _CACHE_CHAVE or cab.get("sha256") != _sha256(arquivo):
+                return None
+            corpo = f.read()
+        if zlib.crc32(corpo) != cab["crc32"]:
+            log("cache_boot: conteúdo corrompido → ignorado")
+            return None
+        return corpo, cab["qtd"], cab["sha256"]
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        log(f"cache_boot: ilegível ({e}) → ignorado")
+        return None
+
+def _desserializar(corpos: Iterable[bytes]) -> List[Any]:
+    # milhões de objetos novos de uma vez: sem o GC cíclico varrendo no meio
+    gc_ativo = gc.isenabled()
+    gc.disable()
+    try:
+        return [marshal.loads(c) for c in corpos]
+    finally:
+        if gc_ativo:
+            gc.enable()
+
+def _ler_cache(path: str) -> Optional[Tuple[List[Dict[str, Any]], str]]:
+    """(lotes, SHA-256 do dados.json) do cache se ele corresponder ao
+    conteúdo atual do dados.json; senão None."""
+    lido = _ler_cache_corpo(path, path)
+    if lido is None:
+        return None
+    try:
+        lotes = _desserializar([lido[0]])[0]
+    except (ValueError, EOFError, TypeError) as e:
+        log(f"cache_boot: ilegível ({e}) → ignorado")
+        return None
+    return (lotes, lido[2]) if len(lotes) == lido[1] else None
+
+_CAMPOS_REPETIDOS = ("produto", "produtor", "origem_uf", "data_colheita", "status")
+_CAMPOS_REPETIDOS_EVENTO = ("tipo", "data", "local", "responsavel")
+
+def _compartilhar_strings(lote: Dict[str, Any], memo: Dict[str, str]) -> None:
+    """Troca valores repetidos (UF, datas, produtos...) por uma única instância:
+    menos memória em LOTES e um cache menor, já que o marshal grava cada objeto
+    compartilhado uma vez só."""
+    for campo in _CAMPOS_REPETIDOS:
+        v = lote[campo]
+        lote[campo] = memo.setdefault(v, v)
+    for ev in lote["eventos"]:
+        for campo in _CAMPOS_REPETIDOS_EVENTO:
+            v = ev.get(campo)
+            if isinstance(v, str):
+                ev[campo] = memo.setdefault(v, v)
+
+# ---------- Journal (append-only) ----------
+# Cada mutação vira uma linha JSON em <dados.json>.journal; o snapshot completo
+# só é reescrito na compactação (ao atingir JOURNAL_LIMITE registros; lido
+# na hora, depois do load_dotenv).
+def journal_limite() -> int:
+    return int(os.getenv("JOURNAL_LIMITE", "500"))
+
+_JOURNAL_PENDENTES: Dict[str, int] = {}
+
+def _journal_path(path: str) -> str:
+    return path + ".journal"
+
+def journal_pendentes(path: str = DATA_PATH) -> int:
+    return _JOURNAL_PENDENTES.get(path, 0)
+
+def serializar_registro(registro: Dict[str, Any]) -> str:
+    return json.dumps(registro, ensure_ascii=False, separators=(",", ":"))
+
+def registrar_journal(registro: Dict[str, Any], path: str = DATA_PATH) -> int:
+    """Acrescenta uma mutação ao journal e devolve quantas estão pendentes.
+    A primeira linha amarra o journal ao hash do snapshot atual, para que um
+    journal já compactado (queda entre salvar e truncar) seja ignorado."""
+    return registrar_journal_linhas([serializar_registro(registro)], path)
+
+def registrar_journal_linhas(linhas: List[str], path: str = DATA_PATH) -> int:
+    """Como registrar_journal, para vários registros já serializados (uma escrita só)."""
+    jp = _journal_path(path)
+    if not os.path.exists(jp):
+        linhas = [json.dumps({"op": "base", "sha256": _versao_base(path)})] + linhas
+        n = len(linhas) - 1
+    else:
+        n = len(linhas)
+    with open(jp, "a", encoding="utf-8") as f:
+        f.write("\n".join(linhas) + "\n")
+    _JOURNAL_PENDENTES[path] = _JOURNAL_PENDENTES.get(path, 0) + n
+    return _JOURNAL_PENDENTES[path]
+
+def _aplicar_journal(dados: List[Dict[str, Any]], path: str) -> int:
+    jp = _journal_path(path)
+    if not os.path.exists(jp):
+        return 0
+    por_id = {l["id"]: l for l in dados}
+    aplicados = 0
+    with open(jp, "r", encoding="utf-8") as f:
+        for n, linha in enumerate(f, start=1):
+            try:
+                reg = json.loads(linha)
+            except ValueError:
+                # última linha truncada por queda no meio da escrita
+                log(f"journal: linha {n} ilegível, ignorando o restante")
+                break
+            op = reg.get("op")
+            if op == "base":
+                if reg.get("sha256") != _versao_base(path):
+                    log("journal: base não confere com o snapshot (já compactado) → ignorado")
+                    return 0
+                continue
+            if op == "lote":
+                lote = reg["lote"]
+                validar_lote_dict(lote)
+                if lote["id"] in por_id:
+                    raise ValueError(f"Journal: ID duplicado {lote['id']}.")
+                dados.append(lote)
+                por_id[lote["id"]] = lote
+            elif op == "evento":
+                lote = por_id[reg["id"]]
+                try:
+                    validar_evento_dict(reg["evento"])
+                except ValueError as e:
+                    # fora de LOTES: senão nenhuma compactação passaria mais na validação
+                    log(f"journal: linha {n} rejeitada (evento do lote {reg['id']}: {e})")
+                    continue
+                if "pos" in reg:  # evento baixado do Oracle: entra antes dos locais não enviados
+                    lote["eventos"].insert(reg["pos"], reg["evento"])
+                else:
+                    lote["eventos"].append(reg["evento"])
+                lote["status"] = reg.get("status", lote["status"])
+            elif op == "id":  # journals antigos: o worker trocava o ID local pelo do Oracle
+                lote = por_id.pop(reg["de"])
+                lote["id"] = reg["para"]
+                por_id[reg["para"]] = lote
+            else:
+                raise ValueError(f"Journal: operação desconhecida {op!r}.")
+            aplicados += 1
+    return aplicados
+
+def compactar_journal(lotes: List[Dict[str, Any]], path: str = DATA_PATH) -> None:
+    """Grava um snapshot novo com o estado atual e descarta o journal.
+    Particionado, só reescreve as partições que o journal tocou."""
+    criterio = _criterio_particoes()
+    salvar_json_seguro(lotes, path, _particoes_tocadas(lotes, path, criterio) if criterio else None)
+    try:
+        os.remove(_journal_path(path))
+    except FileNotFoundError:
+        pass
+    _JOURNAL_PENDENTES[path] = 0
+    log("journal: compactado")
+
+def anotar_mutacao(registro: Dict[str, Any], lotes: List[Dict[str, Any]],
+                   path: str = DATA_PATH) -> None:
+    """Persiste uma mutação em O(registro); compacta ao atingir o limite."""
+    if registrar_journal(registro, path) >= journal_limite():
+        compactar_journal(lotes, path)
+
+# ---------- Leitura em streaming ----------
+Progresso = Callable[[int, int, int], None]  # (bytes_lidos, bytes_total, lotes)
+
+class LeituraStream:
+    """Resumo de uma leitura em streaming; preenchido quando o gerador termina."""
+    def __init__(self) -> None:
+        self.qtd = 0
+        self.bytes_lidos = 0
+        self.sha256 = ""
+        self.integridade = False
+
+def iterar_lotes_json(path: str = DATA_PATH, progresso: Optional[Progresso] = None,
+                      info: Optional[LeituraStream] = None,
+                      bloco: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """Gera os lotes de um arquivo JSON (lista na raiz) um a um.
+
+    Lê o arquivo uma única vez em blocos: valida cada lote, rejeita IDs
+    duplicados e calcula o SHA-256 dos mesmos bytes. Ao final, ``info``
+    recebe a contagem, o digest e o resultado da conferência de integridade.
+    A memória fica limitada ao bloco atual mais o conjunto de IDs.
+    """
+    info = info if info is not None else LeituraStream()
+    total = os.path.getsize(path)
+    h = hashlib.sha256()
+    dec = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    ids = set()
+    memo: Dict[str, str] = {}
+    buf, pos, fim_arquivo = "", 0, False
+
+    with open(path, "rb") as f:
+        def ler() -> bool:
+            nonlocal buf, pos, fim_arquivo
+            if fim_arquivo:
+                return False
+            chunk = f.read(bloco)
+            h.update(chunk)
+            info.bytes_lidos += len(chunk)
+            fim_arquivo = not chunk
+            buf = buf[pos:] + utf8.decode(chunk, final=fim_arquivo)
+            pos = 0
+            if progresso:
+                progresso(info.bytes_lidos, total, info.qtd)
+            return True
+
+        def proximo_char() -> str:
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                if not ler():
+                    return ""
+
+        if proximo_char() != "[":
+            raise ValueError("Raiz do JSON deve ser lista.")
+        pos += 1
+        if proximo_char() == "]":
+            pos += 1
+        else:
+            while True:
+                if not proximo_char():
+                    raise ValueError("JSON truncado.")
+                while True:
+                    try:
+                        lote, pos = dec.raw_decode(buf, pos)
+                        break
+                    except json.JSONDecodeError:
+                        if not ler():
+                            raise
+                if not isinstance(lote, dict):
+                    raise ValueError("Cada lote deve ser um objeto JSON.")
+                validar_lote_dict(lote)
+                if lote["id"] in ids:
+                    raise ValueError("IDs duplicados no JSON.")
+                ids.add(lote["id"])
+                _compartilhar_strings(lote, memo)
+                info.qtd += 1
+                yield lote
+                c = proximo_char()
+                pos += 1
+                if c == "]":
+                    break
+                if c != ",":
+                    raise ValueError("JSON malformado: esperado ',' ou ']'.")
+        # consome o restante para fechar o hash
+        while ler():
+            pass
+        if buf[pos:].strip():
+            raise ValueError("JSON malformado: conteúdo após a lista.")
+
+    info.sha256 = h.hexdigest()
+    info.integridade = info.sha256 == _hash_esperado(path)
+
+# ---------- Armazenamento particionado ----------
+# Com ARMAZENAMENTO_PARTICOES, os lotes ficam divididos em partições (por UF ou
+# por faixa de ids) em vez de um dados.json único:
+#
+#   dados.json.particoes/
+#     particoes.json        manifesto: critério e, por partição, arquivo, SHA-256 e qtd
+#     SP-<sha16>.json       lotes da partição (mesmo formato do dados.json) + .sha256
+#     SP.json.snapshots/    snapshots da partição (ver snapshots)
+#     SP.json.cache         cache de boot da partição
+#
+# O arquivo de cada partição leva o hash do conteúdo no nome e o manifesto é
+# trocado por último: uma queda no meio do save deixa a versão anterior
+# inteira. O journal se amarra ao hash do manifesto, e a compactação só
+# reescreve as partições tocadas pelas mutações do journal (ou cuja contagem
+# de lotes mudou). Leitura, validação, hash e gravação de cada partição rodam
+# num pool de processos. O snapshot do dados.json guarda o manifesto, e
+# restaurar_snapshot remonta as partições a partir dos snapshots de cada uma.
+# Configuração pelo .env (lida a cada chamada):
+#   ARMAZENAMENTO_PARTICOES=   vazio: dados.json único | uf | id:50000 (faixas de ids)
+#   PARTICOES_PROCESSOS=0      processos do pool (0: núcleos da máquina)
+# Na leitura vale o layout que está em disco; mudar a configuração migra os
+# dados no próximo save.
+_MANIFESTO = "particoes.json"
+_ARQUIVO_PARTICAO = re.compile(r".+-[0-9a-f]{16}\.json(\.sha256)?")
+_MIN_PARALELO = 4 << 20  # bytes; abaixo disso subir o pool custa mais do que economiza
+
+def _criterio_particoes() -> str:
+    criterio = os.getenv("ARMAZENAMENTO_PARTICOES", "").strip().lower()
+    if criterio and criterio != "uf" and not (
+            criterio.startswith("id:") and criterio[3:].isdigit() and int(criterio[3:]) > 0):
+        raise ValueError(f"ARMAZENAMENTO_PARTICOES inválido: {criterio!r} (use uf ou id:<tamanho da faixa>).")
+    return criterio
+
+def _pasta_particoes(path: str) -> str:
+    return path + ".particoes"
+
+def _manifesto_path(path: str) -> str:
+    return os.path.join(_pasta_particoes(path), _MANIFESTO)
+
+def particionado(path: str = DATA_PATH) -> bool:
+    """True se os lotes de ``path`` estão gravados em partições."""
+    return os.path.exists(_manifesto_path(path))
+
+def _chave_particao(lote: Dict[str, Any], criterio: str) -> str:
+    if criterio == "uf":
+        return lote["origem_uf"].upper()
+    faixa = int(criterio[3:])
+    return f"{lote['id'] // faixa * faixa:09d}"
+
+def _ler_particoes(path: str) -> Dict[str, Any]:
+    with open(_manifesto_path(path), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _versao_base(path: str) -> str:
+    """Hash do estado gravado ao qual o journal se amarra."""
+    if particionado(path):
+        return _sha256(_manifesto_path(path))
+    return _hash_esperado(path)
+
+def contexto_processos() -> multiprocessing.context.BaseContext:
+    """Contexto para os pools de processos. Nunca "fork": o processo tem threads
+    (log, persistência, conexão Oracle) e um fork com LOCK ou o lock do log
+    seguros por outra thread deixa o filho travado."""
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in metodos else "spawn")
+
+def pool_processos(processos: int) -> ProcessPoolExecutor:
+    """ProcessPoolExecutor em contexto_processos(), com o log dos filhos
+    encaminhado ao processo principal (só ele grava o arquivo de log)."""
+    ctx = contexto_processos()
+    return ProcessPoolExecutor(max_workers=processos, mp_context=ctx, initializer=iniciar_log_processo,
+                               initargs=(fila_log_processos(ctx),))
+
+def _em_paralelo(fn: Callable[[Any], Any], tarefas: List[Any], volume: int) -> List[Any]:
+    """``map`` num pool de processos; no próprio processo se o volume for pequeno."""
+    processos = min(int(os.getenv("PARTICOES_PROCESSOS", "0")) or os.cpu_count() or 1, len(tarefas))
+    if processos <= 1 or volume < _MIN_PARALELO:
+        return [fn(t) for t in tarefas]
+    with pool_processos(processos) as ex:
+        return list(ex.map(fn, tarefas))
+
+def _serializar(lotes: List[Dict[str, Any]]) -> bytes:
+    content = json.dumps(lotes, ensure_ascii=False, indent=2)
+    if os.linesep != "\n":  # mesmo resultado da escrita em modo texto
+        content = content.replace("\n", os.linesep)
+    return content.encode("utf-8")
+
+def _ler_particao(tarefa: Tuple[str, str, str]) -> Tuple[bytes, int, str, bool]:
+    """Roda no pool: (marshal dos lotes, qtd, SHA-256 do arquivo, veio do cache).
+    Sem cache válido, valida cada lote e confere se ele pertence à partição."""
+    arquivo, chave, criterio = tarefa
+    logico = os.path.join(os.path.dirname(arquivo), chave + ".json")
+    lido = _ler_cache_corpo(logico, arquivo)
+    if lido is not None:
+        return lido[0], lido[1], lido[2], True
+    info = LeituraStream()
+    lotes = list(iterar_lotes_json(arquivo, None, info))
+    for l in lotes:
+        if _chave_particao(l, criterio) != chave:
+            raise ValueError(f"Partição {chave}: lote {l['id']} pertence à partição {_chave_particao(l, criterio)}.")
+    corpo = marshal.dumps(lotes)
+    _gravar_cache(logico, lotes, info.sha256, corpo)
+    return corpo, len(lotes), info.sha256, False
+
+def _gravar_particao(tarefa: Tuple[str, str, bytes]) -> Tuple[str, str, str, int]:
+    """Roda no pool: valida e grava uma partição (dados, .sha256, snapshot e
+    cache); devolve (chave, arquivo, SHA-256, qtd)."""
+    pasta, chave, corpo = tarefa
+    lotes = marshal.loads(corpo)
+    for l in lotes:
+        validar_lote_dict(l)
+    dados = _serializar(lotes)
+    dig = hashlib.sha256(dados).hexdigest()
+    arquivo = f"{chave}-{dig[:16]}.json"
+    destino = os.path.join(pasta, arquivo)
+    logico = os.path.join(pasta, chave + ".json")
+    _write_atomic(destino, dados)
+    _save_hash(destino, dados)
+    salvar_snapshot(logico, dados, dig)
+    _gravar_cache(logico, lotes, dig, corpo)
+    return chave, arquivo, dig, len(lotes)
+
+def _sha256_particao(arquivo: str) -> str:
+    try:
+        return _sha256(arquivo)
+    except FileNotFoundError:
+        return ""
+
+def _carregar_particoes(path: str, progresso: Optional[Progresso]) -> Tuple[List[Dict[str, Any]], bool, str]:
+    """(lotes em ordem de id, integridade, origem) das partições de ``path``."""
+    man = _ler_particoes(path)
+    pasta = _pasta_particoes(path)
+    chaves = sorted(man["particoes"])
+    arquivos = [os.path.join(pasta, man["particoes"][c]["arquivo"]) for c in chaves]
+    tamanhos = [os.path.getsize(a) for a in arquivos]
+    lidas = _em_paralelo(_ler_particao, [(a, c, man["criterio"]) for a, c in zip(arquivos, chaves)],
+                         sum(tamanhos))
+    dados: List[Dict[str, Any]] = []
+    for lotes, (_, qtd, _, _) in zip(_desserializar(r[0] for r in lidas), lidas):
+        if len(lotes) != qtd:
+            raise ValueError("Cache de partição inconsistente.")
+        dados.extend(lotes)
+    if progresso:
+        progresso(sum(tamanhos), sum(tamanhos), len(dados))
+    divergentes = [c for c, r in zip(chaves, lidas) if r[2] != man["particoes"][c]["sha256"]]
+    if divergentes:
+        log(f"carregar_json: partições divergentes do manifesto {divergentes}")
+    dados.sort(key=lambda l: l["id"])
+    for a, b in zip(dados, dados[1:]):
+        if a["id"] == b["id"]:
+            raise ValueError(f"IDs duplicados entre partições: {a['id']}.")
+    do_cache = sum(1 for r in lidas if r[3])
+    return dados, not divergentes, f"particoes ({do_cache}/{len(chaves)} do cache)"
+
+def conferir_particoes(path: str = DATA_PATH) -> List[str]:
+    """Confere o SHA-256 de cada partição contra o manifesto (em paralelo).
+    Devolve as chaves das partições divergentes ou ausentes; [] se íntegro."""
+    man = _ler_particoes(path)
+    pasta = _pasta_particoes(path)
+    chaves = sorted(man["particoes"])
+    arquivos = [os.path.join(pasta, man["particoes"][c]["arquivo"]) for c in chaves]
+    volume = sum(os.path.getsize(a) for a in arquivos if os.path.exists(a))
+    hashes = _em_paralelo(_sha256_particao, arquivos, volume)
+    return [c for c, h in zip(chaves, hashes) if h != man["particoes"][c]["sha256"]]
+
+def _particoes_tocadas(lotes: List[Dict[str, Any]], path: str, criterio: str) -> Optional[Set[str]]:
+    """Partições alteradas pelas mutações do journal; None se não der para saber."""
+    jp = _journal_path(path)
+    if not os.path.exists(jp):
+        return set()
+    obter = getattr(lotes, "obter", None)  # LoteStore: índice por id já pronto
+    if obter is None:
+        obter = {l["id"]: l for l in lotes}.get
+
+    def chave_id(lote_id: int) -> Optional[str]:
+        lote = obter(lote_id) if criterio == "uf" else {"id": lote_id}
+        return None if lote is None else _chave_particao(lote, criterio)
+
+    tocadas: Set[str] = set()
+    with open(jp, "r", encoding="utf-8") as f:
+        for linha in f:
+            try:
+                reg = json.loads(linha)
+            except ValueError:
+                break
+            op = reg.get("op")
+            if op == "base":
+                if reg.get("sha256") != _versao_base(path):
+                    return None
+                continue
+            if op == "lote":
+                chaves = [_chave_particao(reg["lote"], criterio)]
+            elif op == "evento":
+                chaves = [chave_id(reg["id"])]
+            elif op == "id":
+                chaves = [chave_id(reg["de"]), chave_id(reg["para"])]
+            else:
+                return None
+            if None in chaves:
+                return None
+            tocadas.update(chaves)
+    return tocadas
+
+def _limpar_particoes(path: str, particoes: Dict[str, Any]) -> None:
+    """Remove os arquivos de partição que o manifesto não referencia mais."""
+    vivos = {p["arquivo"] for p in particoes.values()}
+    pasta = _pasta_particoes(path)
+    for nome in os.listdir(pasta):
+        if _ARQUIVO_PARTICAO.fullmatch(nome) and nome.removesuffix(".sha256") not in vivos:
+            os.remove(os.path.join(pasta, nome))
+
+def _remover_arquivo_unico(path: str) -> None:
+    """Depois de migrar para partições: o dados.json único já está no snapshot store."""
+    for arq in (path, path + ".sha256", _cache_path(path)):
         try:
-            os.remove(os.path.join(os.path.dirname(path), velho))
-        except Exception:
+            os.remove(arq)
+        except FileNotFoundError:
             pass
 
-def _write_atomic(path: str, content: str) -> None:
-    tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        f.write(content)
-    os.replace(tmp, path)
+def _salvar_particoes(lotes: List[Dict[str, Any]], path: str, criterio: str,
+                      tocadas: Optional[Set[str]]) -> None:
+    t0 = time.perf_counter()
+    pasta = _pasta_particoes(path)
+    os.makedirs(pasta, exist_ok=True)
+    _snapshot_inicial(path)  # migração: preserva o dados.json único
+    atuais: Dict[str, Any] = {}
+    if particionado(path):
+        man = _ler_particoes(path)
+        if man.get("criterio") == criterio:
+            atuais = man["particoes"]
+    grupos: Dict[str, List[Dict[str, Any]]] = {}
+    for l in lotes:
+        grupos.setdefault(_chave_particao(l, criterio), []).append(l)
+    reescrever = {c for c, ls in grupos.items()
+                  if tocadas is None or c in tocadas or c not in atuais or atuais[c]["qtd"] != len(ls)}
+    tarefas = [(pasta, c, marshal.dumps(grupos[c])) for c in sorted(reescrever)]
+    gravadas = _em_paralelo(_gravar_particao, tarefas, sum(len(t[2]) for t in tarefas))
+
+    particoes = {c: atuais[c] for c in grupos if c not in reescrever}
+    for chave, arquivo, dig, qtd in gravadas:
+        particoes[chave] = {"arquivo": arquivo, "sha256": dig, "qtd": qtd}
+    conteudo = json.dumps({"versao": 1, "criterio": criterio, "particoes": dict(sorted(particoes.items()))},
+                          indent=1).encode("utf-8")
+    _write_atomic(_manifesto_path(path), conteudo)  # ponto de troca para a versão nova
+    salvar_snapshot(path, conteudo)
+    _limpar_particoes(path, particoes)
+    if os.path.exists(path):
+        _remover_arquivo_unico(path)
+        log(f"salvar_json: {path} migrado para partições ({criterio})")
+    log(f"salvar_json: OK ({len(lotes)} lotes, {len(reescrever)}/{len(grupos)} partições reescritas)",
+        duracao_ms=round((time.perf_counter() - t0) * 1000, 3))
+
+def _restaurar_particoes(path: str, conteudo: bytes) -> None:
+    """Remonta as partições de um manifesto a partir dos snapshots de cada uma."""
+    man = json.loads(conteudo)
+    pasta = _pasta_particoes(path)
+    os.makedirs(pasta, exist_ok=True)
+    for chave, p in man["particoes"].items():
+        destino = os.path.join(pasta, p["arquivo"])
+        if _sha256_particao(destino) == p["sha256"]:
+            continue
+        logico = os.path.join(pasta, chave + ".json")
+        # o mesmo conteúdo pode ter voltado mais de uma vez: usa o mais recente
+        snaps = [e for e in listar_snapshots(logico) if e["sha256"] == p["sha256"]]
+        if not snaps:
+            raise ValueError(f"Partição {chave}: snapshot {p['sha256'][:12]} não está mais disponível.")
+        dados = ler_snapshot(logico, snaps[-1]["id"])
+        _write_atomic(destino, dados)
+        _save_hash(destino, dados)
+    _write_atomic(_manifesto_path(path), conteudo)
+    _limpar_particoes(path, man["particoes"])
+    _remover_arquivo_unico(path)
 
 # ---------- Carregar / Salvar ----------
-def carregar_json_validado(path: str = DATA_PATH) -> List[Dict[str, Any]]:
-    if not os.path.exists(path):
+@instrumentar("carregar_json_validado")
+def carregar_json_validado(path: str = DATA_PATH,
+                           progresso: Optional[Progresso] = None) -> List[Dict[str, Any]]:
+    t0 = time.perf_counter()
+    origem = "json"
+    if particionado(path):
+        dados, integ, origem = _carregar_particoes(path, progresso)
+    elif not os.path.exists(path):
+        dados: List[Dict[str, Any]] = []
+        integ = False
         log(f"carregar_json: {path} não existe → []")
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        dados = json.load(f)
-    if not isinstance(dados, list):
-        raise ValueError("Raiz do JSON deve ser lista.")
-    for l in dados:
-        validar_lote_dict(l)
-    ids = [l["id"] for l in dados]
-    if len(ids) != len(set(ids)):
-        raise ValueError("IDs duplicados no JSON.")
-    integ = conferir_hash(path)
-    log(f"carregar_json: OK ({len(dados)}) | integridade={'OK' if integ else 'N/A'}")
+    else:
+        cache = _ler_cache(path)
+        if cache is not None:
+            (dados, sha), origem = cache, "cache"
+            integ = sha == _hash_esperado(path)  # sha: recalculado do dados.json atual
+            if progresso:
+                tamanho = os.path.getsize(path)
+                progresso(tamanho, tamanho, len(dados))
+        else:
+            info = LeituraStream()
+            dados = list(iterar_lotes_json(path, progresso, info))
+            integ = info.integridade
+            if not integ and _ler_manifesto(path)[1] > 0:
+                log(f"carregar_json: blocos divergentes {verificar_blocos(path)}")
+            _gravar_cache(path, dados, info.sha256)
+    pend = _aplicar_journal(dados, path)
+    _JOURNAL_PENDENTES[path] = pend
+    log(f"carregar_json: OK ({len(dados)}) | integridade={'OK' if integ else 'N/A'} | journal={pend}",
+        duracao_ms=round((time.perf_counter() - t0) * 1000, 3), origem=origem)
     return dados
 
-def salvar_json_seguro(lotes: List[Dict[str, Any]], path: str = DATA_PATH) -> None:
+def carregar_json_compacto(path: str = DATA_PATH,
+                           progresso: Optional[Progresso] = None) -> ColunasLotes:
+    """Carrega direto para o formato colunar, sem manter a lista de dicts.
+    Com journal pendente (eventos alteram lotes antigos) cai no caminho normal."""
+    if not os.path.exists(path) or os.path.exists(_journal_path(path)) or particionado(path):
+        return ColunasLotes.de_lotes(carregar_json_validado(path, progresso))
+    info = LeituraStream()
+    col = ColunasLotes.de_lotes(iterar_lotes_json(path, progresso, info))
+    log(f"carregar_json_compacto: OK ({len(col)}) | integridade={'OK' if info.integridade else 'N/A'}")
+    return col
+
+@instrumentar("salvar_json_seguro")
+def salvar_json_seguro(lotes: List[Dict[str, Any]], path: str = DATA_PATH,
+                       tocadas: Optional[Set[str]] = None) -> None:
     """
+    Com ARMAZENAMENTO_PARTICOES, grava em partições; ``tocadas`` restringe a
+    reescrita a essas partições (None: todas).
 
     :rtype: None
     """
+    criterio = _criterio_particoes()
+    if criterio:
+        _salvar_particoes(lotes, path, criterio, tocadas)
+        return
+    t0 = time.perf_counter()
     for l in lotes:
         validar_lote_dict(l)
-    _backup_rotativo(path)
-    content = json.dumps(lotes, ensure_ascii=False, indent=2)
-    _write_atomic(path, content)
-    _save_hash(path)
-    log(f"salvar_json: OK ({len(lotes)} lotes)")
+    _snapshot_inicial(path)
+    dados = _serializar(lotes)
+    _write_atomic(path, dados)
+    dig = _save_hash(path, dados)
+    salvar_snapshot(path, dados, dig)
+    _gravar_cache(path, lotes, dig)
+    if particionado(path):  # volta ao arquivo único: o manifesto deixa de valer
+        os.remove(_manifesto_path(path))
+    log(f"salvar_json: OK ({len(lotes)} lotes)", duracao_ms=round((time.perf_counter() - t0) * 1000, 3))
+
+def restaurar_snapshot(ident: str, path: str = DATA_PATH) -> None:
+    """Substitui o arquivo de dados pelo snapshot escolhido (ver listar_snapshots).
+    Mutações ainda no journal são descartadas junto com ele."""
+    dados = ler_snapshot(path, ident)
+    if dados.lstrip()[:1] == b"{":  # snapshot de um manifesto de partições
+        _restaurar_particoes(path, dados)
+    else:
+        _write_atomic(path, dados)
+        _save_hash(path, dados)
+        if particionado(path):
+            os.remove(_manifesto_path(path))
+    try:
+        os.remove(_journal_path(path))
+    except FileNotFoundError:
+        pass
+    _JOURNAL_PENDENTES[path] = 0
+    log(f"restaurar_snapshot: {ident} → {path}")
 
 # ---------- Exportar para CSV ----------
-def exportar_csv_lotes(lotes: List[Dict[str, Any]], csv_path: str) -> None:
-    campos = ["id","produto","produtor","origem_uf","data_colheita","peso_kg",
-              "carbono_neutro","agua_reuso","status","qtd_eventos"]
-    with open(csv_path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=campos, delimiter=";")
-        w.writeheader()
-        for l in lotes:
-            w.writerow({
-                "id": l["id"],
-                "produto": l["produto"],
-                "produtor": l["produtor"],
-                "origem_uf": l["origem_uf"],
-                "data_colheita": l["data_colheita"],
-                "peso_kg": l["peso_kg"],
-                "carbono_neutro": int(bool(l["carbono_neutro"])),
-                "agua_reuso": int(bool(l["agua_reuso"])),
-                "status": l["status"],
-                "qtd_eventos": len(l["eventos"])
-            })
-    log(f"exportar_csv: OK → {csv_path}")
+def exportar_csv_lotes(lotes: Iterable[Dict[str, Any]], csv_path: str) -> None:
+    exportar_lotes(lotes, csv_path, "csv")
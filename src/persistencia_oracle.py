@@ -1,13 +1,22 @@
 from __future__ import annotations
+import importlib
+import json
 import os
-from typing import List, Dict, Any, Optional
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 
-from .utils import b2sn, sn2b, iso_to_date, log
+from datetime import date, datetime, timedelta
 
-try:
-    import oracledb
-except Exception:
-    oracledb = None  # permite que o app rode sem Oracle instalado
+from .dominio import UF_VALIDAS
+from .metricas import instrumentar, cronometro, contar
+from .relatorios import kpis_de_totais
+from .utils import DATA_DIR, b2sn, sn2b, iso_to_date, log
+
+# O driver só é importado na primeira conexão (ver _driver). ORACLE_DRIVER
+# permite trocar o módulo, ex.: um driver falso para simular rede lenta.
+DRIVER = os.getenv("ORACLE_DRIVER", "oracledb").strip()
+oracledb = None
 
 HOST     = os.getenv("ORACLE_HOST", "oracle.fiap.com.br")
 PORT     = os.getenv("ORACLE_PORT", "1521")
@@ -19,35 +28,172 @@ SCHEMA_QUERY = os.getenv("ORACLE_SCHEMA", "").strip()
 
 AUTO_INIT = os.getenv("ORACLE_AUTO_INIT", "1").strip().lower() in ("1", "true", "yes")
 
+BATCH_SIZE = int(os.getenv("ORACLE_BATCH_SIZE", "1000"))
+
+# Pool de sessões (ORACLE_POOL=1) e cache de statements
+USE_POOL     = os.getenv("ORACLE_POOL", "0").strip().lower() in ("1", "true", "yes")
+POOL_MIN     = int(os.getenv("ORACLE_POOL_MIN", "1"))
+POOL_MAX     = int(os.getenv("ORACLE_POOL_MAX", "4"))
+POOL_TIMEOUT = int(os.getenv("ORACLE_POOL_TIMEOUT_MS", "5000"))  # espera por sessão livre
+STMT_CACHE   = int(os.getenv("ORACLE_STMT_CACHE", "50"))
+
+# Tempo máximo para abrir a conexão TCP (sem isso, um host inacessível segura
+# a conexão até o sistema operacional desistir)
+CONNECT_TIMEOUT = float(os.getenv("ORACLE_CONNECT_TIMEOUT_S", "5"))
+
+# Tabelas de resumo para os KPIs (LOTE_RESUMO por UF e LOTE_ATIVIDADE por
+# lote), mantidas junto com cada inserção de lote/evento
+USE_RESUMO = os.getenv("ORACLE_RESUMO", "0").strip().lower() in ("1", "true", "yes")
+
+# Linhas por round trip nas consultas grandes
+FETCH_ARRAYSIZE = int(os.getenv("ORACLE_FETCH_ARRAYSIZE", "1000"))
+
+# Guarda quais usuário@dsn já tiveram o schema conferido, para pular as
+# consultas em user_tables/user_indexes nos próximos boots.
+SCHEMA_CACHE_PATH = os.path.join(DATA_DIR, ".oracle_schema_ok.json")
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
 def T(name: str) -> str:
     """Qualifica o nome da tabela com SCHEMA_QUERY, se definindo para consultas/CRUD.
     Use APENAS para SELECT/INSERT/UPDATE/DELETE. A criação é no usuário logado."""
     return f"{SCHEMA_QUERY}.{name}" if SCHEMA_QUERY else name
 
+# ---------- Métricas de round trips / linhas / commit ----------
+def _viagens(n: int = 1, linhas: int = 0) -> None:
+    contar("oracle_round_trips_total", n)
+    if linhas:
+        contar("oracle_linhas_total", linhas)
 
+def _viagens_fetch(linhas: int, arraysize: int) -> None:
+    """Uma consulta devolvendo ``linhas`` em lotes de ``arraysize`` por viagem."""
+    _viagens(1 + linhas // max(arraysize, 1), linhas)
+
+def _commit(conn) -> None:
+    with cronometro("oracle_commit"):
+        conn.commit()
+    _viagens()
+
+
+@instrumentar("oracle_conectar")
 def conectar_oracle_from_env():
     """
-    Conecta no Oracle com as variáveis do .env.
-    Se AUTO_INIT estiver habilitado, cria as tabelas no usuário logado (se não existirem).
+    Conecta no Oracle com as variáveis do .env (ou empresta do pool, se ORACLE_POOL=1).
+    Se AUTO_INIT estiver habilitado, cria as tabelas no usuário logado (se não existirem);
+    a conferência fica em cache e não se repete nos próximos boots.
     """
+    dsn = _dsn()
+    if USE_POOL:
+        conn = criar_pool_from_env().acquire()
+    else:
+        conn = oracledb.connect(user=USER, password=PASSWORD, dsn=dsn,
+                                stmtcachesize=STMT_CACHE, tcp_connect_timeout=CONNECT_TIMEOUT)
+    conn.autocommit = False
+    _garantir_schema(conn)
+    return conn
+
+def _driver():
+    global oracledb
     if oracledb is None:
-        raise RuntimeError("Pacote 'oracledb' não está instalado. pip install oracledb")
+        try:
+            oracledb = importlib.import_module(DRIVER)
+        except Exception:  # permite que o app rode sem Oracle instalado
+            raise RuntimeError(f"Pacote '{DRIVER}' não está instalado. pip install oracledb")
+    return oracledb
+
+def _dsn() -> str:
+    _driver()
 
     if not all([HOST, PORT, SERVICE, USER, PASSWORD]):
         raise RuntimeError("Variáveis ORACLE_* ausentes/invalidas no .env")
 
-    dsn = f"{HOST}:{PORT}/{SERVICE}"  # formato FIAP: host:1521/SERVICE
-    conn = oracledb.connect(user=USER, password=PASSWORD, dsn=dsn)
-    conn.autocommit = False
+    return f"{HOST}:{PORT}/{SERVICE}"  # formato FIAP: host:1521/SERVICE
+
+def criar_pool_from_env():
+    """Cria (uma vez por processo) o pool de sessões com os limites do .env."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            dsn = _dsn()
+            _POOL = oracledb.create_pool(
+                user=USER, password=PASSWORD, dsn=dsn,
+                min=POOL_MIN, max=POOL_MAX, increment=1,
+                stmtcachesize=STMT_CACHE, tcp_connect_timeout=CONNECT_TIMEOUT,
+                getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                wait_timeout=POOL_TIMEOUT,
+            )
+            log(f"Oracle: pool criado (min={POOL_MIN}, max={POOL_MAX})")
+        return _POOL
+
+def liberar_conexao(conn) -> None:
+    """Devolve a conexão ao pool (ou fecha, no modo de conexão dedicada)."""
+    if _POOL is not None and USE_POOL:
+        _POOL.release(conn)
+    else:
+        conn.close()
+
+@contextmanager
+def sessao():
+    """Empresta uma conexão pelo tempo do bloco ``with``."""
+    conn = conectar_oracle_from_env()
+    try:
+        yield conn
+    finally:
+        liberar_conexao(conn)
+
+def fechar_pool() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+            _POOL = None
+
+# ---------- Cache da inicialização do schema ----------
+_SCHEMA_OK: Optional[set] = None
 
-    if AUTO_INIT:
+def _chave_schema() -> str:
+    return f"{USER.upper()}@{_dsn()}" + ("+resumo" if USE_RESUMO else "")
+
+def _schema_conhecido() -> set:
+    global _SCHEMA_OK
+    if _SCHEMA_OK is None:
         try:
-            criar_tabelas_se_nao_existirem(conn)
-        except Exception as e:
-            # não impede o uso; apenas loga
-            log(f"Oracle AUTO_INIT falhou: {e}")
+            with open(SCHEMA_CACHE_PATH, "r", encoding="utf-8") as f:
+                _SCHEMA_OK = set(json.load(f))
+        except (FileNotFoundError, ValueError):
+            _SCHEMA_OK = set()
+    return _SCHEMA_OK
 
-    return conn
+def _garantir_schema(conn) -> None:
+    """Roda o AUTO_INIT só na primeira vez para este usuário/dsn."""
+    if not AUTO_INIT:
+        return
+    chave = _chave_schema()
+    conhecidos = _schema_conhecido()
+    if chave in conhecidos:
+        return
+    try:
+        criar_tabelas_se_nao_existirem(conn)
+    except Exception as e:
+        # não impede o uso; apenas loga
+        log(f"Oracle AUTO_INIT falhou: {e}")
+        return
+    conhecidos.add(chave)
+    try:
+        with open(SCHEMA_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump(sorted(conhecidos), f)
+    except OSError as e:
+        log(f"Oracle: não foi possível gravar cache do schema ({e})")
+
+def esquecer_schema() -> None:
+    """Invalida o cache (ex.: tabelas removidas manualmente)."""
+    global _SCHEMA_OK
+    _SCHEMA_OK = set()
+    try:
+        os.remove(SCHEMA_CACHE_PATH)
+    except FileNotFoundError:
+        pass
 
 
 def _table_exists(conn, table_name: str) -> bool:
@@ -111,127 +257,590 @@ def criar_tabelas_se_nao_existirem(conn) -> None:
             cur.execute("CREATE INDEX IDX_LOTE_STATUS ON LOTE(STATUS)")
             log("Oracle: índice IDX_LOTE_STATUS criado.")
 
-    conn.commit()
+        if USE_RESUMO and not _table_exists(conn, "LOTE_RESUMO"):
+            cur.execute("""
+                CREATE TABLE LOTE_RESUMO (
+                  ORIGEM_UF    CHAR(2) PRIMARY KEY,
+                  QTD          NUMBER DEFAULT 0 NOT NULL,
+                  QTD_AGUA     NUMBER DEFAULT 0 NOT NULL,
+                  QTD_CARBONO  NUMBER DEFAULT 0 NOT NULL,
+                  PESO_TOTAL   NUMBER(16,3) DEFAULT 0 NOT NULL
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE LOTE_ATIVIDADE (
+                  LOTE_ID  NUMBER PRIMARY KEY REFERENCES LOTE(ID) ON DELETE CASCADE,
+                  ULTIMA   DATE NOT NULL
+                )
+            """)
+            cur.execute("CREATE INDEX IDX_ATIVIDADE_ULTIMA ON LOTE_ATIVIDADE(ULTIMA)")
+            log("Oracle: tabelas LOTE_RESUMO/LOTE_ATIVIDADE criadas.")
+            reconstruir_resumo(conn, commit=False)
+
+    _commit(conn)
 
 
-def inserir_lote(conn, lote: Dict[str, Any]) -> int:
-    """
-    Insere no Oracle e retorna o novo ID.
-    Corrigido o DPY-2005: o bind :NEW_ID é passado dentro do dicionário.
-    """
-    sql = f"""
+SQL_INSERIR_LOTE = f"""
     INSERT INTO {T('LOTE')} (PRODUTO, PRODUTOR, ORIGEM_UF, DATA_COLHEITA, PESO_KG,
                              CARBONO_NEUTRO, AGUA_REUSO, STATUS)
     VALUES (:PROD, :PDR, :UF, :DC, :PESO, :CARB, :AGUA, :ST)
     RETURNING ID INTO :NEW_ID
     """
+
+SQL_INSERIR_EVENTO = f"""
+    INSERT INTO {T('EVENTO')} (LOTE_ID, TIPO, DATA_EVENTO, LOCAL, RESPONSAVEL, OBSERVACOES)
+    VALUES (:LID, :TP, :DT, :LOC, :RESP, :OBS)
+    RETURNING ID INTO :NEW_ID
+    """
+
+def _params_lote(lote: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "PROD": lote["produto"],
+        "PDR": lote["produtor"],
+        "UF": lote["origem_uf"].upper(),
+        "DC": iso_to_date(lote["data_colheita"]),
+        "PESO": float(lote["peso_kg"]),
+        "CARB": b2sn(bool(lote["carbono_neutro"])),
+        "AGUA": b2sn(bool(lote["agua_reuso"])),
+        "ST": lote.get("status", "EM_PROCESSAMENTO"),
+    }
+
+def _params_evento(lote_id: int, ev_iso: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "LID": lote_id,
+        "TP": ev_iso["tipo"].upper(),
+        "DT": iso_to_date(ev_iso["data"]),
+        "LOC": ev_iso.get("local", ""),
+        "RESP": ev_iso.get("responsavel", ""),
+        "OBS": ev_iso.get("observacoes", ""),
+    }
+
+@instrumentar("oracle_inserir_lote")
+def inserir_lote(conn, lote: Dict[str, Any]) -> int:
+    """
+    Insere no Oracle e retorna o novo ID.
+    Corrigido o DPY-2005: o bind :NEW_ID é passado dentro do dicionário.
+    """
+    sql = SQL_INSERIR_LOTE
     with conn.cursor() as cur:
         new_id = cur.var(oracledb.NUMBER)
-        params = {
-            "PROD": lote["produto"],
-            "PDR": lote["produtor"],
-            "UF": lote["origem_uf"].upper(),
-            "DC": iso_to_date(lote["data_colheita"]),
-            "PESO": float(lote["peso_kg"]),
-            "CARB": b2sn(bool(lote["carbono_neutro"])),
-            "AGUA": b2sn(bool(lote["agua_reuso"])),
-            "ST": lote.get("status", "EM_PROCESSAMENTO"),
-            "NEW_ID": new_id,
-        }
+        params = _params_lote(lote)
+        params["NEW_ID"] = new_id
         cur.execute(sql, params)
-        conn.commit()
+        _viagens(1, 1)
         val = new_id.getvalue()
         novo = int(val[0] if isinstance(val, list) else val)
+        if USE_RESUMO:
+            _resumo_lotes(conn, [(novo, params)])
+        _commit(conn)
         log(f"DB inserir_lote: {novo}")
         return novo
 
+@instrumentar("oracle_atualizar_lote_status")
 def atualizar_lote_status(conn, lote_id: int, status: str) -> int:
     sql = f"UPDATE {T('LOTE')} SET STATUS=:S WHERE ID=:ID"
     with conn.cursor() as cur:
         cur.execute(sql, {"S": status, "ID": lote_id})
-        conn.commit()
+        _viagens(1, cur.rowcount)
+        _commit(conn)
         return cur.rowcount
 
+def _filtro_lotes(uf: Optional[str], status: Optional[str], alias: str = "") -> Tuple[str, Dict[str, Any]]:
+    where, params = "", {}
+    if uf:
+        where += f" AND {alias}ORIGEM_UF = :UF"; params["UF"] = uf.upper()
+    if status:
+        where += f" AND {alias}STATUS = :ST"; params["ST"] = status
+    return where, params
+
+def _lote_de_linha(row) -> Dict[str, Any]:
+    (ID, PROD, PDR, UF, DC, PESO, CARB, AGUA, ST) = row
+    return {
+        "id": int(ID),
+        "produto": PROD,
+        "produtor": PDR,
+        "origem_uf": UF,
+        "data_colheita": DC.strftime("%Y-%m-%d"),
+        "peso_kg": float(PESO),
+        "carbono_neutro": sn2b(CARB),
+        "agua_reuso": sn2b(AGUA),
+        "status": ST,
+        "eventos": []
+    }
+
+def _evento_de_linha(TP, DT, LOC, RESP, OBS) -> Dict[str, Any]:
+    return {
+        "tipo": TP,
+        "data": DT.strftime("%Y-%m-%d"),
+        "local": LOC or "",
+        "responsavel": RESP or "",
+        "observacoes": OBS or ""
+    }
+
+def _ajustar_fetch(cur, arraysize: int) -> None:
+    cur.arraysize = arraysize
+    cur.prefetchrows = arraysize + 1
+
+@instrumentar("oracle_listar_lotes")
 def listar_lotes_db(conn, uf: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    where, params = _filtro_lotes(uf, status)
     sql = f"""SELECT ID, PRODUTO, PRODUTOR, ORIGEM_UF, DATA_COLHEITA, PESO_KG,
                      CARBONO_NEUTRO, AGUA_REUSO, STATUS
-              FROM {T('LOTE')} WHERE 1=1"""
-    params = {}
-    if uf:
-        sql += " AND ORIGEM_UF = :UF"; params["UF"] = uf.upper()
-    if status:
-        sql += " AND STATUS = :ST"; params["ST"] = status
-    sql += " ORDER BY ID DESC"
+              FROM {T('LOTE')} WHERE 1=1{where} ORDER BY ID DESC"""
+
+    with conn.cursor() as cur:
+        out = [_lote_de_linha(row) for row in cur.execute(sql, params)]
+        _viagens_fetch(len(out), getattr(cur, "arraysize", 100))
+        return out
+
+@instrumentar("oracle_listar_lotes_completos")
+def listar_lotes_completos_db(conn, uf: Optional[str] = None, status: Optional[str] = None,
+                              arraysize: int = FETCH_ARRAYSIZE) -> List[Dict[str, Any]]:
+    """
+    Lotes já com seus eventos, no formato Lote/Evento do dominio.
+    São sempre duas consultas (lotes filtrados + eventos desses lotes via JOIN),
+    independente da quantidade de lotes, em vez de uma consulta por lote.
+    """
+    where, params = _filtro_lotes(uf, status, alias="L.")
+    sql_lotes = f"""SELECT L.ID, L.PRODUTO, L.PRODUTOR, L.ORIGEM_UF, L.DATA_COLHEITA, L.PESO_KG,
+                           L.CARBONO_NEUTRO, L.AGUA_REUSO, L.STATUS
+                    FROM {T('LOTE')} L WHERE 1=1{where} ORDER BY L.ID DESC"""
+    sql_eventos = f"""SELECT E.LOTE_ID, E.TIPO, E.DATA_EVENTO, E.LOCAL, E.RESPONSAVEL, E.OBSERVACOES
+                      FROM {T('EVENTO')} E JOIN {T('LOTE')} L ON L.ID = E.LOTE_ID
+                      WHERE 1=1{where} ORDER BY E.LOTE_ID, E.DATA_EVENTO, E.ID"""
 
-    out: List[Dict[str, Any]] = []
     with conn.cursor() as cur:
-        for (ID, PROD, PDR, UF, DC, PESO, CARB, AGUA, ST) in cur.execute(sql, params):
-            out.append({
-                "id": int(ID),
-                "produto": PROD,
-                "produtor": PDR,
-                "origem_uf": UF,
-                "data_colheita": DC.strftime("%Y-%m-%d"),
-                "peso_kg": float(PESO),
-                "carbono_neutro": sn2b(CARB),
-                "agua_reuso": sn2b(AGUA),
-                "status": ST,
-                "eventos": []
-            })
+        _ajustar_fetch(cur, arraysize)
+        out = [_lote_de_linha(row) for row in cur.execute(sql_lotes, params)]
+        _viagens_fetch(len(out), arraysize)
+        por_id = {l["id"]: l for l in out}
+        _ajustar_fetch(cur, arraysize)
+        n_ev = 0
+        for (LID, *ev) in cur.execute(sql_eventos, params):
+            n_ev += 1
+            lote = por_id.get(int(LID))
+            if lote is not None:
+                lote["eventos"].append(_evento_de_linha(*ev))
+        _viagens_fetch(n_ev, arraysize)
+    log(f"DB listar_lotes_completos: {len(out)} lotes")
     return out
 
+@instrumentar("oracle_iterar_lotes_completos")
+def iterar_lotes_completos_db(conn, uf: Optional[str] = None, status: Optional[str] = None,
+                              arraysize: int = FETCH_ARRAYSIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Versão em streaming de listar_lotes_completos_db: dois cursores abertos
+    (lotes e eventos, ambos ordenados por ID do lote) percorridos em merge,
+    gerando um lote completo por vez. A memória não cresce com a tabela.
+    """
+    where, params = _filtro_lotes(uf, status, alias="L.")
+    sql_lotes = f"""SELECT L.ID, L.PRODUTO, L.PRODUTOR, L.ORIGEM_UF, L.DATA_COLHEITA, L.PESO_KG,
+                           L.CARBONO_NEUTRO, L.AGUA_REUSO, L.STATUS
+                    FROM {T('LOTE')} L WHERE 1=1{where} ORDER BY L.ID"""
+    sql_eventos = f"""SELECT E.LOTE_ID, E.TIPO, E.DATA_EVENTO, E.LOCAL, E.RESPONSAVEL, E.OBSERVACOES
+                      FROM {T('EVENTO')} E JOIN {T('LOTE')} L ON L.ID = E.LOTE_ID
+                      WHERE 1=1{where} ORDER BY E.LOTE_ID, E.DATA_EVENTO, E.ID"""
+    with conn.cursor() as cur_l, conn.cursor() as cur_e:
+        _ajustar_fetch(cur_l, arraysize)
+        _ajustar_fetch(cur_e, arraysize)
+        eventos = iter(cur_e.execute(sql_eventos, params))
+        pendente = next(eventos, None)
+        n_l = n_ev = 0
+        try:
+            for row in cur_l.execute(sql_lotes, params):
+                lote = _lote_de_linha(row)
+                n_l += 1
+                while pendente is not None and int(pendente[0]) <= lote["id"]:
+                    if int(pendente[0]) == lote["id"]:
+                        lote["eventos"].append(_evento_de_linha(*pendente[1:]))
+                    n_ev += 1
+                    pendente = next(eventos, None)
+                yield lote
+        finally:
+            _viagens_fetch(n_l, arraysize)
+            _viagens_fetch(n_ev, arraysize)
+
+@instrumentar("oracle_deletar_lote")
 def deletar_lote(conn, lote_id: int) -> int:
     sql = f"DELETE FROM {T('LOTE')} WHERE ID=:ID"
     with conn.cursor() as cur:
+        if USE_RESUMO:
+            _resumo_remover(conn, lote_id)
         cur.execute(sql, {"ID": lote_id})
-        conn.commit()
+        _viagens(1, cur.rowcount)
+        _commit(conn)
         return cur.rowcount
 
 
+@instrumentar("oracle_inserir_evento")
 def inserir_evento(conn, lote_id: int, ev_iso: Dict[str, Any]) -> int:
-    sql = f"""
-    INSERT INTO {T('EVENTO')} (LOTE_ID, TIPO, DATA_EVENTO, LOCAL, RESPONSAVEL, OBSERVACOES)
-    VALUES (:LID, :TP, :DT, :LOC, :RESP, :OBS)
-    RETURNING ID INTO :NEW_ID
-    """
+    sql = SQL_INSERIR_EVENTO
     with conn.cursor() as cur:
         new_id = cur.var(oracledb.NUMBER)
-        params = {
-            "LID": lote_id,
-            "TP": ev_iso["tipo"].upper(),
-            "DT": iso_to_date(ev_iso["data"]),
-            "LOC": ev_iso.get("local", ""),
-            "RESP": ev_iso.get("responsavel", ""),
-            "OBS": ev_iso.get("observacoes", ""),
-            "NEW_ID": new_id,
-        }
+        params = _params_evento(lote_id, ev_iso)
+        params["NEW_ID"] = new_id
         cur.execute(sql, params)
+        _viagens(1, 1)
         # INSPECAO muda status pra PRONTO
         if ev_iso["tipo"].upper() == "INSPECAO":
             cur.execute(f"UPDATE {T('LOTE')} SET STATUS='PRONTO' WHERE ID=:ID", {"ID": lote_id})
-        conn.commit()
+            _viagens()
+        if USE_RESUMO:
+            _resumo_eventos(conn, [params])
+        _commit(conn)
         val = new_id.getvalue()
         novo = int(val[0] if isinstance(val, list) else val)
         log(f"DB inserir_evento: {novo} (lote {lote_id})")
         return novo
 
+@instrumentar("oracle_listar_eventos_do_lote")
 def listar_eventos_do_lote(conn, lote_id: int) -> List[Dict[str, Any]]:
     sql = f"""SELECT ID, TIPO, DATA_EVENTO, LOCAL, RESPONSAVEL, OBSERVACOES
               FROM {T('EVENTO')} WHERE LOTE_ID=:ID ORDER BY DATA_EVENTO"""
     out: List[Dict[str, Any]] = []
     with conn.cursor() as cur:
         for (ID, TP, DT, LOC, RESP, OBS) in cur.execute(sql, {"ID": lote_id}):
-            out.append({
-                "id": int(ID),
-                "tipo": TP,
-                "data": DT.strftime("%Y-%m-%d"),
-                "local": LOC,
-                "responsavel": RESP,
-                "observacoes": OBS
-            })
+            out.append({"id": int(ID), **_evento_de_linha(TP, DT, LOC, RESP, OBS)})
+        _viagens_fetch(len(out), getattr(cur, "arraysize", 100))
+    return out
+
+
+# ---------- Inserção em massa (array DML) ----------
+ErroLinha = Tuple[int, str]  # (índice na entrada, mensagem)
+
+def _executar_em_massa(conn, sql: str, linhas: List[Tuple[int, Dict[str, Any]]],
+                       ids: List[Optional[int]], erros: List[ErroLinha],
+                       commit: bool = True) -> None:
+    """Executa um executemany com RETURNING ID e batcherrors (commit único).
+    ``linhas`` traz (índice original, binds); preenche ``ids``/``erros``."""
+    if not linhas:
+        return
+    with conn.cursor() as cur:
+        new_id = cur.var(oracledb.NUMBER, arraysize=len(linhas))
+        params = []
+        for _, p in linhas:
+            p["NEW_ID"] = new_id
+            params.append(p)
+        cur.executemany(sql, params, batcherrors=True)
+        falhas = {e.offset: e.message for e in cur.getbatcherrors()}
+    _viagens(1, len(linhas) - len(falhas))
+    if commit:
+        _commit(conn)
+    for pos, (idx, _) in enumerate(linhas):
+        if pos in falhas:
+            erros.append((idx, falhas[pos]))
+            continue
+        val = new_id.getvalue(pos)
+        ids[idx] = int(val[0] if isinstance(val, list) else val)
+
+@instrumentar("oracle_inserir_lotes_em_massa")
+def inserir_lotes_em_massa(conn, lotes: List[Dict[str, Any]],
+                           tamanho: int = BATCH_SIZE) -> Tuple[List[Optional[int]], List[ErroLinha]]:
+    """
+    Insere vários lotes com executemany (um round trip e um commit por bloco).
+    Retorna (ids, erros): ids[i] é o ID gerado para lotes[i] (None se a linha
+    falhou) e erros lista (i, mensagem) sem abortar o restante do bloco.
+    """
+    ids: List[Optional[int]] = [None] * len(lotes)
+    erros: List[ErroLinha] = []
+    for ini in range(0, len(lotes), tamanho):
+        linhas = []
+        for i in range(ini, min(ini + tamanho, len(lotes))):
+            try:
+                linhas.append((i, _params_lote(lotes[i])))
+            except Exception as e:
+                erros.append((i, str(e)))
+        _executar_em_massa(conn, SQL_INSERIR_LOTE, linhas, ids, erros, commit=not USE_RESUMO)
+        if USE_RESUMO:
+            _resumo_lotes(conn, [(ids[i], p) for i, p in linhas if ids[i] is not None])
+            _commit(conn)
+    log(f"DB inserir_lotes_em_massa: {len(lotes) - len(erros)} ok, {len(erros)} erro(s)")
+    return ids, erros
+
+@instrumentar("oracle_inserir_eventos_em_massa")
+def inserir_eventos_em_massa(conn, eventos: List[Tuple[int, Dict[str, Any]]],
+                             tamanho: int = BATCH_SIZE) -> Tuple[List[Optional[int]], List[ErroLinha]]:
+    """
+    Insere vários eventos, dados como pares (lote_id, evento ISO).
+    Eventos INSPECAO marcam o lote como PRONTO no mesmo bloco.
+    """
+    ids: List[Optional[int]] = [None] * len(eventos)
+    erros: List[ErroLinha] = []
+    for ini in range(0, len(eventos), tamanho):
+        linhas = []
+        for i in range(ini, min(ini + tamanho, len(eventos))):
+            try:
+                linhas.append((i, _params_evento(*eventos[i])))
+            except Exception as e:
+                erros.append((i, str(e)))
+        _executar_em_massa(conn, SQL_INSERIR_EVENTO, linhas, ids, erros, commit=False)
+        prontos = sorted({eventos[i][0] for i, _ in linhas
+                          if ids[i] is not None and eventos[i][1]["tipo"].upper() == "INSPECAO"})
+        if prontos:
+            with conn.cursor() as cur:
+                cur.executemany(f"UPDATE {T('LOTE')} SET STATUS='PRONTO' WHERE ID=:ID",
+                                [{"ID": lid} for lid in prontos])
+            _viagens()
+        if USE_RESUMO:
+            _resumo_eventos(conn, [p for i, p in linhas if ids[i] is not None])
+        _commit(conn)
+    log(f"DB inserir_eventos_em_massa: {len(eventos) - len(erros)} ok, {len(erros)} erro(s)")
+    return ids, erros
+
+@instrumentar("oracle_enviar_json")
+def enviar_json_para_oracle(conn, lotes: List[Dict[str, Any]],
+                            tamanho: int = BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Envia a base JSON inteira (lotes e seus eventos) ao Oracle em blocos.
+    Não é idempotente (cada chamada insere tudo de novo): serve para a carga
+    inicial de uma base vazia; o envio incremental é o do Sincronizador.
+    Retorna {"mapa_ids": {id_local: id_oracle}, "erros_lotes": [(id_local, msg)],
+    "erros_eventos": [(id_local, msg)]}.
+    """
+    ids, erros_l = inserir_lotes_em_massa(conn, lotes, tamanho)
+    mapa = {l["id"]: novo for l, novo in zip(lotes, ids) if novo is not None}
+    pares = [(mapa[l["id"]], ev) for l in lotes if l["id"] in mapa for ev in l["eventos"]]
+    origem = [l["id"] for l in lotes if l["id"] in mapa for _ in l["eventos"]]
+    _, erros_e = inserir_eventos_em_massa(conn, pares, tamanho)
+    log(f"DB enviar_json_para_oracle: {len(mapa)} lotes, {len(pares) - len(erros_e)} eventos")
+    return {
+        "mapa_ids": mapa,
+        "erros_lotes": [(lotes[i]["id"], msg) for i, msg in erros_l],
+        "erros_eventos": [(origem[i], msg) for i, msg in erros_e],
+    }
+
+
+# ---------- Sincronização incremental (ver sincronizacao) ----------
+_COLUNAS_LOTE = """L.ID, L.PRODUTO, L.PRODUTOR, L.ORIGEM_UF, L.DATA_COLHEITA, L.PESO_KG,
+                   L.CARBONO_NEUTRO, L.AGUA_REUSO, L.STATUS"""
+
+@instrumentar("oracle_marcas")
+def marcas_db(conn) -> Tuple[int, int]:
+    """Maiores IDs de LOTE e EVENTO."""
+    with conn.cursor() as cur:
+        ml = cur.execute(f"SELECT COALESCE(MAX(ID), 0) FROM {T('LOTE')}").fetchone()[0]
+        me = cur.execute(f"SELECT COALESCE(MAX(ID), 0) FROM {T('EVENTO')}").fetchone()[0]
+    _viagens(2)
+    return int(ml), int(me)
+
+@instrumentar("oracle_iterar_lotes_com_contagem")
+def iterar_lotes_com_contagem_db(conn, arraysize: int = FETCH_ARRAYSIZE) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """(lote sem eventos, quantidade de eventos) de todos os lotes."""
+    sql = f"""SELECT {_COLUNAS_LOTE},
+                     (SELECT COUNT(*) FROM {T('EVENTO')} E WHERE E.LOTE_ID = L.ID)
+              FROM {T('LOTE')} L ORDER BY L.ID"""
+    n = 0
+    with conn.cursor() as cur:
+        _ajustar_fetch(cur, arraysize)
+        try:
+            for row in cur.execute(sql):
+                n += 1
+                yield _lote_de_linha(row[:-1]), int(row[-1])
+        finally:
+            _viagens_fetch(n, arraysize)
+
+@instrumentar("oracle_lotes_desde")
+def lotes_desde_db(conn, marca: int,
+                   arraysize: int = FETCH_ARRAYSIZE) -> List[Tuple[Dict[str, Any], List[int]]]:
+    """Lotes com ID > ``marca``, completos, e os IDs dos seus eventos (na ordem)."""
+    sql_lotes = f"SELECT {_COLUNAS_LOTE} FROM {T('LOTE')} L WHERE L.ID > :M ORDER BY L.ID"
+    sql_eventos = f"""SELECT E.LOTE_ID, E.ID, E.TIPO, E.DATA_EVENTO, E.LOCAL, E.RESPONSAVEL, E.OBSERVACOES
+                      FROM {T('EVENTO')} E WHERE E.LOTE_ID > :M ORDER BY E.LOTE_ID, E.DATA_EVENTO, E.ID"""
+    with conn.cursor() as cur:
+        _ajustar_fetch(cur, arraysize)
+        out = [(_lote_de_linha(row), []) for row in cur.execute(sql_lotes, {"M": marca})]
+        _viagens_fetch(len(out), arraysize)
+        por_id = {l["id"]: (l, ids) for l, ids in out}
+        _ajustar_fetch(cur, arraysize)
+        n_ev = 0
+        for (LID, EID, *ev) in cur.execute(sql_eventos, {"M": marca}):
+            n_ev += 1
+            par = por_id.get(int(LID))
+            if par is not None:  # evento de lote inserido depois da primeira consulta fica para a próxima
+                par[0]["eventos"].append(_evento_de_linha(*ev))
+                par[1].append(int(EID))
+        _viagens_fetch(n_ev, arraysize)
+    return out
+
+@instrumentar("oracle_eventos_desde")
+def eventos_desde_db(conn, marca: int,
+                     arraysize: int = FETCH_ARRAYSIZE) -> List[Tuple[int, int, Dict[str, Any]]]:
+    """(id do evento, id do lote, evento) com ID > ``marca``, em ordem de ID."""
+    sql = f"""SELECT E.ID, E.LOTE_ID, E.TIPO, E.DATA_EVENTO, E.LOCAL, E.RESPONSAVEL, E.OBSERVACOES
+              FROM {T('EVENTO')} E WHERE E.ID > :M ORDER BY E.ID"""
+    with conn.cursor() as cur:
+        _ajustar_fetch(cur, arraysize)
+        out = [(int(EID), int(LID), _evento_de_linha(*ev)) for (EID, LID, *ev) in cur.execute(sql, {"M": marca})]
+    _viagens_fetch(len(out), arraysize)
     return out
 
+@instrumentar("oracle_atualizar_lotes_em_massa")
+def atualizar_lotes_em_massa(conn, lotes: List[Tuple[int, Dict[str, Any]]],
+                             tamanho: int = BATCH_SIZE) -> List[ErroLinha]:
+    """
+    Regrava os campos de lotes já existentes, dados como pares (id no Oracle,
+    lote). Com ORACLE_RESUMO, tira cada lote do resumo antes e o soma de novo
+    depois, no mesmo commit. Retorna os erros (índice, mensagem).
+    """
+    sql = f"""UPDATE {T('LOTE')} SET PRODUTO=:PROD, PRODUTOR=:PDR, ORIGEM_UF=:UF, DATA_COLHEITA=:DC,
+                     PESO_KG=:PESO, CARBONO_NEUTRO=:CARB, AGUA_REUSO=:AGUA, STATUS=:ST
+              WHERE ID=:ID"""
+    erros: List[ErroLinha] = []
+    for ini in range(0, len(lotes), tamanho):
+        linhas = []
+        for i in range(ini, min(ini + tamanho, len(lotes))):
+            rid, lote = lotes[i]
+            try:
+                linhas.append((i, dict(_params_lote(lote), ID=rid)))
+            except Exception as e:
+                erros.append((i, str(e)))
+        if not linhas:
+            continue
+        if USE_RESUMO:
+            for _, p in linhas:
+                _resumo_remover(conn, p["ID"])
+        with conn.cursor() as cur:
+            cur.executemany(sql, [p for _, p in linhas], batcherrors=True)
+            falhas = {e.offset: e.message for e in cur.getbatcherrors()}
+        _viagens(1, len(linhas) - len(falhas))
+        erros += [(linhas[pos][0], msg) for pos, msg in falhas.items()]
+        if USE_RESUMO and falhas:
+            reconstruir_resumo(conn, commit=False)  # as linhas que falharam já tinham saído do resumo
+        elif USE_RESUMO:
+            ok = [(i, p) for pos, (i, p) in enumerate(linhas) if pos not in falhas]
+            _resumo_lotes(conn, [(p["ID"], p) for _, p in ok])
+            _resumo_eventos(conn, [{"LID": p["ID"], "DT": max(iso_to_date(ev["data"]) for ev in lotes[i][1]["eventos"])}
+                                   for i, p in ok if lotes[i][1]["eventos"]])
+        _commit(conn)
+    log(f"DB atualizar_lotes_em_massa: {len(lotes) - len(erros)} ok, {len(erros)} erro(s)")
+    return erros
+
+
+# ---------- KPIs no servidor ----------
+# Mesmo dict de relatorios.kpis, calculado com agregações no banco: só as
+# linhas por UF (no máximo 27) voltam ao cliente. A "última atividade" de um
+# lote é a maior data entre a colheita e seus eventos (no JSON vale o último
+# evento registrado; diferem só se eventos forem lançados fora de ordem).
+
+SQL_KPIS_POR_UF = f"""
+    SELECT L.ORIGEM_UF, COUNT(*),
+           SUM(CASE WHEN L.AGUA_REUSO = 'S' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN L.CARBONO_NEUTRO = 'S' THEN 1 ELSE 0 END),
+           SUM(L.PESO_KG),
+           SUM(CASE WHEN E.ULTIMA > L.DATA_COLHEITA THEN
+                    CASE WHEN E.ULTIMA < :LIMITE THEN 1 ELSE 0 END
+               ELSE CASE WHEN L.DATA_COLHEITA < :LIMITE THEN 1 ELSE 0 END END)
+    FROM {T('LOTE')} L
+    LEFT JOIN (SELECT LOTE_ID, MAX(DATA_EVENTO) AS ULTIMA
+               FROM {T('EVENTO')} GROUP BY LOTE_ID) E ON E.LOTE_ID = L.ID
+    GROUP BY L.ORIGEM_UF
+    ORDER BY L.ORIGEM_UF"""
+
+SQL_KPIS_RESUMO = f"""
+    SELECT ORIGEM_UF, QTD, QTD_AGUA, QTD_CARBONO, PESO_TOTAL
+    FROM {T('LOTE_RESUMO')} WHERE QTD > 0 ORDER BY ORIGEM_UF"""
+
+SQL_PARADOS_RESUMO = f"SELECT COUNT(*) FROM {T('LOTE_ATIVIDADE')} WHERE ULTIMA < :LIMITE"
+
+@instrumentar("oracle_kpis")
+def kpis_db(conn, hoje: Optional[date] = None, resumo: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    KPIs de sustentabilidade calculados no banco (formato de relatorios.kpis).
+    Com ``resumo`` (padrão: ORACLE_RESUMO) lê LOTE_RESUMO/LOTE_ATIVIDADE, sem
+    varrer LOTE/EVENTO; senão agrega as tabelas base com GROUP BY.
+    """
+    resumo = USE_RESUMO if resumo is None else resumo
+    limite = (hoje or datetime.now().date()) - timedelta(days=7)
+    with conn.cursor() as cur:
+        if resumo:
+            linhas = [(*r, 0) for r in cur.execute(SQL_KPIS_RESUMO)]
+            cur.execute(SQL_PARADOS_RESUMO, {"LIMITE": limite})
+            (parados,) = cur.fetchone()
+            _viagens(2, len(linhas) + 1)
+        else:
+            linhas = list(cur.execute(SQL_KPIS_POR_UF, {"LIMITE": limite}))
+            parados = sum(int(r[5] or 0) for r in linhas)
+            _viagens(1, len(linhas))
+    return kpis_de_totais(
+        total=sum(int(r[1]) for r in linhas),
+        agua=sum(int(r[2] or 0) for r in linhas),
+        carb=sum(int(r[3] or 0) for r in linhas),
+        peso_total=sum(float(r[4] or 0) for r in linhas),
+        por_uf={r[0]: int(r[1]) for r in linhas},
+        sem_evento_7d=int(parados),
+    )
+
+def _resumo_lotes(conn, novos: List[Tuple[int, Dict[str, Any]]]) -> None:
+    """Soma os lotes recém-inseridos (id, binds de _params_lote) ao resumo."""
+    if not novos:
+        return
+    por_uf: Dict[str, Dict[str, Any]] = {}
+    for _, p in novos:
+        d = por_uf.setdefault(p["UF"], {"UF": p["UF"], "N": 0, "A": 0, "C": 0, "P": 0.0})
+        d["N"] += 1
+        d["A"] += p["AGUA"] == "S"
+        d["C"] += p["CARB"] == "S"
+        d["P"] += p["PESO"]
+    with conn.cursor() as cur:
+        cur.executemany(f"""UPDATE {T('LOTE_RESUMO')} SET QTD = QTD + :N, QTD_AGUA = QTD_AGUA + :A,
+                                   QTD_CARBONO = QTD_CARBONO + :C, PESO_TOTAL = PESO_TOTAL + :P
+                            WHERE ORIGEM_UF = :UF""", list(por_uf.values()))
+        cur.executemany(f"INSERT INTO {T('LOTE_ATIVIDADE')} (LOTE_ID, ULTIMA) VALUES (:ID, :DT)",
+                        [{"ID": i, "DT": p["DC"]} for i, p in novos])
+    _viagens(2)
+
+def _resumo_eventos(conn, eventos: List[Dict[str, Any]]) -> None:
+    """Avança a última atividade dos lotes (binds de _params_evento)."""
+    if not eventos:
+        return
+    with conn.cursor() as cur:
+        cur.executemany(f"""UPDATE {T('LOTE_ATIVIDADE')} SET ULTIMA = :DT
+                            WHERE LOTE_ID = :LID AND ULTIMA < :DT""",
+                        [{"LID": p["LID"], "DT": p["DT"]} for p in eventos])
+    _viagens()
+
+def _resumo_remover(conn, lote_id: int) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"""UPDATE {T('LOTE_RESUMO')} SET
+                          QTD = QTD - 1,
+                          QTD_AGUA = QTD_AGUA - (SELECT CASE WHEN AGUA_REUSO = 'S' THEN 1 ELSE 0 END
+                                                 FROM {T('LOTE')} WHERE ID = :ID),
+                          QTD_CARBONO = QTD_CARBONO - (SELECT CASE WHEN CARBONO_NEUTRO = 'S' THEN 1 ELSE 0 END
+                                                       FROM {T('LOTE')} WHERE ID = :ID),
+                          PESO_TOTAL = PESO_TOTAL - (SELECT PESO_KG FROM {T('LOTE')} WHERE ID = :ID)
+                        WHERE ORIGEM_UF = (SELECT ORIGEM_UF FROM {T('LOTE')} WHERE ID = :ID)""",
+                    {"ID": lote_id})
+        cur.execute(f"DELETE FROM {T('LOTE_ATIVIDADE')} WHERE LOTE_ID = :ID", {"ID": lote_id})
+    _viagens(2)
+
+def reconstruir_resumo(conn, commit: bool = True) -> None:
+    """Recalcula LOTE_RESUMO/LOTE_ATIVIDADE a partir de LOTE/EVENTO (ao ligar
+    ORACLE_RESUMO numa base que já tem dados, ou para corrigir divergências)."""
+    with conn.cursor() as cur:
+        cur.execute(f"DELETE FROM {T('LOTE_RESUMO')}")
+        cur.executemany(f"INSERT INTO {T('LOTE_RESUMO')} (ORIGEM_UF) VALUES (:UF)",
+                        [{"UF": uf} for uf in sorted(UF_VALIDAS)])
+        cur.execute(f"""UPDATE {T('LOTE_RESUMO')} SET
+              QTD = (SELECT COUNT(*) FROM {T('LOTE')} L WHERE L.ORIGEM_UF = {T('LOTE_RESUMO')}.ORIGEM_UF),
+              QTD_AGUA = (SELECT COUNT(*) FROM {T('LOTE')} L
+                          WHERE L.ORIGEM_UF = {T('LOTE_RESUMO')}.ORIGEM_UF AND L.AGUA_REUSO = 'S'),
+              QTD_CARBONO = (SELECT COUNT(*) FROM {T('LOTE')} L
+                             WHERE L.ORIGEM_UF = {T('LOTE_RESUMO')}.ORIGEM_UF AND L.CARBONO_NEUTRO = 'S'),
+              PESO_TOTAL = (SELECT COALESCE(SUM(L.PESO_KG), 0) FROM {T('LOTE')} L
+                            WHERE L.ORIGEM_UF = {T('LOTE_RESUMO')}.ORIGEM_UF)""")
+        cur.execute(f"DELETE FROM {T('LOTE_ATIVIDADE')}")
+        cur.execute(f"""INSERT INTO {T('LOTE_ATIVIDADE')} (LOTE_ID, ULTIMA)
+              SELECT L.ID, CASE WHEN MAX(E.DATA_EVENTO) > L.DATA_COLHEITA
+                                THEN MAX(E.DATA_EVENTO) ELSE L.DATA_COLHEITA END
+              FROM {T('LOTE')} L LEFT JOIN {T('EVENTO')} E ON E.LOTE_ID = L.ID
+              GROUP BY L.ID, L.DATA_COLHEITA""")
+    _viagens(6)
+    if commit:
+        _commit(conn)
+    log("Oracle: resumo de KPIs reconstruído.")
+
 
+@instrumentar("oracle_df_lotes")
 def df_lotes(conn):
     """Retorna um DataFrame com os lotes (se pandas estiver instalado)."""
     try:
@@ -244,6 +853,7 @@ def df_lotes(conn):
               FROM {T('LOTE')} ORDER BY ID DESC"""
     return pd.read_sql(sql, conn)
 
+@instrumentar("oracle_df_eventos")
 def df_eventos(conn, lote_id: Optional[int] = None):
     """Retorna um DataFrame com eventos (filtra por lote_id se informado)."""
     try:
@@ -263,6 +873,7 @@ def df_eventos(conn, lote_id: Optional[int] = None):
         cur.execute(sql, params)
         cols = [d[0] for d in cur.description]
         rows = cur.fetchall()
+        _viagens_fetch(len(rows), cur.arraysize)
     # monta DataFrame manualmente para não depender do cx_Oracle cursor_factory
     import pandas as pd
     return pd.DataFrame(rows, columns=cols)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from typing import List, Dict, Any, Callable, Optional
+
+from .casos_uso import LOCK, LoteStore
+from .persistencia_json import (
+    compactar_journal, journal_limite, registrar_journal_linhas, serializar_registro
+)
+from .sincronizacao import Sincronizador
+from .utils import DATA_PATH, log
+
+# ---------- Persistência em segundo plano (write-behind) ----------
+# O menu altera LOTES em memória (segurando LOCK) e enfileira a mutação. Uma
+# thread agrupa o que chegou na janela: as linhas do journal vão numa única
+# escrita, os lotes alterados são marcados no Sincronizador e, com o Oracle
+# conectado, enviados em massa (ver sincronizacao). Em modo "sync" quem
+# enfileira espera a gravação terminar; em "async" volta na hora.
+#
+# Configuração pelo .env (lida ao criar o trabalhador, depois do load_dotenv):
+#   PERSISTENCIA_MODO=async      async | sync
+#   PERSISTENCIA_JANELA_MS=50    janela de agrupamento das mutações
+#   SYNC_INTERVALO_S=60          intervalo para buscar no Oracle o que outros clientes gravaram
+
+
+class _Espera(threading.Event):
+    """Event de quem espera a gravação; ``erro`` guarda a exceção, se ela falhou."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.erro: Optional[BaseException] = None
+
+
+class _Item:
+    __slots__ = ("registro", "sujo", "feito", "baixar")
+
+    def __init__(self, registro: Any, sujo: Optional[int], feito: Optional[_Espera],
+                 baixar: bool = False):
+        self.registro = registro  # registro do journal (lotes já serializados)
+        self.sujo = sujo          # id do lote alterado
+        self.feito = feito
+        self.baixar = baixar      # pede uma rodada completa de sincronização
+
+
+class TrabalhadorPersistencia(threading.Thread):
+    def __init__(self, lotes: LoteStore, path: str = DATA_PATH, conn=None,
+                 modo: Optional[str] = None, janela: Optional[float] = None,
+                 intervalo: Optional[float] = None):
+        super().__init__(name="persistencia", daemon=True)
+        self.lotes = lotes
+        self.path = path
+        self.conn = conn  # pode ser trocada a qualquer momento (ConexaoOracle.ao_conectar)
+        self.ao_falhar_oracle: Optional[Callable[[Any, BaseException], Any]] = None
+        self.modo = (os.getenv("PERSISTENCIA_MODO", "async") if modo is None else modo).strip().lower()
+        self.janela = float(os.getenv("PERSISTENCIA_JANELA_MS", "50")) / 1000 if janela is None else janela
+        self.intervalo = float(os.getenv("SYNC_INTERVALO_S", "60")) if intervalo is None else intervalo
+        self.sync = Sincronizador(lotes, path)
+        self.ultima_sync: Dict[str, Any] = {}
+        self._fila: "queue.Queue[Optional[_Item]]" = queue.Queue()
+
+    # ----- lado do menu -----
+    def enviar(self, registro: Dict[str, Any]) -> Optional[_Espera]:
+        """Enfileira uma mutação já aplicada em memória. Chame segurando LOCK,
+        para que a ordem da fila seja a ordem das mutações, e passe o retorno
+        para confirmar() depois de soltar o LOCK."""
+        feito = _Espera() if self.modo == "sync" else None
+        sujo = registro["lote"]["id"] if registro.get("op") == "lote" else registro.get("id")
+        # o dict do lote continua mudando em memória: serializa já
+        self._fila.put(_Item(serializar_registro(registro), sujo, feito))
+        return feito
+
+    def confirmar(self, feito: Optional[_Espera]) -> None:
+        """No modo "sync", espera a gravação da mutação enviada e repassa a
+        exceção se o journal não pôde ser gravado."""
+        if feito is not None:
+            feito.wait()
+            if feito.erro is not None:
+                raise feito.erro
+
+    def sincronizar(self, timeout: Optional[float] = None) -> bool:
+        """Espera tudo o que já foi enfileirado ser gravado."""
+        if not self.is_alive():
+            return True
+        feito = _Espera()
+        self._fila.put(_Item(None, None, feito))
+        return feito.wait(timeout)
+
+    def marcar(self, ids: List[int]) -> None:
+        """Lotes alterados fora do menu (importação em massa) a enviar ao Oracle."""
+        with LOCK:  # o Sincronizador troca o conjunto de sujos segurando LOCK
+            self.sync.marcar(ids)
+        self._fila.put(_Item(None, None, None))
+
+    def recarregada(self) -> None:
+        """LOTES foi substituída (snapshot, importação do JSON): confere tudo."""
+        self.sync.marcar_tudo()
+
+    def conectado(self, conn) -> None:
+        """Troca a conexão (None quando cai) e, se conectou, sincroniza já."""
+        self.conn = conn
+        if conn is not None:
+            self._fila.put(_Item(None, None, None, baixar=True))
+
+    def sincronizar_oracle(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Roda uma rodada completa (envio e recebimento) e devolve o resumo,
+        ou None se não terminou no ``timeout``."""
+        if not self.is_alive():
+            return None
+        feito = _Espera()
+        self._fila.put(_Item(None, None, feito, baixar=True))
+        return self.ultima_sync if feito.wait(timeout) else None
+
+    def parar(self) -> None:
+        if self.is_alive():
+            self._fila.put(None)
+            self.join()
+
+    # ----- thread -----
+    def run(self) -> None:
+        fim = False
+        while not fim:
+            try:
+                # conectado, acorda de tempos em tempos para buscar o que mudou no Oracle
+                item = self._fila.get(timeout=self.intervalo if self.conn is not None else None)
+            except queue.Empty:
+                item = _Item(None, None, None, baixar=True)
+            itens: List[_Item] = []
+            prazo = time.monotonic() + self.janela
+            while True:
+                if item is None:
+                    fim = True
+                    break
+                itens.append(item)
+                try:
+                    item = self._fila.get(timeout=max(0.0, prazo - time.monotonic()))
+                except queue.Empty:
+                    break
+            if itens:
+                erro: Optional[BaseException] = None
+                try:
+                    self._processar(itens)
+                except Exception as e:
+                    log(f"ERRO persistencia_worker: {e}")
+                    erro = e
+                finally:
+                    for i in itens:
+                        if i.feito is not None:
+                            i.feito.erro = erro
+                            i.feito.set()
+
+    def _drenar(self) -> List[_Item]:
+        extras = []
+        while True:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                return extras
+            if item is None:  # recoloca o pedido de parada para o laço principal
+                self._fila.put(None)
+                return extras
+            extras.append(item)
+
+    def _journal(self, linhas: List[str]) -> List[_Item]:
+        if linhas and registrar_journal_linhas(linhas, self.path) >= journal_limite():
+            # Com LOCK, tudo o que está em LOTES já está na fila: o snapshot passa
+            # a cobrir exatamente o que foi enfileirado, e o resto sai da fila.
+            with LOCK:
+                try:
+                    compactar_journal(self.lotes, self.path)
+                except Exception as e:
+                    # as linhas já estão no journal; a próxima gravação tenta de novo
+                    log(f"ERRO persistencia_worker: compactação falhou ({e})")
+                    return []
+                return self._drenar()
+        return []
+
+    def _processar(self, itens: List[_Item]) -> None:
+        """Grava o journal (uma falha aqui sobe para quem espera) e depois
+        sincroniza com o Oracle (uma falha ali só fica no log e em ultima_sync:
+        as mutações já estão no journal e os lotes voltam a ficar sujos)."""
+        linhas = [i.registro for i in itens if i.registro is not None]
+        itens.extend(self._journal(linhas))
+        self.sync.marcar(i.sujo for i in itens if i.sujo is not None)
+        if linhas:
+            log(f"persistencia_worker: {len(linhas)} mutação(ões) gravadas")
+        conn = self.conn
+        if conn is None:
+            return
+        try:
+            res = self.sync.enviar(conn)
+            if any(i.baixar for i in itens):
+                eventos, lotes = self.sync.buscar(conn)
+                # aplicação e journal juntos: uma compactação no meio duplicaria os lotes
+                with LOCK:
+                    linhas, n_lotes, n_eventos = self.sync.aplicar(eventos, lotes)
+                    extras = self._journal(linhas)
+                    self.sync.estado.gravar()  # só depois do journal
+                itens.extend(extras)
+                self.sync.marcar(i.sujo for i in extras if i.sujo is not None)
+                res = dict(res, lotes_recebidos=n_lotes, eventos_recebidos=n_eventos)
+            self.ultima_sync = res
+        except Exception as e:
+            log(f"ERRO persistencia_worker: Oracle → {e}")
+            self.ultima_sync = {"erro": str(e)}
+            if self.ao_falhar_oracle is not None:
+                self.ao_falhar_oracle(conn, e)
@@ -1,39 +1,107 @@
 from __future__ import annotations
-from typing import List, Dict, Any
-from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional, Hashable, Set
+from bisect import bisect_left, insort
+from datetime import datetime, date
 from .dominio import Lote
-from .utils import iso_to_date
+from .metricas import instrumentar
+from .utils import iso_to_ordinal
 
-def kpis(lotes: List[Lote]) -> Dict[str, Any]:
-    total = len(lotes)
+class KpisIncrementais:
+    """Mantém os KPIs de sustentabilidade atualizados a cada lote/evento.
+
+    Os lotes são identificados por uma chave estável (a posição no LoteStore).
+    A última atividade de cada lote (data do último evento, ou a colheita)
+    agrupa os lotes por data em ``_lotes_por_dia``, com as datas distintas
+    ordenadas em ``_dias``; assim ``resultado`` só percorre as datas, não os
+    lotes, e listar os parados desde uma data custa O(log n + k).
+    """
+
+    def __init__(self) -> None:
+        self.limpar()
+
+    def limpar(self) -> None:
+        self.total = 0
+        self.agua = 0
+        self.carb = 0
+        self.peso_total = 0.0
+        self.por_uf: Dict[str, int] = {}
+        self._ultima: Dict[Hashable, int] = {}
+        self._lotes_por_dia: Dict[int, Set[Hashable]] = {}
+        self._dias: List[int] = []
+
+    def _mover(self, chave: Hashable, dia: int) -> None:
+        ant = self._ultima.get(chave)
+        if ant == dia:
+            return
+        if ant is not None:
+            self._lotes_por_dia[ant].discard(chave)
+            if not self._lotes_por_dia[ant]:
+                del self._lotes_por_dia[ant]
+                del self._dias[bisect_left(self._dias, ant)]
+        self._ultima[chave] = dia
+        if dia not in self._lotes_por_dia:
+            self._lotes_por_dia[dia] = set()
+            insort(self._dias, dia)
+        self._lotes_por_dia[dia].add(chave)
+
+    def adicionar(self, chave: Hashable, lote: Lote) -> None:
+        self.total += 1
+        self.agua += bool(lote["agua_reuso"])
+        self.carb += bool(lote["carbono_neutro"])
+        self.peso_total += lote["peso_kg"]
+        self.por_uf[lote["origem_uf"]] = self.por_uf.get(lote["origem_uf"], 0) + 1
+        ult = lote["eventos"][-1]["data"] if lote["eventos"] else lote["data_colheita"]
+        self._mover(chave, iso_to_ordinal(ult))
+
+    def registrar_evento(self, chave: Hashable, data_iso: str) -> None:
+        self._mover(chave, iso_to_ordinal(data_iso))
+
+    def sem_evento_desde(self, limite: date) -> int:
+        """Quantidade de lotes cuja última atividade é anterior a ``limite``."""
+        fim = bisect_left(self._dias, limite.toordinal())
+        return sum(len(self._lotes_por_dia[d]) for d in self._dias[:fim])
+
+    def parados_desde(self, limite: date) -> Iterator[Hashable]:
+        """Chaves dos lotes cuja última atividade é anterior a ``limite``, do
+        mais antigo para o mais recente (cada data percorrida tem ao menos um lote)."""
+        for d in self._dias[:bisect_left(self._dias, limite.toordinal())]:
+            yield from self._lotes_por_dia[d]
+
+    def resultado(self, hoje: Optional[date] = None) -> Dict[str, Any]:
+        if self.total == 0:
+            return kpis_de_totais(0, 0, 0, 0.0, {}, 0)
+        hoje = hoje or datetime.now().date()
+        return kpis_de_totais(self.total, self.agua, self.carb, self.peso_total, self.por_uf,
+                              self.sem_evento_desde(date.fromordinal(hoje.toordinal() - 7)))
+
+def kpis_de_totais(total: int, agua: int, carb: int, peso_total: float,
+                   por_uf: Dict[str, int], sem_evento_7d: int) -> Dict[str, Any]:
+    """Monta o dict de KPIs (formato usado por formatar_relatorio) a partir dos totais."""
     if total == 0:
         return {"total": 0, "pct_agua_reuso": 0.0, "pct_carbono_neutro": 0.0,
                 "peso_total_kg": 0.0, "por_uf": {}, "lotes_sem_evento_7d": 0}
-    agua = sum(1 for l in lotes if l["agua_reuso"])
-    carb = sum(1 for l in lotes if l["carbono_neutro"])
-    peso_total = sum(l["peso_kg"] for l in lotes)
-    por_uf: Dict[str, int] = {}
-    for l in lotes:
-        por_uf[l["origem_uf"]] = por_uf.get(l["origem_uf"], 0) + 1
-
-    hoje = datetime.now().date()
-    sem_evento = 0
-    for l in lotes:
-        d_col = iso_to_date(l["data_colheita"])
-        ult = d_col if not l["eventos"] else datetime.strptime(l["eventos"][-1]["data"], "%Y-%m-%d").date()
-        if (hoje - ult).days > 7:
-            sem_evento += 1
-
     return {
         "total": total,
         "pct_agua_reuso": round(100*agua/total, 2),
         "pct_carbono_neutro": round(100*carb/total, 2),
         "peso_total_kg": round(peso_total, 2),
-        "por_uf": por_uf,
-        "lotes_sem_evento_7d": sem_evento
+        "por_uf": dict(por_uf),
+        "lotes_sem_evento_7d": sem_evento_7d
     }
 
-def formatar_relatorio(k: Dict[str, Any]) -> str:
+@instrumentar("kpis")
+def kpis(lotes: List[Lote]) -> Dict[str, Any]:
+    k = getattr(lotes, "kpis", None)
+    if isinstance(k, KpisIncrementais):
+        return k.resultado()
+    k = KpisIncrementais()
+    for pos, l in enumerate(lotes):
+        k.adicionar(pos, l)
+    return k.resultado()
+
+def formatar_relatorio(k: Dict[str, Any], agrupado: Optional[Dict[str, Any]] = None) -> str:
+    """Texto do relatório; ``agrupado`` (saída de analitico.kpis_agrupados)
+    acrescenta a tabela por grupo."""
     linhas = [
         "=== RELATÓRIO DE SUSTENTABILIDADE ===",
         f"Total de lotes: {k['total']}",
@@ -45,5 +113,24 @@ def formatar_relatorio(k: Dict[str, Any]) -> str:
     ]
     for uf, qtd in k["por_uf"].items():
         linhas.append(f"  {uf}: {qtd}")
+    if agrupado is not None:
+        linhas += ["", *formatar_agrupado(agrupado)]
     linhas.append("======================================")
     return "\n".join(linhas)
+
+def formatar_agrupado(a: Dict[str, Any]) -> List[str]:
+    """Tabela de texto com uma linha por grupo e as faixas de lotes parados."""
+    titulo = ", ".join(a["dimensoes"]) or "total"
+    cab = [*(d.upper() for d in a["dimensoes"]), "LOTES", "PESO (kg)", "% ÁGUA", "% CARBONO",
+           *(f"PARADOS {f}" for f in a["faixas"])]
+    corpo = [[*g["chave"], str(g["total"]), f"{g['peso_total_kg']:.2f}",
+              f"{g['pct_agua_reuso']:.2f}", f"{g['pct_carbono_neutro']:.2f}",
+              *(str(x) for x in g["parados"])] for g in a["grupos"]]
+    larg = [max(len(str(c)) for c in col) for col in zip(cab, *corpo)]
+    nd = len(a["dimensoes"])
+
+    def linha(cels: List[str]) -> str:
+        return "  ".join(str(c).ljust(w) if i < nd else str(c).rjust(w)
+                         for i, (c, w) in enumerate(zip(cels, larg)))
+    return [f"Por {titulo} ({len(corpo)} grupo(s)):", linha(cab),
+            "  ".join("-" * w for w in larg), *(linha(c) for c in corpo)]
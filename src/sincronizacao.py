@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import json
+import os
+import zlib
+from typing import List, Dict, Any, Iterable, Set, Tuple
+
+from .casos_uso import LOCK, LoteStore
+from .dominio import Lote, validar_evento_dict, validar_lote_dict
+from .metricas import instrumentar, contar
+from .persistencia_json import serializar_registro
+from .utils import DATA_PATH, log
+
+# ---------- Sincronização incremental JSON ↔ Oracle ----------
+# Os ids locais nunca mudam. O estado em <dados.json>.sync guarda, por lote
+# local, o id no Oracle, quantos dos seus eventos já estão lá (e os que
+# falharam abaixo disso, reenviados no próximo envio do lote) e uma
+# assinatura (CRC) dos campos enviados. O trabalhador de persistência marca
+# como "sujo" cada lote que altera; uma rodada envia só os sujos (em massa)
+# e baixa o que outros clientes inseriram desde a marca d'água (maiores IDs
+# de LOTE/EVENTO já vistos). Com o Oracle fora do ar os sujos só acumulam, e
+# a volta custa O(mudanças). Alterações feitas direto no Oracle em linhas
+# existentes (UPDATE/DELETE) não são baixadas; só inserções.
+#
+# IDENTITY não é efetivado em ordem entre sessões: um ID menor pode aparecer
+# depois de um maior já ter sido lido. Por isso a busca recua SYNC_JANELA_IDS
+# (padrão 500, lido ao criar o Sincronizador) abaixo da marca, e os IDs
+# dessa janela que já temos ficam em "conhecidos" para não entrarem duas vezes.
+#
+# Na primeira rodada (sem estado), lotes que existem dos dois lados com o
+# mesmo conteúdo são associados — pelo id, como ficava quando o id local
+# era trocado pelo do Oracle, ou só pela assinatura — e os lotes remotos que
+# sobrarem são baixados.
+
+ESTADO_COMPACTAR = 200  # linhas no arquivo de estado antes de reescrevê-lo inteiro
+BLOCO_VARREDURA = 20000  # lotes conferidos por vez (LOCK é solto entre os blocos)
+
+
+def assinatura(lote: Lote) -> str:
+    """CRC dos campos do lote gravados na tabela LOTE (sem id, status e eventos:
+    o status acompanha os eventos, que são contados à parte)."""
+    campos = (lote["produto"], lote["produtor"], lote["origem_uf"].upper(), lote["data_colheita"],
+              round(float(lote["peso_kg"]), 3), bool(lote["carbono_neutro"]), bool(lote["agua_reuso"]))
+    return "%08x" % zlib.crc32(repr(campos).encode("utf-8"))
+
+
+class EstadoSync:
+    """Mapa de ids e marcas d'água, gravado como um journal: cada rodada
+    acrescenta uma linha só com o que mudou."""
+
+    def __init__(self, path: str = DATA_PATH):
+        self.path = path + ".sync"
+        # id local → [id Oracle, eventos enviados, assinatura, posições < enviados que falharam]
+        self.lotes: Dict[int, List[Any]] = {}
+        self.remotos: Dict[int, int] = {}      # id Oracle → id local
+        self.marca = [0, 0]                    # maior ID de LOTE / EVENTO já baixado
+        self.piso = [0, 0]                     # a janela nunca recua abaixo disto
+        # IDs da janela ou acima da marca que já temos (gravados por nós ou baixados)
+        self.conhecidos: Tuple[Set[int], Set[int]] = (set(), set())
+        self.iniciado = False
+        self._alterados: Set[int] = set()
+        self._mudou = False
+        self._linhas = 0
+
+    def carregar(self) -> "EstadoSync":
+        if not os.path.exists(self.path):
+            return self
+        with open(self.path, "r", encoding="utf-8") as f:
+            for n, linha in enumerate(f, start=1):
+                try:
+                    reg = json.loads(linha)
+                except ValueError:
+                    log(f"sync: linha {n} do estado ilegível, ignorando o restante")
+                    break
+                for k, v in reg.get("lotes", {}).items():
+                    self.lotes[int(k)] = v if len(v) > 3 else v + [[]]
+                self.marca = reg.get("marca", self.marca)
+                # estado anterior à janela: o que está abaixo da marca já foi esquecido
+                self.piso = reg.get("piso", list(self.marca))
+                self.conhecidos = tuple(set(c) for c in reg.get("conhecidos", ([], [])))
+                self.iniciado = reg.get("iniciado", self.iniciado)
+                self._linhas += 1
+        self.remotos = {v[0]: k for k, v in self.lotes.items()}
+        return self
+
+    def definir(self, local: int, remoto: int, enviados: int, assin: str) -> None:
+        ant = self.lotes.get(local)
+        falhos: List[int] = []
+        if ant is not None and ant[0] != remoto:
+            self.remotos.pop(ant[0], None)
+        elif ant is not None:
+            falhos = ant[3]
+        self.lotes[local] = [remoto, enviados, assin, falhos]
+        self.remotos[remoto] = local
+        self._alterados.add(local)
+
+    def eventos_enviados(self, local: int, n: int, falhos: Iterable[int] = ()) -> None:
+        """Os ``n`` primeiros eventos estão no Oracle, menos as posições ``falhos``."""
+        self.lotes[local][1] = n
+        self.lotes[local][3] = sorted(falhos)
+        self._alterados.add(local)
+
+    def desde(self, janela: int) -> List[int]:
+        """IDs de LOTE / EVENTO a partir dos quais buscar (exclusivo)."""
+        return [max(p, m - janela) for p, m in zip(self.piso, self.marca)]
+
+    def avancar_marca(self, lote: int, evento: int, janela: int) -> None:
+        self.marca = [max(self.marca[0], lote), max(self.marca[1], evento)]
+        for c, d in zip(self.conhecidos, self.desde(janela)):
+            c.difference_update([i for i in c if i <= d])
+        self._mudou = True
+
+    def iniciar(self, ultimo_evento: int) -> None:
+        """Fim da associação inicial: baixa todos os lotes não associados, mas
+        nenhum evento até ``ultimo_evento``."""
+        self.marca = [0, ultimo_evento]
+        self.piso = [0, ultimo_evento]
+        self.iniciado = True
+        self._mudou = True
+
+    def conhecer(self, lotes: Iterable[int] = (), eventos: Iterable[int] = ()) -> None:
+        self.conhecidos[0].update(lotes)
+        self.conhecidos[1].update(eventos)
+        self._mudou = True
+
+    def _registro(self, lotes: Dict[int, Any]) -> str:
+        return json.dumps({"lotes": {str(k): v for k, v in lotes.items()}, "marca": self.marca,
+                           "piso": self.piso, "conhecidos": [sorted(c) for c in self.conhecidos],
+                           "iniciado": self.iniciado}, separators=(",", ":")) + "\n"
+
+    def gravar(self) -> None:
+        if not (self._alterados or self._mudou):
+            return
+        if self._linhas >= ESTADO_COMPACTAR:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self._registro(self.lotes))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._linhas = 1
+        else:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(self._registro({k: self.lotes[k] for k in self._alterados if k in self.lotes}))
+                f.flush()
+                os.fsync(f.fileno())
+            self._linhas += 1
+        self._alterados.clear()
+        self._mudou = False
+
+
+class Sincronizador:
+    """Rodadas de envio/recebimento entre LOTES e o Oracle. Usado pela thread
+    de persistência: os métodos que tocam o banco rodam sem segurar LOCK."""
+
+    def __init__(self, lotes: LoteStore, path: str = DATA_PATH):
+        self.lotes = lotes
+        self.estado = EstadoSync(path).carregar()
+        self._sujos: Set[int] = set()
+        self._rejeitados: Set[int] = set()  # falharam no Oracle; só voltam numa varredura
+        self._varrer = True                 # conferir todos os lotes (boot, base recarregada)
+        self.janela = int(os.getenv("SYNC_JANELA_IDS", "500"))
+
+    def marcar(self, ids: Iterable[int]) -> None:
+        self._sujos.update(ids)
+
+    def marcar_tudo(self) -> None:
+        """Confere todos os lotes na próxima rodada (depois de recarregar a base)."""
+        self._varrer = True
+
+    @property
+    def pendentes(self) -> int:
+        return len(self._sujos)
+
+    def _varredura(self) -> None:
+        """Marca lotes sem id no Oracle, com eventos a enviar ou com campos alterados.
+        Só memória (nenhuma consulta ao banco)."""
+        est = self.estado.lotes
+        self._varrer = False
+        self._rejeitados.clear()
+        ini = 0
+        while True:
+            with LOCK:
+                bloco = self.lotes[ini:ini + BLOCO_VARREDURA]
+                for l in bloco:
+                    e = est.get(l["id"])
+                    if e is None or e[1] != len(l["eventos"]) or e[3] or e[2] != assinatura(l):
+                        self._sujos.add(l["id"])
+            if len(bloco) < BLOCO_VARREDURA:
+                return
+            ini += BLOCO_VARREDURA
+
+    # ----- associação inicial -----
+    def _associar(self, conn) -> None:
+        from .persistencia_oracle import iterar_lotes_com_contagem_db, marcas_db
+        _, ultimo_evento = marcas_db(conn)
+        with LOCK:
+            locais = {l["id"]: (assinatura(l), len(l["eventos"])) for l in self.lotes}
+        por_assin: Dict[str, List[Tuple[int, int]]] = {}
+        associados = 0
+        for remoto, n_ev in iterar_lotes_com_contagem_db(conn):
+            assin = assinatura(remoto)
+            local = locais.get(remoto["id"])
+            if local is not None and local[0] == assin and remoto["id"] not in self.estado.lotes:
+                self.estado.definir(remoto["id"], remoto["id"], min(local[1], n_ev), assin)
+                associados += 1
+            else:
+                por_assin.setdefault(assin, []).append((remoto["id"], n_ev))
+        for lid, (assin, n) in locais.items():
+            candidatos = por_assin.get(assin)
+            if lid not in self.estado.lotes and candidatos:
+                remoto, n_ev = candidatos.pop()
+                self.estado.definir(lid, remoto, min(n, n_ev), assin)
+                associados += 1
+        self.estado.iniciar(ultimo_evento)
+        self._varrer = True
+        log(f"sync: associação inicial → {associados} lote(s) já presentes no Oracle")
+
+    # ----- envio -----
+    @instrumentar("sync_enviar")
+    def enviar(self, conn) -> Dict[str, int]:
+        """Envia os lotes sujos: inserções, eventos novos e campos alterados."""
+        from .persistencia_oracle import (
+            BATCH_SIZE, inserir_lotes_em_massa, inserir_eventos_em_massa, atualizar_lotes_em_massa
+        )
+        if not self.estado.iniciado:
+            self._associar(conn)
+        if self._varrer:
+            self._varredura()
+        est = self.estado.lotes
+        with LOCK:
+            ids, self._sujos = self._sujos - self._rejeitados, set()
+            novos: List[Lote] = []
+            alterados: List[Tuple[int, Lote]] = []
+            eventos: List[Tuple[int, int]] = []  # (id local, posição do evento)
+            totais: Dict[int, int] = {}          # id local → eventos na cópia
+            copias: Dict[int, Lote] = {}
+            for lid in sorted(ids):
+                l = self.lotes.obter(lid)
+                if l is None:
+                    continue
+                # cópia: o menu continua alterando o lote enquanto o envio roda
+                c = copias[lid] = dict(l, eventos=list(l["eventos"]))
+                e = est.get(lid)
+                if e is None:
+                    novos.append(c)
+                    continue
+                if e[2] != assinatura(c):
+                    alterados.append((e[0], c))
+                posicoes = [*e[3], *range(e[1], len(c["eventos"]))]
+                if posicoes:
+                    eventos += [(lid, i) for i in posicoes]
+                    totais[lid] = len(c["eventos"])
+        try:
+            # uma chamada por bloco (= um commit no Oracle): se a conexão cair no
+            # meio, o que já entrou fica no estado e só o resto vai de novo
+            res = {"lotes": 0, "eventos": 0, "alterados": 0, "erros": 0}
+            for ini in range(0, len(novos), BATCH_SIZE):
+                bloco = novos[ini:ini + BATCH_SIZE]
+                rids, erros = inserir_lotes_em_massa(conn, bloco)
+                for i, msg in erros:
+                    log(f"ERRO sync: lote {bloco[i]['id']} → {msg}")
+                    self._rejeitados.add(bloco[i]["id"])
+                for c, rid in zip(bloco, rids):
+                    if rid is not None:
+                        self.estado.definir(c["id"], rid, 0, assinatura(c))
+                        self.estado.conhecer(lotes=[rid])
+                        eventos += [(c["id"], i) for i in range(len(c["eventos"]))]
+                        totais[c["id"]] = len(c["eventos"])
+                res["lotes"] += len(bloco) - len(erros)
+                res["erros"] += len(erros)
+            for ini in range(0, len(alterados), BATCH_SIZE):
+                bloco = alterados[ini:ini + BATCH_SIZE]
+                erros = atualizar_lotes_em_massa(conn, bloco)
+                falhas = {i for i, _ in erros}
+                for i, (rid, c) in enumerate(bloco):
+                    if i in falhas:
+                        self._rejeitados.add(c["id"])
+                    else:
+                        self.estado.definir(c["id"], rid, est[c["id"]][1], assinatura(c))
+                res["alterados"] += len(bloco) - len(erros)
+                res["erros"] += len(erros)
+            # os eventos de um lote não se dividem entre blocos: o estado guarda
+            # por lote quantos foram enviados (um lote com mais de BATCH_SIZE
+            # eventos vai num bloco só)
+            blocos: List[List[Tuple[int, int]]] = []
+            for lid, i in eventos:
+                if not blocos or (len(blocos[-1]) >= BATCH_SIZE and blocos[-1][-1][0] != lid):
+                    blocos.append([])
+                blocos[-1].append((lid, i))
+            for bloco in blocos:
+                pares = [(est[lid][0], copias[lid]["eventos"][i]) for lid, i in bloco]
+                eids, erros = inserir_eventos_em_massa(conn, pares, len(pares))
+                self.estado.conhecer(eventos=[e for e in eids if e is not None])
+                # o que falhou fica anotado pela posição e vai de novo no próximo
+                # envio do lote (os seguintes já entraram e não são repetidos)
+                falhos: Dict[int, List[int]] = {}
+                for i, msg in erros:
+                    lid, pos = bloco[i]
+                    log(f"ERRO sync: evento {pos} do lote {lid} → {msg}")
+                    falhos.setdefault(lid, []).append(pos)
+                for lid in dict.fromkeys(lid for lid, _ in bloco):
+                    self.estado.eventos_enviados(lid, totais[lid], falhos.get(lid, ()))
+                res["eventos"] += len(bloco) - len(erros)
+                res["erros"] += len(erros)
+        except Exception:
+            self._sujos |= ids  # tenta de novo na próxima rodada (ex.: conexão caiu)
+            raise
+        finally:
+            self.estado.gravar()
+        if any(res.values()):
+            contar("sync_lotes_enviados_total", res["lotes"] + res["alterados"])
+            contar("sync_eventos_enviados_total", res["eventos"])
+            log(f"sync: enviados {res['lotes']} lote(s) novos, {res['alterados']} alterado(s), "
+                f"{res['eventos']} evento(s); {res['erros']} erro(s)")
+        return res
+
+    # ----- recebimento -----
+    @instrumentar("sync_buscar")
+    def buscar(self, conn) -> Tuple[List[Tuple[int, int, Dict[str, Any]]], List[Tuple[Lote, List[int]]]]:
+        """Consulta (sem LOCK) o que entrou no Oracle desde a marca, menos a
+        janela. Os eventos vêm antes dos lotes: um evento novo sempre tem o
+        lote já gravado."""
+        from .persistencia_oracle import eventos_desde_db, lotes_desde_db
+        desde_lote, desde_evento = self.estado.desde(self.janela)
+        eventos = eventos_desde_db(conn, desde_evento)
+        lotes = lotes_desde_db(conn, desde_lote)
+        return eventos, lotes
+
+    def aplicar(self, eventos: List[Tuple[int, int, Dict[str, Any]]],
+                lotes: List[Tuple[Lote, List[int]]]) -> Tuple[List[str], int, int]:
+        """Aplica o que buscar() trouxe em LOTES (chame segurando LOCK). Devolve
+        as linhas de journal correspondentes e quantos lotes/eventos entraram.
+        O estado não é gravado aqui: grave as linhas no journal e depois chame
+        estado.gravar(), para que o estado nunca fique à frente do journal."""
+        est = self.estado
+        conh_l, conh_e = est.conhecidos
+        linhas: List[str] = []
+        novos_l = novos_e = 0
+        for remoto, eids in lotes:
+            rid = remoto["id"]
+            if rid in conh_l or rid in est.remotos:
+                continue
+            lote = dict(remoto, id=self.lotes.proximo_id())
+            try:
+                validar_lote_dict(lote)
+            except ValueError as e:
+                log(f"ERRO sync: lote {rid} do Oracle ignorado ({e})")
+                est.conhecer(lotes=[rid])
+                continue
+            self.lotes.append(lote)
+            est.definir(lote["id"], rid, len(lote["eventos"]), assinatura(lote))
+            est.conhecer(eventos=eids)
+            linhas.append(serializar_registro({"op": "lote", "lote": lote}))
+            novos_l += 1
+        for eid, rid, ev in eventos:
+            if eid in conh_e:
+                continue  # já temos (a janela traz de novo os mais recentes)
+            est.conhecer(eventos=[eid])
+            lid = est.remotos.get(rid)
+            lote = self.lotes.obter(lid) if lid is not None else None
+            if lote is None:
+                continue  # de um lote que não acompanhamos
+            try:
+                validar_evento_dict(ev)
+            except ValueError as e:
+                log(f"ERRO sync: evento {eid} do Oracle ignorado ({e})")
+                continue
+            # entra depois dos eventos já sincronizados e antes dos locais ainda
+            # não enviados; o journal guarda a posição para reaplicar igual
+            n = est.lotes[lid][1]
+            self.lotes.anexar_evento(lote, ev, posicao=n)
+            if ev["tipo"] == "INSPECAO" and lote["status"] != "PRONTO":
+                self.lotes.atualizar_status(lote, "PRONTO")
+            # os que falharam no envio continuam na fila (deslocados, se vierem depois)
+            est.eventos_enviados(lid, n + 1, [p + (p >= n) for p in est.lotes[lid][3]])
+            linhas.append(serializar_registro({"op": "evento", "id": lid, "evento": ev,
+                                               "status": lote["status"], "pos": n}))
+            novos_e += 1
+        est.avancar_marca(max((l["id"] for l, _ in lotes), default=0),
+                          max((e[0] for e in eventos), default=0), self.janela)
+        if novos_l or novos_e:
+            contar("sync_lotes_recebidos_total", novos_l)
+            contar("sync_eventos_recebidos_total", novos_e)
+            log(f"sync: recebidos {novos_l} lote(s) e {novos_e} evento(s) do Oracle")
+        return linhas, novos_l, novos_e
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import lzma
+import os
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Set
+
+from .utils import log
+
+# ---------- Snapshots endereçados por conteúdo ----------
+# Cada versão salva do dados.json vira um manifesto com a lista de blocos que a
+# compõem. Os blocos (grupos de SNAPSHOT_LOTES_POR_BLOCO lotes) são comprimidos e
+# gravados uma única vez com o nome igual ao seu SHA-256; como os lotes só
+# crescem no fim e são alterados no lugar, um save novo só grava os blocos que
+# mudaram. Layout, ao lado do arquivo de dados:
+#
+#   dados.json.snapshots/
+#     indice.json              {"snapshots": [{id, ts, sha256, tamanho, blocos}...],
+#                               "refs": {sha do bloco: nº de snapshots que o usam}}
+#     manifestos/<id>.json     blocos de cada snapshot, em ordem
+#     objetos/ab/abcd....gz    conteúdo comprimido de cada bloco
+#
+# Configuração pelo .env (lida a cada snapshot, depois do load_dotenv):
+#   SNAPSHOT_LOTES_POR_BLOCO=1000
+#   SNAPSHOT_COMPRESSAO=gzip     gzip | lzma
+#   SNAPSHOT_RETER_ULTIMOS=5     retenção: os N mais recentes + o mais recente
+#   SNAPSHOT_RETER_HORAS=24      de cada hora/dia na janela
+#   SNAPSHOT_RETER_DIAS=30
+
+def _lotes_por_bloco() -> int:
+    return int(os.getenv("SNAPSHOT_LOTES_POR_BLOCO", "1000"))
+
+def _compressao() -> str:
+    return os.getenv("SNAPSHOT_COMPRESSAO", "gzip").strip().lower()
+
+_EXT = {"gzip": ".gz", "lzma": ".xz"}
+_INICIO_LOTE = b"\n  {"  # início de cada lote no JSON com indent=2
+
+
+def _dir(path: str) -> str:
+    return path + ".snapshots"
+
+def _comprimir(dados: bytes, compressao: str) -> bytes:
+    return lzma.compress(dados) if compressao == "lzma" else gzip.compress(dados, compresslevel=6)
+
+def _descomprimir(nome: str, dados: bytes) -> bytes:
+    return lzma.decompress(dados) if nome.endswith(".xz") else gzip.decompress(dados)
+
+def _ler_indice(path: str) -> Dict[str, Any]:
+    """Índice com as contagens de referência dos blocos; "refs" é None no
+    formato antigo (só a lista), até o próximo snapshot montá-las."""
+    try:
+        with open(os.path.join(_dir(path), "indice.json"), "r", encoding="utf-8") as f:
+            indice = json.load(f)
+    except FileNotFoundError:
+        return {"snapshots": [], "refs": {}}
+    if isinstance(indice, list):
+        return {"snapshots": indice, "refs": None}
+    return indice
+
+def _contar_refs(path: str, snapshots: List[Dict[str, Any]]) -> Dict[str, int]:
+    refs: Dict[str, int] = {}
+    for e in snapshots:
+        for sha in _ler_manifesto(path, e["id"]):
+            refs[sha] = refs.get(sha, 0) + 1
+    return refs
+
+def _gravar_json(destino: str, obj: Any) -> None:
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    tmp = destino + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp, destino)
+
+def _dividir(conteudo: bytes, lotes_por_bloco: int) -> List[bytes]:
+    """Corta o JSON a cada ``lotes_por_bloco`` inícios de lote."""
+    cortes, pos, n = [0], 0, 0
+    while True:
+        pos = conteudo.find(_INICIO_LOTE, pos + 1)
+        if pos < 0:
+            break
+        n += 1
+        if n > 1 and (n - 1) % lotes_por_bloco == 0:
+            cortes.append(pos)
+    cortes.append(len(conteudo))
+    return [conteudo[a:b] for a, b in zip(cortes, cortes[1:])]
+
+def _objeto(path: str, sha: str) -> Optional[str]:
+    base = os.path.join(_dir(path), "objetos", sha[:2], sha)
+    for ext in _EXT.values():
+        if os.path.exists(base + ext):
+            return base + ext
+    return None
+
+
+def listar_snapshots(path: str) -> List[Dict[str, Any]]:
+    """Snapshots disponíveis, do mais antigo para o mais recente."""
+    return _ler_indice(path)["snapshots"]
+
+def salvar_snapshot(path: str, conteudo: bytes, sha256: Optional[str] = None,
+                    agora: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """Registra ``conteudo`` (bytes do dados.json) como um snapshot.
+    Não faz nada se for idêntico ao último; devolve a entrada do índice."""
+    sha256 = sha256 or hashlib.sha256(conteudo).hexdigest()
+    indice = _ler_indice(path)
+    snapshots = indice["snapshots"]
+    if snapshots and snapshots[-1]["sha256"] == sha256:
+        return None
+    refs = indice["refs"] if indice["refs"] is not None else _contar_refs(path, snapshots)
+
+    blocos, novos = [], 0
+    compressao = _compressao()
+    for bloco in _dividir(conteudo, _lotes_por_bloco()):
+        sha = hashlib.sha256(bloco).hexdigest()
+        blocos.append(sha)
+        if _objeto(path, sha) is None:
+            destino = os.path.join(_dir(path), "objetos", sha[:2], sha + _EXT.get(compressao, ".gz"))
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            with open(destino + ".tmp", "wb") as f:
+                f.write(_comprimir(bloco, compressao))
+            os.replace(destino + ".tmp", destino)
+            novos += 1
+
+    agora = agora or datetime.now()
+    entrada = {"id": f"{agora:%Y%m%d-%H%M%S-%f}", "ts": agora.isoformat(),
+               "sha256": sha256, "tamanho": len(conteudo), "blocos": len(blocos)}
+    _gravar_json(os.path.join(_dir(path), "manifestos", entrada["id"] + ".json"), blocos)
+    snapshots.append(entrada)
+    for sha in blocos:
+        refs[sha] = refs.get(sha, 0) + 1
+    _aplicar_retencao(path, snapshots, refs, agora)
+    log(f"snapshot: {entrada['id']} ({novos}/{len(blocos)} blocos novos)")
+    return entrada
+
+def _aplicar_retencao(path: str, indice: List[Dict[str, Any]], refs: Dict[str, int],
+                      agora: datetime) -> None:
+    """Grava o índice só com os snapshots retidos e apaga os blocos cuja
+    contagem de referências chegou a zero. O índice vai antes das remoções:
+    uma queda no meio deixa no máximo blocos órfãos, nunca um snapshot
+    retido sem bloco."""
+    ultimos = int(os.getenv("SNAPSHOT_RETER_ULTIMOS", "5"))
+    horas = int(os.getenv("SNAPSHOT_RETER_HORAS", "24"))
+    dias = int(os.getenv("SNAPSHOT_RETER_DIAS", "30"))
+    manter: Set[str] = {e["id"] for e in indice[-ultimos:]} if ultimos > 0 else set()
+    vistos_hora, vistos_dia = set(), set()
+    for e in reversed(indice):  # o mais recente de cada hora/dia
+        ts = datetime.fromisoformat(e["ts"])
+        if ts >= agora - timedelta(hours=horas) and ts.strftime("%Y%m%d%H") not in vistos_hora:
+            vistos_hora.add(ts.strftime("%Y%m%d%H")); manter.add(e["id"])
+        if ts >= agora - timedelta(days=dias) and ts.strftime("%Y%m%d") not in vistos_dia:
+            vistos_dia.add(ts.strftime("%Y%m%d")); manter.add(e["id"])
+
+    removidos = [e for e in indice if e["id"] not in manter]
+    indice[:] = [e for e in indice if e["id"] in manter]
+    mortos: List[str] = []
+    for e in removidos:
+        try:
+            blocos = _ler_manifesto(path, e["id"])
+        except FileNotFoundError:
+            continue
+        for sha in blocos:
+            n = refs.pop(sha, 0) - 1
+            if n > 0:
+                refs[sha] = n
+            else:
+                mortos.append(sha)
+    _gravar_json(os.path.join(_dir(path), "indice.json"), {"snapshots": indice, "refs": refs})
+    if not removidos:
+        return
+
+    for e in removidos:
+        try:
+            os.remove(os.path.join(_dir(path), "manifestos", e["id"] + ".json"))
+        except FileNotFoundError:
+            pass
+    for sha in mortos:
+        arq = _objeto(path, sha)
+        if arq is not None:
+            os.remove(arq)
+    log(f"snapshot: retenção removeu {len(removidos)} snapshot(s) e {len(mortos)} bloco(s)")
+
+def _ler_manifesto(path: str, snap_id: str) -> List[str]:
+    with open(os.path.join(_dir(path), "manifestos", snap_id + ".json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def encontrar_snapshot(path: str, ident: str) -> Dict[str, Any]:
+    """Localiza pelo id (ou prefixo), pelo prefixo do sha256 ou por "-N" (N-ésimo mais recente)."""
+    indice = _ler_indice(path)["snapshots"]
+    if ident.startswith("-") and ident[1:].isdigit() and 0 < int(ident[1:]) <= len(indice):
+        return indice[-int(ident[1:])]
+    achados = [e for e in indice if e["id"].startswith(ident) or e["sha256"].startswith(ident)]
+    if len(achados) != 1:
+        raise ValueError(f"Snapshot '{ident}' não encontrado ou ambíguo.")
+    return achados[0]
+
+def ler_snapshot(path: str, ident: str) -> bytes:
+    """Remonta os bytes do snapshot e confere o SHA-256 total."""
+    e = encontrar_snapshot(path, ident)
+    partes = []
+    for sha in _ler_manifesto(path, e["id"]):
+        arq = _objeto(path, sha)
+        if arq is None:
+            raise ValueError(f"Snapshot {e['id']}: bloco {sha[:12]} ausente.")
+        with open(arq, "rb") as f:
+            partes.append(_descomprimir(arq, f.read()))
+    conteudo = b"".join(partes)
+    if hashlib.sha256(conteudo).hexdigest() != e["sha256"]:
+        raise ValueError(f"Snapshot {e['id']} corrompido.")
+    return conteudo
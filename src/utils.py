@@ -1,7 +1,16 @@
 from __future__ import annotations
+import atexit
+import json
+import logging
+import multiprocessing
 import os
+import queue
+import time
+from contextlib import contextmanager
 from datetime import datetime, date
-from typing import Optional
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from typing import Optional, Any, Dict, Iterator
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 DATA_DIR = os.path.join(BASE_DIR, "data")
@@ -13,17 +22,41 @@ DATA_PATH = os.path.join(DATA_DIR, "dados.json")
 LOG_PATH = os.path.join(LOG_DIR, "app.log")
 
 # Datas BR <-> ISO
+# Internamente as datas circulam como ISO (YYYY-MM-DD) ou ordinal (int).
+# Há poucas datas distintas e elas se repetem muito, então cada conversão é
+# memoizada; o caminho rápido usa date.fromisoformat e o strptime só entra
+# para formatos não canônicos (ex.: 2025-1-5), que continuam aceitos.
+@lru_cache(maxsize=8192)
+def iso_to_ordinal(date_iso: str) -> int:
+    if len(date_iso) == 10 and date_iso[4] == "-" and date_iso[7] == "-":
+        try:
+            return date.fromisoformat(date_iso).toordinal()
+        except ValueError:
+            pass
+    return datetime.strptime(date_iso, "%Y-%m-%d").toordinal()
+
+@lru_cache(maxsize=8192)
+def ordinal_to_iso(n: int) -> str:
+    return date.fromordinal(n).isoformat()
+
+@lru_cache(maxsize=8192)
 def br_to_iso(date_br: str) -> str:
     try:
+        if (len(date_br) == 10 and date_br[2] == "/" and date_br[5] == "/"
+                and date_br.replace("/", "").isdigit()):
+            return date(int(date_br[6:]), int(date_br[3:5]), int(date_br[:2])).isoformat()
         return datetime.strptime(date_br, "%d/%m/%Y").strftime("%Y-%m-%d")
     except ValueError:
         raise ValueError("Data inválida. Use DD/MM/YYYY.")
 
+@lru_cache(maxsize=8192)
 def iso_to_br(date_iso: str) -> str:
-    return datetime.strptime(date_iso, "%Y-%m-%d").strftime("%d/%m/%Y")
+    d = iso_to_date(date_iso)
+    return f"{d.day:02d}/{d.month:02d}/{d.year:04d}"
 
+@lru_cache(maxsize=8192)
 def iso_to_date(date_iso: str) -> date:
-    return datetime.strptime(date_iso, "%Y-%m-%d").date()
+    return date.fromordinal(iso_to_ordinal(date_iso))
 
 # Booleans para Oracle
 def b2sn(b: bool) -> str:
@@ -35,7 +68,127 @@ def sn2b(s: Optional[str]) -> bool:
     return s.strip().upper() == "S"
 
 # Log
-def log(msg: str) -> None:
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(LOG_PATH, "a", encoding="utf-8") as f:
-        f.write(f"[{ts}] {msg}\n")
+# log() só cria o registro e o coloca numa fila; uma thread (QueueListener)
+# formata e grava em logs/app.log com rotação. Só o processo principal abre o
+# arquivo: os processos dos pools mandam os registros por uma fila de
+# multiprocessing (fila_log_processos/iniciar_log_processo), gravada pela
+# mesma thread de rotação. Configuração pelo .env (lida no primeiro log):
+#   LOG_ARQUIVO=logs/app.log | LOG_NIVEL=INFO | LOG_JSON=1 (uma linha JSON por registro)
+#   LOG_ROTACAO=tamanho|diaria, LOG_MAX_KB=1024, LOG_BACKUPS=5
+_LOGGER = logging.getLogger("rastreabilidade")
+_LISTENER: Optional[QueueListener] = None
+_FILA_PROCESSOS: Any = None                    # multiprocessing.Queue dos pools
+_LISTENER_PROCESSOS: Optional[QueueListener] = None
+_PROCESSO_DO_POOL = False
+
+class _FilaHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record  # mesmo processo: formata só na thread de gravação
+
+class _FormatoTexto(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        ts = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S")
+        nivel = "" if record.levelno in (logging.INFO, logging.ERROR) else f"{record.levelname} "  # ERROR já vem como "ERRO ..."
+        extra = "".join(f" | {k}={v}" for k, v in getattr(record, "campos", {}).items())
+        return f"[{ts}] {nivel}{record.getMessage()}{extra}"
+
+class _FormatoJSON(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        d = {"ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+             "nivel": record.levelname, "msg": record.getMessage(),
+             "thread": record.threadName}
+        d.update(getattr(record, "campos", {}))
+        return json.dumps(d, ensure_ascii=False)
+
+def configurar_log(path: Optional[str] = None) -> None:
+    """(Re)inicia o log assíncrono; chamado sozinho no primeiro log()."""
+    global _LISTENER, LOG_PATH, _PROCESSO_DO_POOL
+    encerrar_log()
+    if multiprocessing.parent_process() is not None:
+        # processo filho sem iniciar_log_processo: nada de disputar a rotação
+        # do arquivo com o principal (sem handlers, ERRO vai para o stderr)
+        _PROCESSO_DO_POOL = True
+        _LOGGER.handlers[:] = []
+        _LOGGER.propagate = False
+        return
+    LOG_PATH = path or os.getenv("LOG_ARQUIVO", "").strip() or LOG_PATH
+    if os.getenv("LOG_ROTACAO", "tamanho").strip().lower() == "diaria":
+        arq: logging.Handler = TimedRotatingFileHandler(
+            LOG_PATH, when="midnight", backupCount=int(os.getenv("LOG_BACKUPS", "5")), encoding="utf-8")
+    else:
+        arq = RotatingFileHandler(
+            LOG_PATH, maxBytes=int(os.getenv("LOG_MAX_KB", "1024")) * 1024,
+            backupCount=int(os.getenv("LOG_BACKUPS", "5")), encoding="utf-8")
+    json_on = os.getenv("LOG_JSON", "0").strip().lower() in ("1", "true", "yes")
+    arq.setFormatter(_FormatoJSON() if json_on else _FormatoTexto())
+
+    fila: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _LOGGER.handlers[:] = [_FilaHandler(fila)]
+    _LOGGER.setLevel(os.getenv("LOG_NIVEL", "INFO").strip().upper())
+    _LOGGER.propagate = False
+    _LISTENER = QueueListener(fila, arq)
+    _LISTENER.start()
+    if _FILA_PROCESSOS is not None:
+        _iniciar_listener_processos()
+
+def _iniciar_listener_processos() -> None:
+    global _LISTENER_PROCESSOS
+    _LISTENER_PROCESSOS = QueueListener(_FILA_PROCESSOS, *_LISTENER.handlers)
+    _LISTENER_PROCESSOS.start()
+
+def fila_log_processos(ctx: Any) -> Any:
+    """Fila (do contexto de multiprocessing ``ctx``) pela qual os processos de
+    um pool mandam seus registros ao arquivo do processo principal: passe-a
+    em ``initargs`` com ``initializer=iniciar_log_processo``."""
+    global _FILA_PROCESSOS
+    if _LISTENER is None:
+        configurar_log()
+    if _FILA_PROCESSOS is None:
+        _FILA_PROCESSOS = ctx.Queue()
+        _iniciar_listener_processos()
+        # de novo, agora depois do atexit do multiprocessing: para a leitura
+        # antes que ele feche a fila
+        atexit.register(encerrar_log)
+    return _FILA_PROCESSOS
+
+def iniciar_log_processo(fila: Any) -> None:
+    """``initializer`` dos pools: neste processo, log() vai para ``fila``."""
+    global _PROCESSO_DO_POOL
+    _PROCESSO_DO_POOL = True
+    _LOGGER.handlers[:] = [QueueHandler(fila)]
+    _LOGGER.setLevel(os.getenv("LOG_NIVEL", "INFO").strip().upper())
+    _LOGGER.propagate = False
+
+def encerrar_log() -> None:
+    """Esvazia as filas e fecha o arquivo (registrado no atexit)."""
+    global _LISTENER, _LISTENER_PROCESSOS
+    if _LISTENER_PROCESSOS is not None:
+        _LISTENER_PROCESSOS.stop()
+        _LISTENER_PROCESSOS = None
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        for h in _LISTENER.handlers:
+            h.close()
+        _LISTENER = None
+
+atexit.register(encerrar_log)
+
+def log(msg: str, nivel: Optional[str] = None, **campos: Any) -> None:
+    """Registra uma linha no log. Mensagens "ERRO ..." saem como ERROR;
+    ``campos`` (ex.: duracao_ms=12.3) viram pares extras na linha/JSON."""
+    if _LISTENER is None and not _PROCESSO_DO_POOL:
+        configurar_log()
+    lvl = logging.getLevelName(nivel.upper()) if nivel else (
+        logging.ERROR if msg.startswith("ERRO") else logging.INFO)
+    if _LOGGER.isEnabledFor(lvl):
+        _LOGGER.log(lvl, msg, extra={"campos": campos} if campos else None)
+
+@contextmanager
+def cronometrar(msg: str, nivel: Optional[str] = None, **campos: Any) -> Iterator[Dict[str, Any]]:
+    """Loga ``msg`` com duracao_ms ao fim do bloco; o dict devolvido aceita campos extras."""
+    extra: Dict[str, Any] = dict(campos)
+    t0 = time.perf_counter()
+    try:
+        yield extra
+    finally:
+        log(msg, nivel, duracao_ms=round((time.perf_counter() - t0) * 1000, 3), **extra)
@@ -0,0 +1 @@
+"""Testes da Rastreabilidade Sustentável (python -m unittest discover tests)."""
@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from src.utils import configurar_log
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _log_temporario(tmp_path_factory):
+    """O log dos testes vai para um diretório temporário, não para logs/app.log."""
+    os.environ["LOG_ARQUIVO"] = str(tmp_path_factory.mktemp("logs") / "app.log")
+    configurar_log()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src import persistencia_json as pj
+
+
+def _lote(i: int, produtor: str = "Sítio") -> dict:
+    return {"id": i, "produto": "Café", "produtor": produtor, "origem_uf": "MG", "data_colheita": "2025-03-01",
+            "peso_kg": 50.0, "carbono_neutro": False, "agua_reuso": True, "status": "EM_PROCESSAMENTO",
+            "eventos": []}
+
+
+class CacheBootTest(unittest.TestCase):
+    """O cache de boot vale pelo SHA-256 do conteúdo, não por tamanho/mtime/inode."""
+
+    def setUp(self) -> None:
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        self.path = os.path.join(pasta, "dados.json")
+        p = mock.patch.dict(os.environ, {"CACHE_BOOT": "1", "ARMAZENAMENTO_PARTICOES": ""})
+        p.start()
+        self.addCleanup(p.stop)
+        self.parses = 0
+        original = pj.iterar_lotes_json
+
+        def contar(*args, **kw):
+            self.parses += 1
+            return original(*args, **kw)
+
+        p = mock.patch.object(pj, "iterar_lotes_json", contar)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def test_arquivo_inalterado_vem_do_cache(self):
+        pj.salvar_json_seguro([_lote(1), _lote(2)], self.path)
+        self.assertEqual([l["id"] for l in pj.carregar_json_validado(self.path)], [1, 2])
+        self.assertEqual(self.parses, 0)
+
+    def test_reescrita_com_mesmo_tamanho_e_mtime_nao_usa_o_cache(self):
+        pj.salvar_json_seguro([_lote(1, "Sítio A")], self.path)
+        st = os.stat(self.path)
+        with open(self.path, "rb") as f:
+            dados = f.read().replace(b"S\xc3\xadtio A", b"S\xc3\xadtio B")
+        with open(self.path, "r+b") as f:  # mesmo inode
+            f.write(dados)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        lotes = pj.carregar_json_validado(self.path)
+        self.assertEqual(lotes[0]["produtor"], "Sítio B")
+        self.assertEqual(self.parses, 1)
+
+    def test_integridade_do_cache_confere_o_arquivo(self):
+        pj.salvar_json_seguro([_lote(1)], self.path)
+        with mock.patch.object(pj, "log") as log:
+            pj.carregar_json_validado(self.path)
+        self.assertIn("integridade=OK", log.call_args_list[-1].args[0])
+
+        with open(self.path + ".sha256", "w", encoding="utf-8") as f:
+            f.write("0" * 64 + "\n")
+        with mock.patch.object(pj, "log") as log:
+            pj.carregar_json_validado(self.path)
+        self.assertIn("integridade=N/A", log.call_args_list[-1].args[0])
+        self.assertEqual(self.parses, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
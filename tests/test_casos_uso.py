@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import unittest
+
+from src.casos_uso import CHAVES_ORDENACAO, LoteStore
+
+
+def _lote(i: int, peso: float, produto: str) -> dict:
+    return {"id": i, "produto": produto, "produtor": "Sítio", "origem_uf": "MG", "data_colheita": "2025-03-01",
+            "peso_kg": peso, "carbono_neutro": False, "agua_reuso": True, "status": "EM_PROCESSAMENTO",
+            "eventos": []}
+
+
+class ConsultarTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.lotes = LoteStore(_lote(i, float(i % 3), "Café" if i % 2 else "Soja") for i in range(1, 31))
+
+    def _ids(self, filtros: dict, ordenar: str, limite=None, offset: int = 0) -> list:
+        return [l["id"] for l in self.lotes.consultar(filtros, ordenar, limite, offset)[0]]
+
+    def test_empates_na_ordem_decrescente_iguais_com_e_sem_filtro(self):
+        for ordenar in ("-peso_kg", "-produto", "peso_kg", "produto"):
+            campo = ordenar.lstrip("-")
+            esperado = [l["id"] for l in sorted(self.lotes, key=CHAVES_ORDENACAO[campo],
+                                                reverse=ordenar.startswith("-"))]
+            for limite, offset in ((8, 0), (8, 8), (None, 0)):
+                fatia = esperado[offset:None if limite is None else offset + limite]
+                self.assertEqual(self._ids({}, ordenar, limite, offset), fatia, (ordenar, limite, offset))
+                self.assertEqual(self._ids({"peso_min": -1}, ordenar, limite, offset), fatia,
+                                 (ordenar, limite, offset))
+
+    def test_lotes_novos_entram_no_indice_com_a_mesma_regra(self):
+        self._ids({}, "-peso_kg", 5)  # monta o índice
+        self.lotes.append(_lote(31, 2.0, "Café"))
+        self.assertEqual(self._ids({}, "-peso_kg", 12), self._ids({"peso_min": -1}, "-peso_kg", 12))
+
+
+if __name__ == "__main__":
+    unittest.main()
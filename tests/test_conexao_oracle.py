@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from benchmarks import oracle_falso
+from src import conexao_oracle as co
+from src import persistencia_oracle as po
+from src.casos_uso import LOCK, LoteStore
+from src.conexao_oracle import ConexaoOracle
+from src.persistencia_json import salvar_json_seguro
+from src.persistencia_worker import TrabalhadorPersistencia
+
+
+class ConexaoOracleTest(unittest.TestCase):
+    """ConexaoOracle com o driver falso: connects lentos, falhando e quedas."""
+
+    def setUp(self) -> None:
+        oracle_falso.reiniciar()
+        for alvo, valor in [("oracledb", oracle_falso), ("AUTO_INIT", False), ("USE_POOL", False),
+                            ("CONNECT_TIMEOUT", 5.0)]:
+            p = mock.patch.object(po, alvo, valor)
+            p.start()
+            self.addCleanup(p.stop)
+        self.env = {"ORACLE_FALSO_ATRASO_S": "0", "ORACLE_FALSO_FALHAS": "0", "ORACLE_FALSO_DB": ":memory:"}
+        p = mock.patch.dict(os.environ, self.env)
+        p.start()
+        self.addCleanup(p.stop)
+        self.logs = []
+        p = mock.patch.object(co, "log", self.logs.append)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _iniciar(self, **kw) -> ConexaoOracle:
+        oracle = ConexaoOracle(**dict({"prazo": 5.0, "reconexao": 0.01, "reconexao_max": 0.04}, **kw))
+        oracle.iniciar()
+        self.addCleanup(oracle.parar)
+        return oracle
+
+    def test_prazo_expira_com_o_connect_ainda_lento(self):
+        os.environ["ORACLE_FALSO_ATRASO_S"] = "0.5"
+        oracle = self._iniciar(prazo=0.05)
+        t0 = time.monotonic()
+        self.assertIsNone(oracle.atual())
+        self.assertIsNone(oracle.aguardar())
+        self.assertLess(time.monotonic() - t0, 0.3)
+        self.assertEqual(oracle.estado(), "conectando...")
+        self.assertIsNotNone(oracle.aguardar(5.0))  # a mesma tentativa termina depois
+        self.assertEqual(oracle_falso.tentativas, 1)
+
+    def test_connect_acima_do_timeout_conta_como_falha(self):
+        os.environ["ORACLE_FALSO_ATRASO_S"] = "10"
+        with mock.patch.object(po, "CONNECT_TIMEOUT", 0.05):
+            oracle = self._iniciar()
+            self.assertIsNone(oracle.aguardar(0.3))
+        self.assertGreaterEqual(oracle.tentativas, 1)
+        self.assertIn("timeout", oracle.erro)
+
+    def test_tenta_de_novo_com_espera_dobrando_ate_o_teto(self):
+        os.environ["ORACLE_FALSO_FALHAS"] = "4"
+        oracle = self._iniciar()
+        self.assertIsNotNone(oracle.aguardar(5.0))
+        esperas = [float(m) for l in self.logs for m in re.findall(r"nova tentativa em ([\d.]+)s", l)]
+        self.assertEqual(esperas, [0.01, 0.02, 0.04, 0.04])
+        self.assertEqual(oracle_falso.tentativas, 5)
+        self.assertEqual((oracle.tentativas, oracle.erro, oracle.estado()), (0, None, "conectado"))
+
+    def test_reconecta_depois_de_falhou(self):
+        oracle = self._iniciar()
+        vistas = []
+        oracle.ao_conectar(vistas.append)
+        antiga = oracle.aguardar()
+        self.assertEqual(vistas, [antiga])
+
+        self.assertFalse(oracle.falhou(antiga, ValueError("ORA-00001: unique constraint")))
+        self.assertIs(oracle.atual(), antiga)  # erro da operação: a conexão continua
+
+        self.assertTrue(oracle.falhou(antiga, ConnectionError("DPI-1080: connection was closed")))
+        nova = oracle.aguardar(5.0)
+        self.assertIsNotNone(nova)
+        self.assertIsNot(nova, antiga)
+        self.assertEqual(vistas, [antiga, None, nova])
+        self.assertEqual(oracle_falso.tentativas, 2)
+
+    def test_erro_de_configuracao_desiste_sem_prender_quem_espera(self):
+        def sem_driver():
+            raise RuntimeError("Pacote 'oracledb' não está instalado.")
+        oracle = self._iniciar(conectar=sem_driver)
+        oracle._thread.join(1.0)
+        t0 = time.monotonic()
+        self.assertIsNone(oracle.aguardar())
+        self.assertLess(time.monotonic() - t0, 0.1)
+        self.assertTrue(oracle.desistiu)
+        self.assertEqual(oracle.estado(), "indisponível")
+
+    def test_gravacao_nao_espera_a_conexao(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        path = os.path.join(pasta, "dados.json")
+        salvar_json_seguro([], path)
+        os.environ["ORACLE_FALSO_ATRASO_S"] = "0.5"
+        oracle = self._iniciar()
+        lotes = LoteStore()
+        worker = TrabalhadorPersistencia(lotes, path, conn=oracle.atual(), modo="sync", janela=0.0)
+        oracle.ao_conectar(worker.conectado)
+        worker.start()
+        self.addCleanup(worker.parar)
+
+        t0 = time.monotonic()
+        with LOCK:
+            lote = {"id": 1, "produto": "Café", "produtor": "Sítio", "origem_uf": "MG",
+                    "data_colheita": "2025-03-01", "peso_kg": 5.0, "carbono_neutro": False,
+                    "agua_reuso": False, "status": "EM_PROCESSAMENTO", "eventos": []}
+            lotes.append(lote)
+            feito = worker.enviar({"op": "lote", "lote": lote})
+        worker.confirmar(feito)  # só o journal; o Oracle fica para quando conectar
+        self.assertLess(time.monotonic() - t0, 0.3)
+        self.assertEqual(worker.sync.pendentes, 1)
+
+        self.assertIsNotNone(oracle.aguardar(5.0))
+        self.assertIs(worker.conn, oracle.atual())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src import casos_uso
+from src.casos_uso import LoteStore
+from src.persistencia_json import carregar_json_validado, compactar_journal, registrar_journal, salvar_json_seguro
+
+
+def _evento(tipo: str, data: str) -> dict:
+    return {"tipo": tipo, "data": data, "local": "Santos", "responsavel": "Rui", "observacoes": ""}
+
+
+def _lote(i: int) -> dict:
+    return {"id": i, "produto": "Café", "produtor": "Sítio", "origem_uf": "MG", "data_colheita": "2025-03-01",
+            "peso_kg": 50.0, "carbono_neutro": False, "agua_reuso": True, "status": "EM_PROCESSAMENTO",
+            "eventos": []}
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        self.path = os.path.join(pasta, "dados.json")
+        salvar_json_seguro([_lote(1)], self.path)
+
+    def test_evento_invalido_no_journal_fica_fora_e_a_compactacao_continua(self):
+        sem_local = _evento("COLHEITA", "2025-03-02")
+        del sem_local["local"]
+        registrar_journal({"op": "evento", "id": 1, "evento": sem_local}, self.path)
+        registrar_journal({"op": "evento", "id": 1, "evento": _evento("PLANTIO", "2025-03-03")}, self.path)
+        registrar_journal({"op": "evento", "id": 1, "evento": _evento("TRANSPORTE", "2025-03-04")}, self.path)
+
+        lotes = carregar_json_validado(self.path)
+        self.assertEqual([ev["tipo"] for ev in lotes[0]["eventos"]], ["TRANSPORTE"])
+        compactar_journal(lotes, self.path)
+        self.assertEqual(carregar_json_validado(self.path), lotes)
+
+    def test_registrar_evento_rejeita_tipo_invalido_antes_de_alterar_o_lote(self):
+        lotes = LoteStore([_lote(1)])
+        with mock.patch.object(casos_uso, "LOTES", lotes):
+            with self.assertRaises(ValueError):
+                casos_uso.registrar_evento(1, _evento("PLANTIO", "2025-03-02"))
+            self.assertTrue(casos_uso.registrar_evento(1, _evento("inspecao", "2025-03-02")))
+        self.assertEqual([ev["tipo"] for ev in lotes[0]["eventos"]], ["INSPECAO"])
+
+
+if __name__ == "__main__":
+    unittest.main()
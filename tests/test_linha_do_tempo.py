@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import unittest
+
+from src.casos_uso import LoteStore
+
+
+def _evento(tipo: str, data: str, local: str) -> dict:
+    return {"tipo": tipo, "data": data, "local": local, "responsavel": "Rui", "observacoes": ""}
+
+
+def _lote(i: int, *eventos: dict) -> dict:
+    return {"id": i, "produto": "Café", "produtor": "Sítio", "origem_uf": "MG", "data_colheita": "2025-03-01",
+            "peso_kg": 50.0, "carbono_neutro": False, "agua_reuso": True, "status": "EM_PROCESSAMENTO",
+            "eventos": list(eventos)}
+
+
+class LinhaDoTempoTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.lotes = LoteStore([
+            _lote(1, _evento("COLHEITA", "2025-03-01", "Santos"), _evento("TRANSPORTE", "2025-03-04", "Santos")),
+            _lote(2, _evento("TRANSPORTE", "2025-03-02", "Santos"), _evento("TRANSPORTE", "2025-03-05", "Campinas")),
+            _lote(3, _evento("TRANSPORTE", "2025-03-03", "Santos")),
+        ])
+
+    def _datas(self, **kw) -> tuple:
+        ocorrencias, total = self.lotes.consultar_eventos(**kw)
+        return [ev["data"] for _, ev in ocorrencias], total
+
+    def test_limite_igual_em_todos_os_caminhos(self):
+        filtros = [{}, {"tipo": "transporte"}, {"local": "santos"}, {"tipo": "TRANSPORTE", "local": "Santos"}]
+        for f in filtros:
+            todas, total = self._datas(**f)
+            for recentes in (False, True):
+                esperado = todas[::-1] if recentes else todas
+                for limite in (0, 1, 2, 10):
+                    self.assertEqual(self._datas(limite=limite, recentes=recentes, **f),
+                                     (esperado[:limite], total), (f, limite, recentes))
+
+    def test_tipo_e_local(self):
+        self.assertEqual(self._datas(tipo="TRANSPORTE", local="Santos"),
+                         (["2025-03-02", "2025-03-03", "2025-03-04"], 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from src import utils
+from src.persistencia_json import pool_processos
+
+
+def _logar(i: int) -> int:
+    utils.log(f"filho {os.getpid()} tarefa {i}")
+    return os.getpid()
+
+
+class LogTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        self.path = os.path.join(pasta, "app.log")
+        self.addCleanup(utils.configurar_log)  # volta ao LOG_ARQUIVO dos testes
+
+    def _linhas(self) -> list:
+        utils.encerrar_log()  # esvazia as filas
+        with open(self.path, encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_caminho_configuravel(self):
+        utils.configurar_log(self.path)
+        utils.log("no arquivo escolhido")
+        self.assertTrue(self._linhas()[-1].endswith("no arquivo escolhido"))
+
+    def test_processos_do_pool_gravam_pelo_principal(self):
+        utils.configurar_log(self.path)
+        with pool_processos(2) as ex:
+            pids = set(ex.map(_logar, range(6)))
+        self.assertNotIn(os.getpid(), pids)
+        linhas = [l for l in self._linhas() if " tarefa " in l]
+        self.assertEqual(sorted(int(l.rsplit(" ", 1)[1]) for l in linhas), list(range(6)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+from benchmarks import oracle_falso
+from benchmarks.sqlite_local import conectar_sqlite, criar_tabelas_sqlite
+from src import persistencia_oracle as po
+
+
+def _lote(i: int, uf: str = "SP", peso: float = 10.0, data: str = "2025-03-01", eventos=()) -> dict:
+    return {"id": i, "produto": "Café", "produtor": "Sítio", "origem_uf": uf, "data_colheita": data,
+            "peso_kg": peso, "carbono_neutro": True, "agua_reuso": False, "status": "EM_PROCESSAMENTO",
+            "eventos": [{"tipo": t, "data": d, "local": "Santos", "responsavel": "Rui", "observacoes": ""}
+                        for t, d in eventos]}
+
+
+class InsercaoEmMassaTest(unittest.TestCase):
+    """Array DML (RETURNING ... INTO e batcherrors) contra o SQLite de benchmarks."""
+
+    def setUp(self) -> None:
+        self.conn = conectar_sqlite()
+        criar_tabelas_sqlite(self.conn)
+        self.addCleanup(self.conn.close)
+        driver = mock.patch.object(po, "oracledb", oracle_falso)
+        driver.start()
+        self.addCleanup(driver.stop)
+
+    def _contar(self, tabela: str) -> int:
+        with self.conn.cursor() as cur:
+            return cur.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+
+    def _status(self, lote_id: int) -> str:
+        with self.conn.cursor() as cur:
+            return cur.execute("SELECT STATUS FROM LOTE WHERE ID = :ID", {"ID": lote_id}).fetchone()[0]
+
+    def test_lotes_com_erros_por_linha(self):
+        lotes = [_lote(1), _lote(2, "MT"), _lote(3, peso=-1), _lote(4, data="ontem"), _lote(5, "PR")]
+        ids, erros = po.inserir_lotes_em_massa(self.conn, lotes, tamanho=2)
+        self.assertEqual([i for i, _ in erros], [3, 2])  # _params_lote falha antes do bloco
+        self.assertIsNone(ids[2])
+        self.assertIsNone(ids[3])
+        self.assertEqual(len({ids[0], ids[1], ids[4]}), 3)
+        self.assertEqual(self._contar("LOTE"), 3)
+        with self.conn.cursor() as cur:
+            ufs = dict(cur.execute("SELECT ID, ORIGEM_UF FROM LOTE").fetchall())
+        self.assertEqual([ufs[ids[i]] for i in (0, 1, 4)], ["SP", "MT", "PR"])
+
+    def test_eventos_inspecao_e_lote_inexistente(self):
+        (a, b), _ = po.inserir_lotes_em_massa(self.conn, [_lote(1), _lote(2)])
+        eventos = [(a, {"tipo": "TRANSPORTE", "data": "2025-03-02"}),
+                   (999, {"tipo": "TRANSPORTE", "data": "2025-03-02"}),
+                   (a, {"tipo": "inspecao", "data": "2025-03-05"}),
+                   (b, {"tipo": "ARMAZENAGEM", "data": "2025-03-04"})]
+        ids, erros = po.inserir_eventos_em_massa(self.conn, eventos)
+        self.assertEqual([i for i, _ in erros], [1])
+        self.assertTrue(all(ids[i] is not None for i in (0, 2, 3)))
+        self.assertEqual(self._contar("EVENTO"), 3)
+        self.assertEqual(self._status(a), "PRONTO")
+        self.assertEqual(self._status(b), "EM_PROCESSAMENTO")
+
+    def test_enviar_json_para_oracle(self):
+        lotes = [_lote(10, eventos=[("TRANSPORTE", "2025-03-02"), ("INSPECAO", "2025-03-03")]),
+                 _lote(11, peso=-5, eventos=[("TRANSPORTE", "2025-03-02")]),
+                 _lote(12, "BA")]
+        r = po.enviar_json_para_oracle(self.conn, lotes)
+        self.assertEqual(sorted(r["mapa_ids"]), [10, 12])
+        self.assertEqual([i for i, _ in r["erros_lotes"]], [11])
+        self.assertEqual(r["erros_eventos"], [])
+        self.assertEqual(self._contar("EVENTO"), 2)  # os eventos do lote recusado não vão
+        self.assertEqual(self._status(r["mapa_ids"][10]), "PRONTO")
+        self.assertEqual([e["tipo"] for e in po.listar_eventos_do_lote(self.conn, r["mapa_ids"][10])],
+                         ["TRANSPORTE", "INSPECAO"])
+
+    def test_resumo_mantido_nas_insercoes(self):
+        with mock.patch.object(po, "USE_RESUMO", True):
+            ids, _ = po.inserir_lotes_em_massa(self.conn, [_lote(1), _lote(2, "MT"), _lote(3)])
+            po.inserir_eventos_em_massa(self.conn, [(ids[0], {"tipo": "TRANSPORTE", "data": "2030-01-01"})])
+        self.assertEqual(po.kpis_db(self.conn, resumo=True), po.kpis_db(self.conn, resumo=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmarks import oracle_falso
+from src import persistencia_oracle as po
+
+
+def _dicionario(consultas: list) -> list:
+    return [sql for sql in consultas if "user_tables" in sql or "user_indexes" in sql]
+
+
+class ConexaoOracleTest(unittest.TestCase):
+    """Pool e cache do schema contra o driver falso (que registra chamadas e SQL)."""
+
+    def setUp(self) -> None:
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        oracle_falso.reiniciar()
+        for alvo, valor in [("oracledb", oracle_falso), ("_POOL", None), ("_SCHEMA_OK", None),
+                            ("SCHEMA_CACHE_PATH", os.path.join(pasta, ".oracle_schema_ok.json")),
+                            ("AUTO_INIT", True)]:
+            p = mock.patch.object(po, alvo, valor)
+            p.start()
+            self.addCleanup(p.stop)
+        p = mock.patch.dict(os.environ, {"ORACLE_FALSO_DB": os.path.join(pasta, "oracle.db"),
+                                         "ORACLE_FALSO_ATRASO_S": "0", "ORACLE_FALSO_FALHAS": "0"})
+        p.start()
+        self.addCleanup(p.stop)
+        self.addCleanup(po.fechar_pool)
+
+    def _boot(self) -> None:
+        """Conecta e devolve a conexão como um processo novo faria (cache só no disco)."""
+        po._SCHEMA_OK = None
+        conn = po.conectar_oracle_from_env()
+        po.liberar_conexao(conn)
+
+    def test_segundo_boot_com_cache_do_schema_nao_consulta_o_dicionario(self):
+        self._boot()
+        self.assertTrue(_dicionario(oracle_falso.consultas))
+        self.assertTrue(os.path.exists(po.SCHEMA_CACHE_PATH))
+
+        oracle_falso.reiniciar()
+        self._boot()
+        self.assertEqual([n for n, _ in oracle_falso.chamadas], ["connect"])
+        self.assertEqual(oracle_falso.consultas, [])
+
+    def test_esquecer_schema_volta_a_conferir(self):
+        self._boot()
+        po.esquecer_schema()
+        oracle_falso.reiniciar()
+        self._boot()
+        self.assertTrue(_dicionario(oracle_falso.consultas))
+
+    def test_pool_recebe_os_limites_e_reaproveita_sessoes(self):
+        config = {"USE_POOL": True, "POOL_MIN": 2, "POOL_MAX": 3, "POOL_TIMEOUT": 1234,
+                  "STMT_CACHE": 77, "CONNECT_TIMEOUT": 2.5}
+        with mock.patch.multiple(po, **config):
+            self._boot()
+            self._boot()
+        nomes = [n for n, _ in oracle_falso.chamadas]
+        self.assertEqual(nomes, ["create_pool", "acquire", "release", "acquire", "release"])
+        params = oracle_falso.chamadas[0][1]
+        self.assertEqual({k: params[k] for k in ("min", "max", "stmtcachesize", "wait_timeout",
+                                                 "tcp_connect_timeout", "getmode")},
+                         {"min": 2, "max": 3, "stmtcachesize": 77, "wait_timeout": 1234,
+                          "tcp_connect_timeout": 2.5, "getmode": oracle_falso.POOL_GETMODE_TIMEDWAIT})
+        self.assertEqual(oracle_falso.tentativas, 1)  # a segunda sessão veio do pool
+
+    def test_conexao_dedicada_recebe_cache_de_statements_e_timeout(self):
+        with mock.patch.multiple(po, STMT_CACHE=33, CONNECT_TIMEOUT=1.5):
+            self._boot()
+        (nome, params), = oracle_falso.chamadas
+        self.assertEqual(nome, "connect")
+        self.assertEqual((params["stmtcachesize"], params["tcp_connect_timeout"]), (33, 1.5))
+
+
+if __name__ == "__main__":
+    unittest.main()
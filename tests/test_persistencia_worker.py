@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src import persistencia_worker as pw
+from src.casos_uso import LOCK, LoteStore
+from src.persistencia_json import carregar_json_validado, salvar_json_seguro
+
+
+def _lote(i: int) -> dict:
+    return {"id": i, "produto": "Café", "produtor": "Sítio", "origem_uf": "MG", "data_colheita": "2025-03-01",
+            "peso_kg": 50.0, "carbono_neutro": False, "agua_reuso": True, "status": "EM_PROCESSAMENTO",
+            "eventos": []}
+
+
+class TrabalhadorSyncTest(unittest.TestCase):
+    """Modo "sync" sem Oracle: confirmar() só volta depois do journal."""
+
+    def setUp(self) -> None:
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        self.path = os.path.join(pasta, "dados.json")
+        salvar_json_seguro([_lote(1)], self.path)
+        self.lotes = LoteStore(carregar_json_validado(self.path))
+        self.worker = pw.TrabalhadorPersistencia(self.lotes, self.path, modo="sync", janela=0.0)
+        self.worker.start()
+        self.addCleanup(self.worker.parar)
+
+    def _cadastrar(self, i: int):
+        with LOCK:
+            lote = _lote(i)
+            self.lotes.append(lote)
+            return self.worker.enviar({"op": "lote", "lote": lote})
+
+    def test_confirmar_volta_depois_do_journal(self):
+        self.worker.confirmar(self._cadastrar(2))
+        self.assertEqual([l["id"] for l in carregar_json_validado(self.path)], [1, 2])
+
+    def test_falha_no_journal_sobe_para_quem_espera(self):
+        with mock.patch.object(pw, "registrar_journal_linhas", side_effect=OSError("disco cheio")):
+            feito = self._cadastrar(2)
+            with self.assertRaisesRegex(OSError, "disco cheio"):
+                self.worker.confirmar(feito)
+        self.worker.confirmar(self._cadastrar(3))  # a falha não fica grudada no trabalhador
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmarks import oracle_falso
+from benchmarks.sqlite_local import conectar_sqlite, criar_tabelas_sqlite
+from src import persistencia_oracle as po
+from src.casos_uso import LOCK, LoteStore
+from src.persistencia_json import (
+    carregar_json_validado, registrar_journal, registrar_journal_linhas, salvar_json_seguro
+)
+from src.sincronizacao import Sincronizador
+
+
+def _evento(tipo: str, data: str) -> dict:
+    return {"tipo": tipo, "data": data, "local": "Santos", "responsavel": "Rui", "observacoes": ""}
+
+
+def _lote(i: int, *eventos: dict) -> dict:
+    return {"id": i, "produto": "Café", "produtor": "Sítio", "origem_uf": "MG", "data_colheita": "2025-03-01",
+            "peso_kg": 50.0, "carbono_neutro": False, "agua_reuso": True, "status": "EM_PROCESSAMENTO",
+            "eventos": list(eventos)}
+
+
+class SincronizacaoTest(unittest.TestCase):
+    """Um cliente (LOTES + journal + estado .sync) contra o SQLite de benchmarks."""
+
+    def setUp(self) -> None:
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        self.path = os.path.join(pasta, "dados.json")
+        self.conn = conectar_sqlite()
+        criar_tabelas_sqlite(self.conn)
+        self.addCleanup(self.conn.close)
+        driver = mock.patch.object(po, "oracledb", oracle_falso)
+        driver.start()
+        self.addCleanup(driver.stop)
+
+    def _abrir(self) -> tuple:
+        """(LoteStore, Sincronizador) como no boot: JSON + journal + estado."""
+        lotes = LoteStore(carregar_json_validado(self.path))
+        return lotes, Sincronizador(lotes, self.path)
+
+    def _rodada(self, lotes: LoteStore, sync: Sincronizador, enviar: bool = True) -> None:
+        """O que TrabalhadorPersistencia._processar faz numa rodada completa."""
+        if enviar:
+            sync.enviar(self.conn)
+        eventos, novos = sync.buscar(self.conn)
+        with LOCK:
+            linhas, _, _ = sync.aplicar(eventos, novos)
+            registrar_journal_linhas(linhas, self.path)
+        sync.estado.gravar()
+
+    def _eventos_remotos(self) -> list:
+        with self.conn.cursor() as cur:
+            return [r[0] for r in cur.execute("SELECT TIPO FROM EVENTO ORDER BY TIPO")]
+
+    def test_evento_baixado_mantem_posicao_depois_de_reiniciar(self):
+        salvar_json_seguro([_lote(1, _evento("COLHEITA", "2025-02-01"))], self.path)
+        lotes, sync = self._abrir()
+        self._rodada(lotes, sync)
+        rid = sync.estado.lotes[1][0]
+        # evento local ainda não enviado e, no Oracle, um evento de outro cliente
+        local = _evento("TRANSPORTE", "2025-03-05")
+        with LOCK:
+            lotes.anexar_evento(lotes.obter(1), local)
+            registrar_journal({"op": "evento", "id": 1, "evento": local, "status": "EM_PROCESSAMENTO"}, self.path)
+            sync.marcar([1])
+        po.inserir_evento(self.conn, rid, _evento("ARMAZENAGEM", "2025-03-04"))
+        self._rodada(lotes, sync, enviar=False)
+        antes = [e["tipo"] for e in lotes.obter(1)["eventos"]]
+        self.assertEqual(antes, ["COLHEITA", "ARMAZENAGEM", "TRANSPORTE"])
+
+        lotes, sync = self._abrir()
+        self.assertEqual([e["tipo"] for e in lotes.obter(1)["eventos"]], antes)
+        self._rodada(lotes, sync)
+        self.assertEqual(self._eventos_remotos(), ["ARMAZENAGEM", "COLHEITA", "TRANSPORTE"])
+
+    def test_evento_efetivado_fora_de_ordem_entra_pela_janela(self):
+        salvar_json_seguro([_lote(1, _evento("COLHEITA", "2025-02-01"))], self.path)
+        lotes, sync = self._abrir()
+        self._rodada(lotes, sync)
+        rid = sync.estado.lotes[1][0]
+        inserir = """INSERT INTO EVENTO (ID, LOTE_ID, TIPO, DATA_EVENTO, LOCAL, RESPONSAVEL, OBSERVACOES)
+                     VALUES (:ID, :L, :T, '2025-03-02', 'Porto', 'Ana', '')"""
+        # a sessão que reservou o ID 50 só efetiva depois de o 60 já ter sido lido
+        with self.conn.cursor() as cur:
+            cur.execute(inserir, {"ID": 60, "L": rid, "T": "TRANSPORTE"})
+        self.conn.commit()
+        self._rodada(lotes, sync)
+        with self.conn.cursor() as cur:
+            cur.execute(inserir, {"ID": 50, "L": rid, "T": "ARMAZENAGEM"})
+        self.conn.commit()
+        self._rodada(lotes, sync)
+        self._rodada(lotes, sync)
+        self.assertEqual(sorted(e["tipo"] for e in lotes.obter(1)["eventos"]),
+                         ["ARMAZENAGEM", "COLHEITA", "TRANSPORTE"])
+
+        lotes, sync = self._abrir()  # a janela relê os mesmos IDs depois do boot
+        self._rodada(lotes, sync)
+        self.assertEqual(len(lotes.obter(1)["eventos"]), 3)
+        self.assertEqual(len(self._eventos_remotos()), 3)
+
+    def test_evento_que_falhou_volta_no_proximo_envio(self):
+        salvar_json_seguro([_lote(1, _evento("COLHEITA", "2025-02-01"), _evento("TRANSPORTE", "2025-02-03"))],
+                           self.path)
+        lotes, sync = self._abrir()
+        original = po.inserir_eventos_em_massa
+
+        def falha_no_primeiro(conn, eventos, *args):
+            ids, erros = original(conn, eventos[1:], *args)
+            return [None] + ids, [(0, "ORA-00060: deadlock")] + [(i + 1, m) for i, m in erros]
+
+        with mock.patch.object(po, "inserir_eventos_em_massa", falha_no_primeiro):
+            self._rodada(lotes, sync)
+        self.assertEqual(self._eventos_remotos(), ["TRANSPORTE"])
+        _, enviados, _, falhos = sync.estado.lotes[1]
+        self.assertEqual((enviados, falhos), (2, [0]))
+
+        with LOCK:  # o lote volta a ser enviado quando muda de novo
+            lotes.anexar_evento(lotes.obter(1), _evento("INSPECAO", "2025-02-05"))
+            sync.marcar([1])
+        self._rodada(lotes, sync)
+        self.assertEqual(self._eventos_remotos(), ["COLHEITA", "INSPECAO", "TRANSPORTE"])
+        _, enviados, _, falhos = sync.estado.lotes[1]
+        self.assertEqual((enviados, falhos), (3, []))
+
+    def test_evento_baixado_nao_apaga_os_que_falharam(self):
+        salvar_json_seguro([_lote(1, _evento("COLHEITA", "2025-02-01"), _evento("TRANSPORTE", "2025-02-03"))],
+                           self.path)
+        lotes, sync = self._abrir()
+        original = po.inserir_eventos_em_massa
+
+        def falha_no_primeiro(conn, eventos, *args):
+            ids, erros = original(conn, eventos[1:], *args)
+            return [None] + ids, [(0, "ORA-00060: deadlock")] + [(i + 1, m) for i, m in erros]
+
+        with mock.patch.object(po, "inserir_eventos_em_massa", falha_no_primeiro):
+            self._rodada(lotes, sync)
+        rid = sync.estado.lotes[1][0]
+        po.inserir_eventos_em_massa(self.conn, [(rid, _evento("ARMAZENAGEM", "2025-02-04"))])  # outro cliente
+
+        self._rodada(lotes, sync, enviar=False)
+        _, enviados, _, falhos = sync.estado.lotes[1]
+        self.assertEqual((enviados, falhos), (3, [0]))
+
+        with LOCK:
+            sync.marcar([1])
+        self._rodada(lotes, sync)
+        self.assertEqual(self._eventos_remotos(), ["ARMAZENAGEM", "COLHEITA", "TRANSPORTE"])
+        self.assertEqual(sync.estado.lotes[1][3], [])
+
+    def test_conexao_que_cai_no_meio_do_envio_nao_duplica_o_que_ja_entrou(self):
+        salvar_json_seguro([_lote(1, _evento("COLHEITA", "2025-02-01")),
+                            _lote(2, _evento("TRANSPORTE", "2025-02-03"))], self.path)
+        lotes, sync = self._abrir()
+        original = po.inserir_eventos_em_massa
+        chamadas = []
+
+        def cai_no_segundo_bloco(conn, eventos, *args):
+            chamadas.append(len(eventos))
+            if len(chamadas) == 2:
+                raise ConnectionError("DPI-1080: connection was closed")
+            return original(conn, eventos, *args)
+
+        with mock.patch.object(po, "BATCH_SIZE", 1), \
+                mock.patch.object(po, "inserir_eventos_em_massa", cai_no_segundo_bloco):
+            with self.assertRaises(ConnectionError):
+                sync.enviar(self.conn)
+        self.assertEqual(self._eventos_remotos(), ["COLHEITA"])
+
+        self._rodada(lotes, sync)  # os lotes voltaram a ficar sujos
+        self.assertEqual(self._eventos_remotos(), ["COLHEITA", "TRANSPORTE"])
+        with self.conn.cursor() as cur:
+            self.assertEqual(cur.execute("SELECT COUNT(*) FROM LOTE").fetchone()[0], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import unittest
+from datetime import date, timedelta
+
+from benchmarks.sqlite_local import conectar_sqlite, criar_tabelas_sqlite
+from src import persistencia_oracle as po
+from src.relatorios import kpis
+
+HOJE = date.today()
+
+
+def _lote(i: int, uf: str, colheita: date, eventos: list, agua: bool = False, carb: bool = False) -> dict:
+    return {"id": i, "produto": "Soja", "produtor": "Fazenda", "origem_uf": uf,
+            "data_colheita": colheita.isoformat(), "peso_kg": 100.0 * i,
+            "carbono_neutro": carb, "agua_reuso": agua, "status": "EM_PROCESSAMENTO",
+            "eventos": [{"tipo": "TRANSPORTE", "data": d.isoformat(), "local": "Porto",
+                         "responsavel": "Ana", "observacoes": ""} for d in eventos]}
+
+
+LOTES = [
+    _lote(1, "SP", HOJE - timedelta(days=30), [], agua=True),
+    _lote(2, "SP", HOJE - timedelta(days=30), [HOJE - timedelta(days=2)], carb=True),
+    _lote(3, "MT", HOJE - timedelta(days=1), []),
+    _lote(4, "MT", HOJE - timedelta(days=40), [HOJE - timedelta(days=20), HOJE - timedelta(days=10)],
+          agua=True, carb=True),
+]
+
+
+def _inserir(conn, lotes: list) -> None:
+    """Carga com SQL comum: as inserções em massa precisam de RETURNING ... INTO."""
+    with conn.cursor() as cur:
+        for l in lotes:
+            cur.execute("""INSERT INTO LOTE (ID, PRODUTO, PRODUTOR, ORIGEM_UF, DATA_COLHEITA, PESO_KG,
+                                             CARBONO_NEUTRO, AGUA_REUSO, STATUS)
+                           VALUES (:ID, :P, :PR, :UF, :DC, :PESO, :C, :A, :S)""",
+                        {"ID": l["id"], "P": l["produto"], "PR": l["produtor"], "UF": l["origem_uf"],
+                         "DC": date.fromisoformat(l["data_colheita"]), "PESO": l["peso_kg"],
+                         "C": "S" if l["carbono_neutro"] else "N", "A": "S" if l["agua_reuso"] else "N",
+                         "S": l["status"]})
+            for ev in l["eventos"]:
+                cur.execute("""INSERT INTO EVENTO (LOTE_ID, TIPO, DATA_EVENTO, LOCAL, RESPONSAVEL, OBSERVACOES)
+                               VALUES (:L, :T, :D, :LOC, :R, :O)""",
+                            {"L": l["id"], "T": ev["tipo"], "D": date.fromisoformat(ev["data"]),
+                             "LOC": ev["local"], "R": ev["responsavel"], "O": ev["observacoes"]})
+    conn.commit()
+
+
+class KpisSQLiteTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.conn = conectar_sqlite()
+        criar_tabelas_sqlite(self.conn)
+        self.addCleanup(self.conn.close)
+
+    def test_kpis_db_igual_ao_relatorio_local(self):
+        _inserir(self.conn, LOTES)
+        k = po.kpis_db(self.conn, hoje=HOJE, resumo=False)
+        self.assertEqual(k, kpis(LOTES))
+        self.assertEqual(k["por_uf"], {"MT": 2, "SP": 2})
+        self.assertEqual(k["lotes_sem_evento_7d"], 2)
+
+    def test_reconstruir_resumo_bate_com_as_tabelas_base(self):
+        _inserir(self.conn, LOTES)
+        self.assertEqual(po.kpis_db(self.conn, hoje=HOJE, resumo=True)["total"], 0)  # resumo ainda vazio
+        po.reconstruir_resumo(self.conn)
+        self.assertEqual(po.kpis_db(self.conn, hoje=HOJE, resumo=True),
+                         po.kpis_db(self.conn, hoje=HOJE, resumo=False))
+
+    def test_base_vazia(self):
+        self.assertEqual(po.kpis_db(self.conn, hoje=HOJE, resumo=False), kpis([]))
+
+
+if __name__ == "__main__":
+    unittest.main()